@@ -0,0 +1,173 @@
+"""
+GameTheoryUI benchmarks
+by: Ari Stehney
+
+Times the match engine, tournaments and scoreboard persistence with the bundled strategies, and
+writes the numbers as JSON so runs can be compared over time.
+
+Usage:
+    $ python benchmarks/bench_engine.py --output bench.json
+    $ python benchmarks/bench_engine.py --quick
+
+Benchmarks:
+    engine: run_strategy_game rounds/sec for every bundled match-up against num_rounds
+    tournament: Full tournament wall time against strategy count, N repeats and worker count
+    persistence: Scoreboard save (append) and load time against scoreboard size
+"""
+
+import argparse, json, os, platform, subprocess, sys, tempfile, time
+import itertools as it
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from game_engine import run_strategy_game, run_tournament, round_robin
+from game_registry import load_strategy_dir
+from game_results import ResultsAccumulator, ResultsStore
+
+def load_bundled_strategies():
+    return load_strategy_dir(os.path.join(ROOT, "strategies"), skip={"imported_strategy_template.py"})
+
+def best_of(repeats, fn):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    return min(times), float(np.median(times))
+
+def bench_engine(strategies, round_counts, repeats):
+    results = []
+
+    for num_rounds in round_counts:
+        params = {"num_rounds": num_rounds, "steal_amount": 5, "steal_min_amount": 1, "share_amount": 3}
+
+        for one, two in it.combinations(strategies, 2):
+            best, median = best_of(repeats, lambda: run_strategy_game(params, [one, two]))
+            results.append({
+                'strategies': [one.get_meta()["name"], two.get_meta()["name"]],
+                'num_rounds': num_rounds,
+                'best_s': best,
+                'median_s': median,
+                'rounds_per_sec': num_rounds / best if best > 0 else None
+            })
+
+        print("engine: num_rounds={} done".format(num_rounds))
+
+    return results
+
+def bench_tournament(strategies, strategy_counts, repeat_counts, worker_counts, num_rounds, repeats):
+    results = []
+    params = {"num_rounds": num_rounds, "steal_amount": 5, "steal_min_amount": 1, "share_amount": 3}
+
+    for count, n_repeats, workers in it.product(strategy_counts, repeat_counts, worker_counts):
+        # Cycle the bundled strategies to reach the strategy count
+        pool = [strategies[idx % len(strategies)] for idx in range(count)]
+        pairings = round_robin(count, n_repeats)
+
+        best, median = best_of(repeats, lambda: run_tournament(params, pool, pairings, workers=workers))
+        results.append({
+            'strategy_count': count,
+            'n_repeats': n_repeats,
+            'workers': workers,
+            'num_rounds': num_rounds,
+            'matches': len(pairings),
+            'best_s': best,
+            'median_s': median,
+            'matches_per_sec': len(pairings) / best if best > 0 else None
+        })
+
+        print("tournament: strategies={} N={} workers={} done".format(count, n_repeats, workers))
+
+    return results
+
+def bench_persistence(row_counts, repeats):
+    results = []
+    rng = np.random.default_rng(0)
+    names = ["Strategy {}".format(idx) for idx in range(100)]
+
+    for rows in row_counts:
+        acc = ResultsAccumulator(capacity=rows)
+        ids = [acc.intern(name) for name in names]
+        matches = rows // 2
+        acc.add_matches(rng.choice(ids, matches), rng.choice(ids, matches), rng.integers(0, 100, (matches, 2)))
+        frame = acc.to_frame()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            save_times = []
+
+            # Every save goes into an empty scoreboard so the timings don't include earlier repeats
+            for repeat in range(repeats):
+                store = ResultsStore(os.path.join(tmp, "scores_{}.db".format(repeat)))
+                started = time.perf_counter()
+                store.append(frame)
+                save_times.append(time.perf_counter() - started)
+                store.close()
+
+            store = ResultsStore(os.path.join(tmp, "scores_0.db"))
+            load_best, load_median = best_of(repeats, store.load)
+            store.close()
+
+        save_best, save_median = min(save_times), float(np.median(save_times))
+
+        results.append({
+            'rows': len(frame),
+            'save_best_s': save_best,
+            'save_median_s': save_median,
+            'load_best_s': load_best,
+            'load_median_s': load_median
+        })
+
+        print("persistence: rows={} done".format(rows))
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GameTheoryUI match engine.")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file to write")
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a fast smoke run")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per measurement, the best and median are kept")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="Worker counts for tournaments")
+    parser.add_argument("--only", choices=["engine", "tournament", "persistence"], nargs="+", help="Benchmarks to run")
+    args = parser.parse_args()
+
+    if args.quick:
+        round_counts, strategy_counts, repeat_counts, tournament_rounds, row_counts = [20, 200], [5, 10], [1, 5], 20, [1_000, 10_000]
+    else:
+        round_counts, strategy_counts, repeat_counts, tournament_rounds, row_counts = [20, 200, 2_000, 10_000], [5, 20, 50], [1, 10, 50], 200, [10_000, 100_000, 1_000_000]
+
+    only = set(args.only or ["engine", "tournament", "persistence"])
+    strategies = load_bundled_strategies()
+
+    report = {
+        'timestamp': time.time(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'strategies': [st.get_meta()["name"] for st in strategies],
+        'quick': args.quick
+    }
+
+    if "engine" in only:
+        report['engine'] = bench_engine(strategies, round_counts, args.repeats)
+    if "tournament" in only:
+        report['tournament'] = bench_tournament(strategies, strategy_counts, repeat_counts, sorted(set(args.workers)), tournament_rounds, args.repeats)
+    if "persistence" in only:
+        report['persistence'] = bench_persistence(row_counts, args.repeats)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("Wrote", args.output)
+
+if __name__ == "__main__":
+    main()
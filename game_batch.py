@@ -0,0 +1,101 @@
+"""
+GameTheoryUI batch tournaments
+by: Ari Stehney
+
+Tournaments submitted through the JSON API and played on the shared job queue with no page attached.
+Each one scores its matches into its own results as they finish, so they can be paged through while
+it plays, and the whole lot goes to the scoreboard once it is done.
+"""
+
+import threading
+import numpy as np
+
+from game_engine import TournamentJob, round_robin, score_matches
+from game_results import ResultsAccumulator, RESULT_COLUMNS
+
+# Finished matches are scored in batches of this many, which bounds the moves held in memory
+SCORE_EVERY = 1024
+
+class BatchTournament(TournamentJob):
+    """
+    Round robin of the given strategies repeated `repeats` times, with its results kept for polling.
+    """
+    def __init__(self, params, strategies, repeats=1, workers=1, cache=None, sandbox=None):
+        super().__init__(params, strategies, round_robin(len(strategies), repeats), workers, cache=cache, sandbox=sandbox)
+
+        self.repeats = int(repeats)
+        self.queued = None
+
+        self.results = ResultsAccumulator(capacity=2 * min(self.total, 1 << 16))
+        self._ids = [self.results.intern(st.get_meta()["name"]) for st in self.strategies]
+        self._results_lock = threading.Lock()
+
+    def _play(self, pairings, seeds=None):
+        # Score the tail before run() marks the tournament finished
+        try:
+            super()._play(pairings, seeds)
+        finally:
+            self._score(self.collect())
+
+    def _match_done(self, idx, pairing, moves) -> bool:
+        if (idx + 1) % SCORE_EVERY == 0:
+            self._score(self.collect())
+        return False
+
+    def _score(self, finished):
+        if not finished:
+            return
+
+        totals = score_matches(self.params, [moves for _, moves in finished])
+
+        with self._results_lock:
+            self.results.add_matches([self._ids[pairing[0]] for pairing, _ in finished],
+                                     [self._ids[pairing[1]] for pairing, _ in finished], totals)
+
+    def status(self) -> dict:
+        """
+        :return: Queue state (queued, running, done, failed or cancelled) and progress, JSON ready
+        """
+        state = self.queued.status if self.queued is not None else 'queued'
+        if state == 'done' and self.error is not None:
+            state = 'failed'
+        elif state == 'done' and self.cancelled:
+            state = 'cancelled'
+
+        eta = self.eta()
+        return {
+            'id': self.queued.id if self.queued is not None else None,
+            'status': state,
+            'completed': self.completed,
+            'total': self.total,
+            'forfeits': len(self.forfeits),
+            'rows': len(self.results),
+            'rate': round(self.rate(), 2),
+            'eta': round(eta, 1) if eta is not None and not self.finished else None,
+            'error': str(self.error) if self.error is not None else None,
+            'strategies': [st.get_meta()["name"] for st in self.strategies],
+            'repeats': self.repeats,
+            'match_parameters': self.params
+        }
+
+    def page(self, page: int = 0, page_size: int = 100) -> list[dict]:
+        """
+        :param page: Zero-based page number
+        :param page_size: Rows per page
+        :return: Rows scored so far on that page, two per match
+        """
+        start = max(0, page) * page_size
+
+        with self._results_lock:
+            return [dict(zip(RESULT_COLUMNS, row)) for row in self.results.rows(start, start + page_size)]
+
+    def standings(self) -> list[dict]:
+        """
+        :return: Total score and match count of every strategy so far, best total first
+        """
+        with self._results_lock:
+            totals, counts = self.results.per_strategy()
+            names = list(self.results.names)
+
+        order = np.argsort(-totals, kind='stable')
+        return [{'strategy': names[idx], 'matches': int(counts[idx]), 'total': int(totals[idx])} for idx in order]
@@ -1,11 +1,83 @@
-from enum import Enum
+from enum import IntEnum
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import islice
+import threading
+import numpy as np
 
-class GameMove(Enum):
+class GameMove(IntEnum):
     STEAL = 0
     SHARE = 1
 
+# GameMove of every raw move value, indexed by the value
+_MOVES = (GameMove.STEAL, GameMove.SHARE)
+
+class GameHistory(Sequence):
+    """
+    Read-only view over the first `length` moves of an append-only bytearray of raw move values, one byte
+    per move. Strategies see GameMove items, the engine reads and writes the bytes directly.
+    The engine hands these to strategies instead of copying the history every round.
+    """
+    __slots__ = ('_buffer', '_length')
+
+    def __init__(self, buffer: bytearray, length: int) -> None:
+        self._buffer = buffer
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            # Bounds are resolved against the view's length, so only the selected moves are copied. Stepping
+            # backwards, indices() gives -1 for "before the first move", which a slice would read as the last byte
+            start, stop, step = idx.indices(self._length)
+            if start < 0:
+                return []
+            return [_MOVES[mv] for mv in self._buffer[start:stop if stop >= 0 else None:step]]
+
+        if idx < 0:
+            idx += self._length
+        if not 0 <= idx < self._length:
+            raise IndexError("history index out of range")
+
+        return _MOVES[self._buffer[idx]]
+
+    def __iter__(self):
+        return map(_MOVES.__getitem__, islice(self._buffer, self._length))
+
+    def __contains__(self, value) -> bool:
+        try:
+            return self._buffer.find(value, 0, self._length) >= 0
+        except (TypeError, ValueError):
+            return False
+
+    def count(self, value) -> int:
+        try:
+            return self._buffer.count(value, 0, self._length)
+        except (TypeError, ValueError):
+            return 0
+
+    def raw(self) -> np.ndarray:
+        """
+        :return: Copy of the moves as a NumPy int8 array of GameMove values
+        """
+        return np.frombuffer(bytes(self._buffer[:self._length]), dtype=np.int8)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (GameHistory, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "GameHistory({})".format(list(self))
+
 class GameStrategy:
     meta = {}
+    # Content hash of the script the strategy was imported from, set by the strategy registry
+    source_hash = None
+    # True if the same histories always give the same move, None lets the registry guess from the script
+    deterministic = None
 
     def __init__(self, name: str, author: str, description: str) -> None:
         self.meta = {'name': name, 'author': author, 'description': description}
@@ -13,10 +85,168 @@ class GameStrategy:
     def get_meta(self) -> dict[str, str]:
         return self.meta
 
-    def next_play(self, player_history: list[GameMove], opponent_history: list[GameMove]) -> GameMove:
+    def next_play(self, player_history: Sequence[GameMove], opponent_history: Sequence[GameMove]) -> GameMove:
         """
-        :param player_history: List of your moves
-        :param opponent_history: List of the opponent's moves
+        :param player_history: Read-only sequence of your moves
+        :param opponent_history: Read-only sequence of the opponent's moves
         :return: Your next move
         """
-        pass
\ No newline at end of file
+        pass
+
+    def next_play_batch(self, player_histories, opponent_histories):
+        """
+        Optional lockstep version of next_play, called with many matches at once during tournaments.
+        Strategies that don't override it are played one match at a time through next_play.
+
+        :param player_histories: Read-only NumPy int8 matrix of your moves, one row per match, as GameMove values
+        :param opponent_histories: Read-only NumPy int8 matrix of the opponents' moves, same shape
+        :return: Your next move in every match, as GameMove values
+        """
+        raise NotImplementedError
+
+
+
+def _move_value(move) -> int:
+    return int(move)
+
+class _Resumes:
+    """
+    Where a state machine left off in each match it is playing, keyed by the match's opponent history
+    buffer, so matches on other threads or interleaved on one thread don't share a resume point.
+    Entries hold on to their buffer, so its id isn't reused while they exist, and the oldest are dropped.
+    """
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, buffer):
+        with self._lock:
+            entry = self._entries.get(id(buffer))
+
+        return entry[1] if entry is not None else None
+
+    def put(self, buffer, resume) -> None:
+        with self._lock:
+            self._entries[id(buffer)] = (buffer, resume)
+            self._entries.move_to_end(id(buffer))
+
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+class StateMachineStrategy(GameStrategy):
+    """
+    Strategy declared as a finite-state machine instead of a play function. Matches between two of
+    these are played by the engine as NumPy table lookups, without a Python call per move.
+    """
+    deterministic = True
+
+    def __init__(self, name: str, author: str, description: str, outputs: list, transitions: list, initial_state: int = 0) -> None:
+        """
+        :param outputs: Move played in each state
+        :param transitions: Next state for each state, as [state after opponent steals, state after opponent shares]
+        :param initial_state: State of the first round
+        """
+        super().__init__(name, author, description)
+
+        self.outputs = np.array([_move_value(mv) for mv in outputs], dtype=np.int8)
+        self.transitions = np.array(transitions, dtype=np.int32).reshape(len(self.outputs), 2)
+        self.initial_state = int(initial_state)
+
+        if not np.isin(self.outputs, (0, 1)).all():
+            raise ValueError("State outputs must be GameMove.STEAL or GameMove.SHARE")
+        if self.transitions.min() < 0 or self.transitions.max() >= len(self.outputs) or not 0 <= self.initial_state < len(self.outputs):
+            raise ValueError("State machine refers to a state that doesn't exist")
+
+        self._transition_list = self.transitions.tolist()
+        self._output_moves = [_MOVES[mv] for mv in self.outputs.tolist()]
+        self._resume = _Resumes()
+        self._resume_batch = _Resumes()
+
+    def __getstate__(self):
+        # Resume points hold on to the history buffers of running matches, don't ship them to workers
+        state = self.__dict__.copy()
+        state['_resume'] = state['_resume_batch'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._resume = _Resumes()
+        self._resume_batch = _Resumes()
+
+    def next_play(self, player_history: Sequence[GameMove], opponent_history: Sequence[GameMove]) -> GameMove:
+        # Pick up from the previous call when this is the same match one round later
+        buffer = opponent_history._buffer if isinstance(opponent_history, GameHistory) else opponent_history
+        rnd = len(opponent_history)
+
+        resume = self._resume.get(buffer)
+        if resume is not None and resume[0] <= rnd:
+            start, state = resume
+        else:
+            start, state = 0, self.initial_state
+
+        # The engine's byte buffers are walked as raw values, anything else as GameMoves
+        moves = buffer[start:rnd] if isinstance(buffer, bytearray) else map(_move_value, opponent_history[start:rnd])
+        for mv in moves:
+            state = self._transition_list[state][mv]
+
+        self._resume.put(buffer, (rnd, state))
+        return self._output_moves[state]
+
+    def next_play_batch(self, player_histories, opponent_histories):
+        buffer = opponent_histories.base if opponent_histories.base is not None else opponent_histories
+        matches, rnd = opponent_histories.shape
+
+        resume = self._resume_batch.get(buffer)
+        if resume is not None and resume[0] == matches and resume[1] <= rnd:
+            _, start, states = resume
+        else:
+            start, states = 0, np.full(matches, self.initial_state, dtype=np.int32)
+
+        for col in range(start, rnd):
+            states = self.transitions[states, opponent_histories[:, col]]
+
+        self._resume_batch.put(buffer, (matches, rnd, states))
+        return self.outputs[states]
+
+class MemoryStrategy(StateMachineStrategy):
+    """
+    Strategy declared as a lookup table over the last few rounds, compiled to a state machine.
+    """
+    def __init__(self, name: str, author: str, description: str, memory: int, table: dict, opening: list) -> None:
+        """
+        :param memory: Number of past rounds the table looks at
+        :param table: Your next move for every tuple of the last `memory` (your move, opponent's move) pairs, oldest first
+        :param opening: Your moves for the first `memory` rounds, before the table applies
+        """
+        table = {tuple((_move_value(own), _move_value(opp)) for own, opp in key): _move_value(mv) for key, mv in table.items()}
+        opening = [_move_value(mv) for mv in opening]
+
+        if len(opening) != memory:
+            raise ValueError("Opening needs exactly {} moves".format(memory))
+
+        # Each state is the tuple of the last (up to) `memory` move pairs, only reachable ones get a state
+        states, outputs, transitions = {(): 0}, [], []
+        pending = [()]
+
+        while pending:
+            recent = pending.pop(0)
+            if len(recent) < memory:
+                own = opening[len(recent)]
+            elif recent in table:
+                own = table[recent]
+            else:
+                raise ValueError("Lookup table has no move for {}".format(recent))
+
+            outputs.append(own)
+            transitions.append([])
+
+            for opp in (0, 1):
+                nxt = (recent + ((own, opp),))[-memory:] if memory else ()
+                if nxt not in states:
+                    states[nxt] = len(states)
+                    pending.append(nxt)
+                transitions[-1].append(states[nxt])
+
+        super().__init__(name, author, description, outputs, transitions)
+        self.memory = memory
@@ -0,0 +1,296 @@
+"""
+GameTheoryUI distributed tournaments
+by: Ari Stehney
+
+A coordinator that splits a tournament's pairings into shards and hands them to worker processes on
+other machines over TCP (multiprocessing.connection with a shared authkey). Workers play their shard
+with the match engine and send the moves back, along with how long every match took so the slowest
+match-ups of the next shards go out first. A shard whose worker dies, disconnects or stops answering
+goes back on the queue for another worker, and matches come out in pairing order, so the scoreboard is
+the same as a tournament played on one machine.
+
+Start workers with worker.py, and pass a Coordinator as the sandbox of a tournament.
+"""
+
+import threading, time
+from collections import deque
+from multiprocessing.connection import Listener, Client
+import dill
+
+from game_engine import play_strategy_game, seed_modules_per_match, moves_to_array, schedule_chunks, strategy_costs, TournamentMatchError
+
+def parse_address(text: str, default_port: int = 6010) -> tuple[str, int]:
+    """
+    :param text: host:port, or just host
+    :return: (host, port)
+    """
+    host, _, port = text.rpartition(":") if ":" in text else (text, None, None)
+    return host or "0.0.0.0", int(port) if port else default_port
+
+def _strategy_key(strategy) -> str:
+    return strategy.source_hash or "id-{}".format(id(strategy))
+
+class _Run:
+    # One iter_matches call, with its shards (positions into pairings, slowest first) and the results that came back
+    def __init__(self, params, strategies, pairings, seeds, shard_size, workers):
+        self.params = dict(params)
+        self.strategies = strategies
+        self.pairings = pairings
+        self.seeds = seeds
+        self.shards = schedule_chunks(strategies, pairings, workers, max_chunk=shard_size)
+
+        self.results = {}
+        self.attempts = [0] * len(self.shards)
+        self.error = None
+        self.cancelled = False
+
+class Coordinator:
+    """
+    Listens for worker connections and plays tournaments on whichever workers are connected. It plugs
+    into game_engine.iter_tournament in place of a SandboxPool.
+    """
+    def __init__(self, address=("0.0.0.0", 6010), authkey: bytes = b"", shard_size: int = 32,
+                 shard_timeout: float = 600.0, max_attempts: int = 3, worker_timeout: float = 60.0) -> None:
+        """
+        :param address: (host, port) to listen on
+        :param authkey: Shared secret workers must connect with, strategies are sent as pickles
+        :param shard_size: Most pairings sent to a worker at a time, shards are sized by the cost of their matches
+        :param shard_timeout: Seconds a worker gets to answer a shard before it is given to another worker
+        :param max_attempts: Workers a shard is tried on before the tournament fails
+        :param worker_timeout: Seconds a tournament waits with no worker connected before it fails
+        """
+        if not authkey:
+            raise ValueError("Distributed workers need an authkey")
+
+        self.shard_size = max(1, int(shard_size))
+        self.shard_timeout = shard_timeout
+        self.max_attempts = max(1, int(max_attempts))
+        self.worker_timeout = worker_timeout
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._workers = {}
+        self._closed = False
+
+        self._listener = Listener(tuple(address), authkey=authkey)
+        self.address = self._listener.address
+
+        threading.Thread(target=self._accept, name="coordinator-accept", daemon=True).start()
+
+    def workers(self) -> list[str]:
+        """
+        :return: Address of every connected worker
+        """
+        with self._cond:
+            return list(self._workers.values())
+
+    def wait_for_workers(self, count: int, timeout: float | None = None) -> bool:
+        """
+        :return: Whether at least count workers connected within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while len(self._workers) < count and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+            return len(self._workers) >= count
+
+    def iter_matches(self, params, strategies, pairings, seeds=None, cancel=None):
+        """
+        Play every pairing on the connected workers and yield (pairing, moves) in pairing order.
+        Waits up to worker_timeout for a worker whenever none are connected.
+
+        :param params: Match parameters
+        :param strategies: List of strategy objects
+        :param pairings: List of (first, second) indexes into strategies
+        :param seeds: Optional per-pairing seeds, see game_engine.match_seeds
+        :param cancel: Optional threading.Event of the job, checked while waiting on workers
+        :return: Generator of (pairing, [first player moves, second player moves])
+        """
+        with self._cond:
+            run = _Run(params, strategies, pairings, seeds, self.shard_size, len(self._workers))
+            self._queue.extend((run, idx) for idx in range(len(run.shards)))
+            self._cond.notify_all()
+
+        try:
+            for pos, pairing in enumerate(pairings):
+                with self._cond:
+                    self._wait_for(run, pos, pairing, cancel)
+                    moves, error = run.results.pop(pos)
+
+                if error is not None:
+                    raise TournamentMatchError(pairing, error)
+
+                yield pairing, moves
+        finally:
+            # Shards nobody waits for anymore are dropped, ones already out are ignored when they come back
+            with self._cond:
+                run.cancelled = True
+                self._queue = deque(item for item in self._queue if item[0] is not run)
+
+    def _wait_for(self, run, pos, pairing, cancel):
+        # Called holding the lock, wakes up every second to check on the job and on connected workers
+        alone_since = None
+
+        while pos not in run.results:
+            if run.error is not None:
+                raise run.error
+            if self._closed:
+                raise TournamentMatchError(pairing, "The coordinator was closed")
+            if cancel is not None and cancel.is_set():
+                raise TournamentMatchError(pairing, "Cancelled while waiting for remote workers")
+
+            if self._workers:
+                alone_since = None
+            elif alone_since is None:
+                alone_since = time.monotonic()
+            elif time.monotonic() - alone_since >= self.worker_timeout:
+                raise TournamentMatchError(pairing, "No remote workers connected for {:.0f}s".format(self.worker_timeout))
+
+            self._cond.wait(1.0)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        self._listener.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                # A worker with the wrong authkey, or one that hung up during the handshake
+                continue
+
+            name = "{}:{}".format(*self._listener.last_accepted)
+            threading.Thread(target=self._serve, args=(conn, name), name="coordinator-" + name, daemon=True).start()
+
+    def _take(self, conn):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait(1.0)
+
+                # Idle workers never send anything, so a readable connection means it hung up
+                if conn.poll(0):
+                    return None
+
+            return None if self._closed else self._queue.popleft()
+
+    def _retry(self, run, idx, reason, counted=True):
+        with self._cond:
+            run.attempts[idx] += counted
+
+            if run.cancelled:
+                return
+            if run.attempts[idx] >= self.max_attempts:
+                pairing = run.pairings[run.shards[idx][0]]
+                run.error = TournamentMatchError(pairing, "Shard of {} matches failed on {} workers, last: {}".format(
+                    len(run.shards[idx]), run.attempts[idx], reason))
+            else:
+                # Back at the front, the in-order results are waiting on it
+                self._queue.appendleft((run, idx))
+
+            self._cond.notify_all()
+
+    def _serve(self, conn, name):
+        # Feeds one worker a shard at a time until it goes away
+        loaded = set()
+
+        with self._cond:
+            self._workers[id(conn)] = name
+            self._cond.notify_all()
+        print("Worker connected:", name)
+
+        try:
+            while True:
+                item = self._take(conn)
+                if item is None:
+                    return
+
+                run, idx = item
+                chunk = [run.pairings[pos] for pos in run.shards[idx]]
+                seeds = None if run.seeds is None else [run.seeds[pos] for pos in run.shards[idx]]
+                sent = False
+
+                try:
+                    # A strategy only crosses the network once per worker
+                    keys = [(_strategy_key(run.strategies[pairing[0]]), _strategy_key(run.strategies[pairing[1]])) for pairing in chunk]
+                    for pairing, pair_keys in zip(chunk, keys):
+                        for strat_idx, key in zip(pairing, pair_keys):
+                            if key not in loaded:
+                                conn.send(('load', key, dill.dumps(run.strategies[strat_idx])))
+                                loaded.add(key)
+
+                    conn.send(('play', run.params, keys, seeds))
+                    sent = True
+
+                    if not conn.poll(self.shard_timeout):
+                        raise TimeoutError("no answer in {}s".format(self.shard_timeout))
+                    results = conn.recv()
+                except (EOFError, OSError, TimeoutError) as e:
+                    reason = "{}: {}".format(name, str(e) or type(e).__name__)
+                    print("Worker {} failed a shard".format(reason))
+
+                    # Only a worker that got the shard counts as an attempt
+                    self._retry(run, idx, reason, counted=sent)
+                    return
+
+                for pairing, (_, _, seconds) in zip(chunk, results):
+                    strategy_costs.record((run.strategies[pairing[0]], run.strategies[pairing[1]]), seconds)
+
+                with self._cond:
+                    if not run.cancelled:
+                        run.results.update((pos, (moves, error)) for pos, (moves, error, _) in zip(run.shards[idx], results))
+                        self._cond.notify_all()
+        finally:
+            conn.close()
+
+            with self._cond:
+                del self._workers[id(conn)]
+                self._cond.notify_all()
+            print("Worker disconnected:", name)
+
+def serve_worker(address, authkey: bytes) -> None:
+    """
+    Connect to a coordinator and play the shards it sends until it hangs up. Seeded matches reseed the
+    random modules, so run it in a process of its own.
+
+    :param address: (host, port) of the coordinator
+    :param authkey: The coordinator's authkey
+    """
+    loaded = {}
+    seed_modules_per_match()
+
+    with Client(tuple(address), authkey=authkey) as conn:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+
+            if msg[0] == 'load':
+                loaded[msg[1]] = dill.loads(msg[2])
+            elif msg[0] == 'play':
+                _, params, keys, seeds = msg
+                results = []
+
+                # Match times go back with the moves, the coordinator schedules by them
+                for idx, (key_one, key_two) in enumerate(keys):
+                    started = time.perf_counter()
+                    try:
+                        match_state = play_strategy_game(params, [loaded[key_one], loaded[key_two]],
+                                                         seed=None if seeds is None else seeds[idx])
+                        results.append(([moves_to_array(match_state[0]), moves_to_array(match_state[1])], None,
+                                        time.perf_counter() - started))
+                    except Exception as e:
+                        results.append((None, str(e), time.perf_counter() - started))
+
+                conn.send(results)
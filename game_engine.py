@@ -0,0 +1,948 @@
+"""
+GameTheoryUI match engine
+by: Ari Stehney
+
+Plays strategies against each other and scores the results, kept apart from the UI in server.py.
+"""
+
+import math, multiprocessing, threading, time, random
+import itertools as it
+import dill
+import numpy as np
+import game_profiler
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from game_class import GameMove, GameHistory, GameStrategy, StateMachineStrategy
+from game_profiler import EngineProfiler
+
+# Raw value of each move, also its row/column in the payoff matrix. GameMove is an IntEnum, so the
+# plain ints 0 and 1 are accepted too
+_MOVE_INDEX = {GameMove.STEAL: 0, GameMove.SHARE: 1}
+
+def move_index(play) -> int:
+    """
+    :return: Raw value of a strategy's move, a ValueError for anything but a GameMove
+    """
+    try:
+        return _MOVE_INDEX[play]
+    except (KeyError, TypeError):
+        raise ValueError("Invalid game state, strategy played {!r}".format(play)) from None
+
+class MatchSeeds:
+    """
+    Per-match seeds of a tournament, worked out as they are looked up rather than all at once.
+    """
+    def __init__(self, seed, count, offset=0) -> None:
+        self.seed = seed
+        self.count = int(count)
+        self.offset = int(offset)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self.count))]
+
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError("match seed index out of range")
+
+        return int(np.random.SeedSequence(self.seed, spawn_key=(self.offset + idx,)).generate_state(1, np.uint64)[0])
+
+def match_seeds(seed, count, offset=0):
+    """
+    :param seed: Seed of the whole tournament
+    :param count: Number of matches
+    :param offset: Index of the first match, so batches of one tournament get different seeds
+    :return: Sequence of independent per-match seeds, the same for a match no matter which worker plays it
+    """
+    return MatchSeeds(seed, count, offset)
+
+# Whether seeded matches also reseed the random and numpy.random modules strategy scripts draw from. Only
+# set in worker processes that play one match at a time, the server's jobs share those modules across threads.
+_seed_modules = False
+
+def seed_modules_per_match() -> None:
+    """
+    Make seeded matches in this process reseed the random modules, call once at worker process startup.
+    """
+    global _seed_modules
+    _seed_modules = True
+
+def seed_match(seed, rounds, noise=0.0):
+    """
+    Draw the match's noise from its own generator, and in worker processes seed the random modules too.
+
+    :param seed: Seed of the match, see match_seeds
+    :param rounds: Number of rounds
+    :param noise: Probability of each move being flipped by mistake
+    :return: Boolean array shaped (rounds, 2), True where a player's move gets flipped
+    """
+    if _seed_modules:
+        random.seed(seed)
+        np.random.seed(seed % 2**32)
+
+    return np.random.default_rng(seed).random((rounds, 2)) < noise
+
+def play_strategy_game(params, mgs, profiler=None, seed=None):
+    """
+    :param params: Match parameters
+    :param mgs: The two strategies
+    :param profiler: EngineProfiler to record into, defaults to game_profiler.active
+    :param seed: Seed of the match, plays it reproducibly with params["noise"] applied when given
+    :return: Both players' moves as bytearrays of raw GameMove values
+    """
+    profiler = game_profiler.active if profiler is None else profiler
+    if seed is not None:
+        return _play_seeded(params, mgs, seed, profiler)
+    if profiler is not None:
+        return _play_profiled(params, mgs, profiler)
+
+    match_state = [bytearray(), bytearray()]
+
+    for rnd in range(int(params["num_rounds"])):
+        # Both players see the same length-bounded views of the shared history buffers
+        hist_one = GameHistory(match_state[0], rnd)
+        hist_two = GameHistory(match_state[1], rnd)
+
+        play_one = mgs[0].next_play(hist_one, hist_two)
+        play_two = mgs[1].next_play(hist_two, hist_one)
+
+        match_state[0].append(move_index(play_one))
+        match_state[1].append(move_index(play_two))
+
+    return match_state
+
+def _play_profiled(params, mgs, profiler):
+    match_state = [bytearray(), bytearray()]
+    names = [mgs[0].get_meta()["name"], mgs[1].get_meta()["name"]]
+    clock = time.perf_counter
+
+    # Record into a match-local profiler and merge once, so the shared one is only locked per match
+    local = EngineProfiler()
+    started = clock()
+
+    for rnd in range(int(params["num_rounds"])):
+        hist_one = GameHistory(match_state[0], rnd)
+        hist_two = GameHistory(match_state[1], rnd)
+
+        call_start = clock()
+        play_one = mgs[0].next_play(hist_one, hist_two)
+        call_mid = clock()
+        play_two = mgs[1].next_play(hist_two, hist_one)
+        call_end = clock()
+
+        local.record_call(names[0], call_mid - call_start)
+        local.record_call(names[1], call_end - call_mid)
+
+        match_state[0].append(move_index(play_one))
+        match_state[1].append(move_index(play_two))
+
+    local.record_stage('engine per match', clock() - started)
+    profiler.merge(local)
+
+    return match_state
+
+def _play_seeded(params, mgs, seed, profiler=None):
+    rounds = int(params["num_rounds"])
+    flips = seed_match(seed, rounds, float(params.get("noise", 0.0))).tolist()
+    match_state = [bytearray(), bytearray()]
+    started = time.perf_counter()
+
+    for rnd in range(rounds):
+        hist_one = GameHistory(match_state[0], rnd)
+        hist_two = GameHistory(match_state[1], rnd)
+
+        play_one = mgs[0].next_play(hist_one, hist_two)
+        play_two = mgs[1].next_play(hist_two, hist_one)
+
+        # Flipped moves are what both players see in their histories afterwards
+        match_state[0].append(move_index(play_one) ^ flips[rnd][0])
+        match_state[1].append(move_index(play_two) ^ flips[rnd][1])
+
+    if profiler is not None:
+        profiler.record_stage('engine per seeded match', time.perf_counter() - started)
+
+    return match_state
+
+def run_strategy_game(params, mgs):
+    """
+    :return: Both players' moves as int8 arrays of GameMove values, and their per-round scores
+    """
+    moves = [moves_to_array(plays) for plays in play_strategy_game(params, mgs)]
+    scores, _ = score_moves(params, *moves)
+
+    return moves, scores
+
+def play_tables(params, strategies, pairings):
+    """
+    Play matches between state machine strategies as NumPy table lookups over every match at once.
+
+    :param params: Match parameters
+    :param strategies: List of strategy objects
+    :param pairings: List of (first, second) indexes into strategies, all StateMachineStrategy
+    :return: List of [first player moves, second player moves] integer arrays per pairing
+    """
+    rounds = int(params["num_rounds"])
+    unique, inverse = np.unique(np.array(pairings, dtype=np.int64).reshape(-1, 2), axis=0, return_inverse=True)
+
+    # Stack every strategy's tables into one, shifting its state numbers past the ones before it
+    offsets, outputs, transitions = {}, [], []
+    for idx in np.unique(unique):
+        st = strategies[idx]
+        offsets[idx] = sum(len(out) for out in outputs)
+        outputs.append(st.outputs)
+        transitions.append(st.transitions + offsets[idx])
+
+    outputs, transitions = np.concatenate(outputs), np.concatenate(transitions)
+    state_one = np.array([offsets[a] + strategies[a].initial_state for a, _ in unique], dtype=np.int32)
+    state_two = np.array([offsets[b] + strategies[b].initial_state for _, b in unique], dtype=np.int32)
+    moves = np.empty((2, len(unique), rounds), dtype=np.int8)
+    started = time.perf_counter()
+
+    for rnd in range(rounds):
+        play_one, play_two = outputs[state_one], outputs[state_two]
+        moves[0, :, rnd], moves[1, :, rnd] = play_one, play_two
+
+        state_one, state_two = transitions[state_one, play_two], transitions[state_two, play_one]
+
+    game_profiler.record_stage('engine per table batch', time.perf_counter() - started)
+
+    return [[moves[0, idx].copy(), moves[1, idx].copy()] for idx in inverse.ravel()]
+
+def supports_batch(strategy) -> bool:
+    return type(strategy).next_play_batch is not GameStrategy.next_play_batch
+
+def play_lockstep(params, strategies, pairings):
+    """
+    Play many matches at once, advancing all of them a round at a time through next_play_batch.
+    Every strategy in the pairings must support batches, see supports_batch.
+
+    :param params: Match parameters
+    :param strategies: List of strategy objects
+    :param pairings: List of (first, second) indexes into strategies
+    :return: List of [first player moves, second player moves] integer arrays per pairing
+    """
+    rounds = int(params["num_rounds"])
+    moves = np.zeros((2, len(pairings), rounds), dtype=np.int8)
+
+    # Each strategy keeps its own and its opponents' moves for every match it plays, so the
+    # histories handed to it every round are plain views instead of gathered copies
+    players = {}
+    for idx, pairing in enumerate(pairings):
+        for side in (0, 1):
+            players.setdefault(pairing[side], ([], []))
+            players[pairing[side]][0].append(idx)
+            players[pairing[side]][1].append(side)
+
+    views = []
+    for strat_idx, (match_idx, sides) in players.items():
+        match_idx, sides = np.array(match_idx), np.array(sides)
+        own = np.zeros((len(match_idx), rounds), dtype=np.int8)
+        other = np.zeros((len(match_idx), rounds), dtype=np.int8)
+        views.append((strat_idx, match_idx, sides, own, other))
+
+    profiler = game_profiler.active
+    local = EngineProfiler() if profiler is not None else None
+    clock = time.perf_counter
+    started = clock()
+
+    for rnd in range(rounds):
+        for strat_idx, match_idx, sides, own, other in views:
+            own_hist, other_hist = own[:, :rnd], other[:, :rnd]
+            own_hist.flags.writeable = False
+            other_hist.flags.writeable = False
+
+            try:
+                call_start = clock() if local is not None else 0
+                plays = np.asarray(strategies[strat_idx].next_play_batch(own_hist, other_hist), dtype=np.int8)
+                if local is not None:
+                    local.record_call(strategies[strat_idx].get_meta()["name"] + " [batch]", clock() - call_start)
+
+                if plays.shape != (len(match_idx),) or not np.isin(plays, (0, 1)).all():
+                    raise ValueError("Invalid game state, batch play of shape {} with values {}".format(
+                        plays.shape, np.unique(plays)))
+            except Exception as e:
+                raise TournamentMatchError(pairings[match_idx[0]], str(e))
+
+            own[:, rnd] = plays
+            moves[sides, match_idx, rnd] = plays
+
+        for strat_idx, match_idx, sides, own, other in views:
+            other[:, rnd] = moves[1 - sides, match_idx, rnd]
+
+    if local is not None:
+        local.record_stage('engine per lockstep batch', clock() - started)
+        profiler.merge(local)
+
+    return [[moves[0, idx].copy(), moves[1, idx].copy()] for idx in range(len(pairings))]
+
+"""
+Payoff scoring
+"""
+def payoff_matrix(params) -> np.ndarray:
+    """
+    :param params: Match parameters with share_amount, steal_amount and steal_min_amount
+    :return: 2x2 matrix of the points a player gets, indexed by [player move, opponent move]
+    """
+    return np.array([
+        [params["steal_min_amount"], params["steal_amount"]],
+        [0, params["share_amount"]]
+    ])
+
+def array_to_moves(moves) -> list[GameMove]:
+    return [GameMove(int(mv)) for mv in moves]
+
+def moves_to_array(plays) -> np.ndarray:
+    """
+    :param plays: Engine history bytearray, int array, or sequence of GameMove
+    :return: Int8 array of GameMove values
+    """
+    if isinstance(plays, (bytes, bytearray)):
+        return np.frombuffer(plays, dtype=np.int8).copy()
+    if isinstance(plays, np.ndarray):
+        return plays.astype(np.int8, copy=False)
+
+    return np.fromiter((move_index(pl) for pl in plays), dtype=np.int8, count=len(plays))
+
+def score_moves(params, moves_one, moves_two):
+    """
+    Score any number of rounds or matches with a single payoff matrix lookup.
+
+    :param params: Match parameters
+    :param moves_one: Integer move array of the first player, shaped (rounds,) or (matches, rounds)
+    :param moves_two: Integer move array of the second player, same shape
+    :return: Per-round scores and cumulative scores, both stacked as [first player, second player]
+    """
+    payoffs = payoff_matrix(params)
+    scores = np.stack([payoffs[moves_one, moves_two], payoffs[moves_two, moves_one]])
+
+    return scores, np.cumsum(scores, axis=-1)
+
+def score_matches(params, match_moves) -> np.ndarray:
+    """
+    :param params: Match parameters, all matches must have been played with the same num_rounds
+    :param match_moves: List of [first player moves, second player moves] integer arrays per match
+    :return: Total scores shaped (matches, 2)
+    """
+    moves = np.array(match_moves, dtype=np.int8)
+    scores, _ = score_moves(params, moves[:, 0], moves[:, 1])
+
+    return scores.sum(axis=-1).T
+
+"""
+Tournament execution
+"""
+class MatchCache:
+    """
+    Size-bounded LRU cache of deterministic match outcomes, see match_key. Hits and misses count lookups,
+    a tournament playing the same match-up again in its own blocks doesn't look it up.
+    """
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            moves = self._entries.get(key)
+            if moves is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+
+        return moves
+
+    def put(self, key, moves) -> None:
+        with self._lock:
+            self._entries[key] = moves
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+def match_key(params, mgs):
+    """
+    :param params: Match parameters
+    :param mgs: The two strategies of the match
+    :return: Cache key of the match and whether its players are swapped in the key, or (None, False) if
+             either strategy is non-deterministic or wasn't imported from source
+    """
+    if not all(st.deterministic and st.source_hash for st in mgs):
+        return None, False
+
+    flipped = mgs[0].source_hash > mgs[1].source_hash
+    hashes = (mgs[1].source_hash, mgs[0].source_hash) if flipped else (mgs[0].source_hash, mgs[1].source_hash)
+
+    return hashes + (tuple(sorted(params.items())),), flipped
+
+class MatchForfeit:
+    """
+    Stands in for the moves of a match that a strategy forfeited by going over its time or memory budget.
+    """
+    def __init__(self, side, reason):
+        """
+        :param side: 0 or 1 for the player that forfeited, None if it couldn't be told
+        :param reason: What went over budget
+        """
+        self.side = side
+        self.reason = reason
+
+    def swapped(self):
+        return MatchForfeit(None if self.side is None else 1 - self.side, self.reason)
+
+    def __repr__(self) -> str:
+        return "MatchForfeit({!r}, {!r})".format(self.side, self.reason)
+
+def _swap_players(moves, swap):
+    if not swap:
+        return moves
+    return moves.swapped() if isinstance(moves, MatchForfeit) else moves[::-1]
+
+class TournamentMatchError(Exception):
+    """
+    First match of a tournament that raised, in pairing order.
+    """
+    def __init__(self, pairing, message):
+        super().__init__(message)
+        self.pairing = pairing
+
+# Strategy list of a tournament worker process, set once by the pool initializer
+_worker_strategies = None
+
+def _init_tournament_worker(payload):
+    global _worker_strategies
+    _worker_strategies = dill.loads(payload)
+    seed_modules_per_match()
+
+def _play_pairing(params, pairing, strategies=None, profiler=None, seed=None):
+    strats = _worker_strategies if strategies is None else strategies
+
+    try:
+        match_state = play_strategy_game(params, [strats[pairing[0]], strats[pairing[1]]], profiler, seed)
+        return [moves_to_array(match_state[0]), moves_to_array(match_state[1])], None
+    except Exception as e:
+        return None, str(e)
+
+def _play_chunk(params, chunk, profile=False, seeds=None):
+    # Workers profile into their own profiler and send it back with the chunk, along with how long every match took
+    profiler = EngineProfiler() if profile else None
+    seeds = [None] * len(chunk) if seeds is None else seeds
+    results, seconds = [], []
+
+    for pairing, seed in zip(chunk, seeds):
+        started = time.perf_counter()
+        results.append(_play_pairing(params, pairing, profiler=profiler, seed=seed))
+        seconds.append(time.perf_counter() - started)
+
+    return results, seconds, profiler
+
+class RoundRobin:
+    """
+    Every match-up of count strategies once per repeat, in itertools.combinations order. Pairings are made
+    as they are iterated, so a tournament of any length takes no memory up front.
+    """
+    def __init__(self, count: int, repeats: int = 1) -> None:
+        self.count = int(count)
+        self.repeats = max(0, int(repeats))
+        self.round_size = self.count * (self.count - 1) // 2
+
+    def __len__(self) -> int:
+        return self.round_size * self.repeats
+
+    def __iter__(self):
+        for _ in range(self.repeats):
+            yield from it.combinations(range(self.count), 2)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("pairing index out of range")
+
+        # Row `first` of the round starts at first * (2n - first - 1) / 2
+        k, n = idx % self.round_size, self.count
+        row_start = lambda row: row * (2 * n - row - 1) // 2
+
+        first = max(0, (2 * n - 1 - math.isqrt((2 * n - 1) ** 2 - 8 * k)) // 2)
+        while first > 0 and row_start(first) > k:
+            first -= 1
+        while row_start(first + 1) <= k:
+            first += 1
+
+        return first, first + 1 + k - row_start(first)
+
+def round_robin(count, repeats=1):
+    """
+    :param count: Number of strategies
+    :param repeats: Times every match-up is played
+    :return: RoundRobin sequence of (first, second) index pairings, every match-up once per repeat
+    """
+    return RoundRobin(count, repeats)
+
+class StrategyCosts:
+    """
+    Running estimate of the seconds every strategy adds to a match, learned from how long its matches take.
+    """
+    def __init__(self, smoothing: float = 0.2, maxsize: int = 4096) -> None:
+        """
+        :param smoothing: Weight of the newest match time in a strategy's moving average
+        :param maxsize: Strategies remembered, least recently timed are forgotten first
+        """
+        self.smoothing = smoothing
+        self.maxsize = maxsize
+        self._costs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, strategy):
+        return strategy.source_hash or id(strategy)
+
+    def estimate(self, strategies) -> np.ndarray:
+        """
+        :return: Estimated seconds per match of every strategy, ones never timed get the mean of the others
+                 (or 1 if none were)
+        """
+        with self._lock:
+            costs = np.array([self._costs.get(self._key(st), np.nan) for st in strategies], dtype=np.float64)
+
+        known = ~np.isnan(costs)
+        costs[~known] = costs[known].mean() if known.any() else 1.0
+        return costs
+
+    def record(self, mgs, seconds: float) -> None:
+        """
+        Split a match's time between its two strategies in proportion to their current estimates.
+        """
+        keys = [self._key(st) for st in mgs]
+
+        with self._lock:
+            old = [self._costs.get(key) for key in keys]
+            if old[0] is None or old[1] is None:
+                old = [old[0] or old[1] or 1.0, old[1] or old[0] or 1.0]
+
+            total = old[0] + old[1]
+            for key, cost in zip(keys, old):
+                share = seconds * cost / total if total > 0 else seconds / 2
+                previous = self._costs.pop(key, None)
+                self._costs[key] = share if previous is None else previous + self.smoothing * (share - previous)
+
+            while len(self._costs) > self.maxsize:
+                self._costs.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._costs.clear()
+
+# Match times of every tournament played in this process, used to schedule the next ones
+strategy_costs = StrategyCosts()
+
+# Pairings planned and played at a time, which bounds the memory a tournament of any length takes
+SCHEDULE_BLOCK = 4096
+
+def schedule_order(strategies, pairings, costs=None) -> np.ndarray:
+    """
+    :param strategies: List of strategy objects
+    :param pairings: List of (first, second) indexes into strategies
+    :param costs: Optional per-strategy costs, estimated from strategy_costs by default
+    :return: Estimated cost of every pairing, and positions into pairings with the slowest first
+    """
+    costs = strategy_costs.estimate(strategies) if costs is None else np.asarray(costs, dtype=np.float64)
+    pairs = np.asarray(pairings, dtype=np.int64).reshape(-1, 2)
+    pair_costs = costs[pairs[:, 0]] + costs[pairs[:, 1]]
+
+    return pair_costs, np.argsort(-pair_costs, kind='stable')
+
+def schedule_chunks(strategies, pairings, workers=1, max_chunk=64, costs=None) -> list[list[int]]:
+    """
+    Cut pairings into chunks of about equal estimated cost, a few per worker, with the slowest pairings in
+    the first chunks. Slow matches start early and every worker runs out of work at about the same time.
+
+    :param workers: Number of workers the chunks are shared between
+    :param max_chunk: Most pairings in a chunk
+    :return: List of chunks, each a list of positions into pairings, see schedule_order for the rest
+    """
+    if len(pairings) == 0:
+        return []
+
+    pair_costs, order = schedule_order(strategies, pairings, costs)
+    target = pair_costs.sum() / (max(1, workers) * 4)
+
+    chunks, chunk, chunk_cost = [], [], 0.0
+    for pos in order.tolist():
+        if chunk and (chunk_cost + pair_costs[pos] > target or len(chunk) >= max_chunk):
+            chunks.append(chunk)
+            chunk, chunk_cost = [], 0.0
+
+        chunk.append(pos)
+        chunk_cost += pair_costs[pos]
+
+    chunks.append(chunk)
+    return chunks
+
+def _blocks(pairings, size=SCHEDULE_BLOCK):
+    # (offset, list of pairings) of consecutive blocks, without listing every pairing at once
+    pairings, offset = iter(pairings), 0
+
+    while True:
+        block = list(it.islice(pairings, size))
+        if not block:
+            return
+
+        yield offset, block
+        offset += len(block)
+
+def iter_tournament(params, strategies, pairings, workers=1, cache=None, sandbox=None, seeds=None, cancel=None):
+    """
+    Play every pairing and yield (pairing, moves) as matches finish, in pairing order.
+    Pairings are taken SCHEDULE_BLOCK at a time and the matches of a block are played slowest first,
+    see schedule_chunks. Local workers are handed the next block before the current one is yielded, so
+    they don't sit idle while its last chunks drain. Closing the generator early cancels any matches
+    that have not started yet.
+
+    :param params: Match parameters
+    :param strategies: List of strategy objects
+    :param pairings: List of (first, second) indexes into strategies, or a RoundRobin
+    :param workers: Number of worker processes, 1 plays everything in this process
+    :param cache: Optional MatchCache, deterministic pairings are only played once and served from it afterwards
+    :param sandbox: Optional SandboxPool that plays every match-up with imported code instead of workers,
+                    in which case forfeited matches yield a MatchForfeit in place of their moves.
+                    A game_distributed.Coordinator plays them on remote workers the same way
+    :param seeds: Optional per-pairing seeds from match_seeds. Every match is then played one at a time
+                  with its own seed and params["noise"], and the cache is not used
+    :param cancel: Optional threading.Event of the job, sandboxes and coordinators raise TournamentMatchError
+                   when it is set while they wait on workers
+    :return: Generator of (pairing, [first player moves, second player moves])
+    """
+    # Worker processes are started once for all blocks. Sandboxes check their workers out per block,
+    # so they take one block at a time
+    players = sandbox if sandbox is not None else _LocalPool(workers)
+    ahead = 1 if sandbox is None else 0
+
+    started, previous = [], None
+    try:
+        for offset, block in _blocks(pairings):
+            if seeds is not None:
+                stream = _start_matches(players, params, strategies, block, seeds[offset:offset + len(block)], cancel)
+            elif cache is None:
+                stream = _start_played(params, strategies, block, players, sandbox is None, cancel)
+            else:
+                stream, previous = _start_cached(params, strategies, block, cache, players, sandbox is None, cancel, previous)
+
+            started.append(stream)
+            if len(started) > ahead:
+                yield from started.pop(0)
+
+        while started:
+            yield from started.pop(0)
+    finally:
+        for stream in started:
+            stream.close()
+
+        # A finished or failed tournament waits for its workers to exit, a cancelled one doesn't wait on running chunks
+        if sandbox is None:
+            players.close(wait=cancel is None or not cancel.is_set())
+
+def _start_matches(players, params, strategies, pairings, seeds=None, cancel=None):
+    # Local pools hand their chunks to the workers right away, other runners start once iterated
+    if isinstance(players, _LocalPool):
+        return players.start(params, strategies, pairings, seeds)
+    return players.iter_matches(params, strategies, pairings, seeds, cancel)
+
+def _start_cached(params, strategies, pairings, cache, players, batch, cancel=None, previous=None):
+    # Plans a block against the cache and starts playing it. Returns the block's generator and its
+    # (queued keys, fresh moves), which the next block's plan takes moves from instead of playing them again
+    keys = [match_key(params, [strategies[pairing[0]], strategies[pairing[1]]]) for pairing in pairings]
+    earlier_queued, earlier_fresh = previous if previous is not None else (set(), {})
+
+    # Only the first pairing of every uncached deterministic match-up needs playing. Cached moves are
+    # pinned for the block when it is planned, so evictions by other tournaments can't pull them out
+    # from under it
+    to_play, queued, pinned, plan = [], set(), {}, []
+    for pairing, (key, _) in zip(pairings, keys):
+        if key is not None and key not in queued and key not in pinned and key not in earlier_queued:
+            moves = cache.get(key)
+            if moves is not None:
+                pinned[key] = moves
+
+        needs_play = key is None or (key not in queued and key not in pinned and key not in earlier_queued)
+        plan.append(needs_play)
+
+        if needs_play:
+            to_play.append(pairing)
+            queued.add(key)
+
+    fresh = {}
+    played = _start_played(params, strategies, to_play, players, batch, cancel)
+
+    def stream():
+        try:
+            for pairing, (key, flipped), needs_play in zip(pairings, keys, plan):
+                if needs_play:
+                    _, moves = next(played)
+                    if key is None:
+                        yield pairing, moves
+                        continue
+
+                    # Cached moves are kept in key order, forfeits only count for this tournament
+                    moves = _swap_players(moves, flipped)
+                    fresh[key] = moves
+                    if not isinstance(moves, MatchForfeit):
+                        cache.put(key, moves)
+                else:
+                    # The block before this one is fully yielded by now, so its fresh moves are all in
+                    moves = pinned[key] if key in pinned else fresh[key] if key in fresh else earlier_fresh[key]
+
+                yield pairing, _swap_players(moves, flipped)
+        finally:
+            played.close()
+
+    return stream(), (queued, fresh)
+
+def _start_played(params, strategies, pairings, players, batch=True, cancel=None):
+    # Match-ups between state machines are table lookups, ones where both strategies play in batches
+    # run in lockstep here, and the rest are played one match at a time by the players.
+    # With a sandbox, only the table lookups stay here since everything else runs imported code.
+    tables, batched = [], []
+    for idx, pairing in enumerate(pairings):
+        mgs = (strategies[pairing[0]], strategies[pairing[1]])
+
+        if all(isinstance(st, StateMachineStrategy) for st in mgs):
+            tables.append(idx)
+        elif batch and all(supports_batch(st) for st in mgs):
+            batched.append(idx)
+
+    if not tables and not batched:
+        return _start_matches(players, params, strategies, pairings, cancel=cancel)
+
+    # The players start on the rest while the table and lockstep matches are worked out here
+    local = set(tables) | set(batched)
+    single = _start_matches(players, params, strategies, [pr for idx, pr in enumerate(pairings) if idx not in local],
+                            cancel=cancel)
+
+    played = {}
+    if tables:
+        played.update(zip(tables, play_tables(params, strategies, [pairings[idx] for idx in tables])))
+    if batched:
+        played.update(zip(batched, play_lockstep(params, strategies, [pairings[idx] for idx in batched])))
+
+    def stream():
+        try:
+            for idx, pairing in enumerate(pairings):
+                yield next(single) if idx not in played else (pairing, played[idx])
+        finally:
+            single.close()
+
+    return stream()
+
+class _LocalPool:
+    # Plays matches in this process, or on worker processes started the first time a block needs them and
+    # kept for the rest of the tournament. Seeded matches always go to a worker process, where seeding the
+    # random modules can't race another job. Same iter_matches as a SandboxPool.
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+
+    def iter_matches(self, params, strategies, pairings, seeds=None, cancel=None):
+        # Nothing here waits on anyone else's matches, the job checks cancel between them
+        yield from self.start(params, strategies, pairings, seeds)
+
+    def start(self, params, strategies, pairings, seeds=None):
+        """
+        Hand the pairings to the workers now, ahead of any blocks still being yielded.
+
+        :return: Generator of (pairing, moves) in pairing order
+        """
+        if seeds is None and (self.workers <= 1 or len(pairings) < 2):
+            return self._play_here(params, strategies, pairings)
+
+        workers = max(1, self.workers)
+        if self._executor is None:
+            # Strategies are exec'd classes, so they only survive the trip to a worker through dill.
+            # Spawned workers keep the threaded UI process out of fork().
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_tournament_worker, initargs=(dill.dumps(strategies),))
+
+        chunks = schedule_chunks(strategies, pairings, workers)
+        futures = [self._executor.submit(_play_chunk, params, [pairings[pos] for pos in chunk], game_profiler.active is not None,
+                                         None if seeds is None else [seeds[pos] for pos in chunk])
+                   for chunk in chunks]
+
+        return self._collect(strategies, pairings, chunks, futures)
+
+    def _play_here(self, params, strategies, pairings):
+        for pairing in pairings:
+            started = time.perf_counter()
+            moves, error = _play_pairing(params, pairing, strategies)
+            if error is not None:
+                raise TournamentMatchError(pairing, error)
+
+            strategy_costs.record((strategies[pairing[0]], strategies[pairing[1]]), time.perf_counter() - started)
+            yield pairing, moves
+
+    def _collect(self, strategies, pairings, chunks, futures):
+        chunk_of = [0] * len(pairings)
+        for chunk_idx, chunk in enumerate(chunks):
+            for pos in chunk:
+                chunk_of[pos] = chunk_idx
+
+        finished = {}
+        try:
+            for pos, pairing in enumerate(pairings):
+                if pos not in finished:
+                    chunk = chunks[chunk_of[pos]]
+                    results, seconds, profiler = futures[chunk_of[pos]].result()
+                    if profiler is not None and game_profiler.active is not None:
+                        game_profiler.active.merge(profiler)
+
+                    for chunk_pos, result, match_seconds in zip(chunk, results, seconds):
+                        finished[chunk_pos] = result
+                        strategy_costs.record((strategies[pairings[chunk_pos][0]], strategies[pairings[chunk_pos][1]]), match_seconds)
+
+                moves, error = finished.pop(pos)
+                if error is not None:
+                    raise TournamentMatchError(pairing, error)
+
+                yield pairing, moves
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self, wait=True):
+        """
+        :param wait: Wait for running chunks and for the workers to exit, so none are left for interpreter exit
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+def run_tournament(params, strategies, pairings, workers=1, cache=None, sandbox=None, seeds=None):
+    """
+    :return: List of [first player moves, second player moves] or MatchForfeit per pairing, see iter_tournament
+    """
+    return [moves for _, moves in iter_tournament(params, strategies, pairings, workers, cache, sandbox, seeds)]
+
+class TournamentJob:
+    """
+    Plays a tournament on a background thread and buffers finished matches until the UI collects them.
+    """
+    def __init__(self, params, strategies, pairings, workers=1, cache=None, sandbox=None):
+        self.params = dict(params)
+        self.strategies = list(strategies)
+        self.pairings = pairings
+        self.workers = workers
+        self.cache = cache
+        self.sandbox = sandbox
+
+        self.total = len(pairings)
+        self.completed = 0
+        self.forfeits = []
+        self.error = None
+        self.cancelled = False
+        self.finished = False
+        self.started = None
+        self.ended = None
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def run(self):
+        self.started = time.monotonic()
+
+        try:
+            self._play(self.pairings)
+        except TournamentMatchError as e:
+            self._failed(e)
+        finally:
+            self.ended = time.monotonic()
+            self.finished = True
+
+        return self
+
+    def _play(self, pairings, seeds=None):
+        matches = iter_tournament(self.params, self.strategies, pairings, self.workers, self.cache, self.sandbox, seeds,
+                                  self._cancel)
+
+        try:
+            for idx, (pairing, moves) in enumerate(matches):
+                if self._cancel.is_set():
+                    self.cancelled = True
+                    break
+
+                with self._lock:
+                    if isinstance(moves, MatchForfeit):
+                        self.forfeits.append((pairing, moves))
+                    else:
+                        self._pending.append((pairing, moves))
+                    self.completed += 1
+
+                if self._match_done(idx, pairing, moves):
+                    break
+        finally:
+            matches.close()
+
+    def _failed(self, error):
+        # Runners waiting on workers give up with an error when the job is cancelled
+        if self._cancel.is_set():
+            self.cancelled = True
+        else:
+            self.error = error
+
+    def _match_done(self, idx, pairing, moves) -> bool:
+        """
+        Called after every match, subclasses return True to stop the tournament there.
+        """
+        return False
+
+    def cancel(self):
+        self._cancel.set()
+
+    def collect(self):
+        """
+        :return: List of (pairing, moves) finished since the last call
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        return pending
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.ended or time.monotonic()) - self.started
+
+    def rate(self) -> float:
+        """
+        :return: Matches per second so far
+        """
+        elapsed = self.elapsed()
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> float | None:
+        """
+        :return: Estimated seconds until the tournament finishes, None before the first match
+        """
+        rate = self.rate()
+        return (self.total - self.completed) / rate if rate > 0 else None
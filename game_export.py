@@ -0,0 +1,165 @@
+"""
+GameTheoryUI results export
+by: Ari Stehney
+
+Encodes the scoreboard as CSV, Parquet or xlsx a chunk at a time straight from the results store,
+so an export never holds more than one chunk of rows in memory (xlsx excepted, see XLSX_MAX_ROWS).
+"""
+
+import csv, io, tempfile
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet export is unavailable without pyarrow, CSV and xlsx still work
+    pa = None
+
+from game_results import RESULT_COLUMNS
+
+EXPORT_COLUMNS = RESULT_COLUMNS + ['played_at']
+
+# Media type and file extension of every export format
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+# xlsx files are zip archives written at the end, so they are built in a spooled temp file and capped
+XLSX_MAX_ROWS = 250_000
+
+class ExportError(Exception):
+    """
+    An export that can't be produced, with the HTTP status to answer with.
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def _iter_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for chunk in chunks:
+        writer.writerows(row[:4] + (datetime.fromtimestamp(row[4]).isoformat(timespec='seconds'),) for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+class _ChunkSink:
+    """
+    Write-only file that hands back what was written since the last drain, while keeping tell()
+    counting from the start of the file as the Parquet footer needs.
+    """
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._written = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+def _iter_parquet(chunks):
+    schema = pa.schema([('strategy', pa.string()), ('score', pa.int64()), ('opponent', pa.string()),
+                        ('opponent_score', pa.int64()), ('played_at', pa.timestamp('ms'))])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+
+    # One row group per chunk
+    for chunk in chunks:
+        columns = list(zip(*chunk))
+        writer.write_table(pa.table([
+            pa.array(columns[0], pa.string()), pa.array(columns[1], pa.int64()),
+            pa.array(columns[2], pa.string()), pa.array(columns[3], pa.int64()),
+            pa.array([round(ts * 1000) for ts in columns[4]], pa.timestamp('ms'))
+        ], schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+def _iter_xlsx(chunks):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('scores')
+    sheet.append(EXPORT_COLUMNS)
+
+    for chunk in chunks:
+        for row in chunk:
+            sheet.append(row[:4] + (datetime.fromtimestamp(row[4]),))
+
+    with tempfile.SpooledTemporaryFile(max_size=16 * 2**20) as f:
+        workbook.save(f)
+        f.seek(0)
+
+        while data := f.read(2**20):
+            yield data
+
+def parse_time(value: str | None) -> float | None:
+    """
+    :param value: Unix time or an ISO date/datetime like 2024-05-01 or 2024-05-01T12:00
+    :return: Unix time, None if no value was given
+    """
+    if value is None or value == '':
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ExportError("Can't read '{}' as a date, use Unix time or YYYY-MM-DD[THH:MM]".format(value))
+
+def export_results(store, fmt: str, strategy: str | None = None, since: float | None = None, until: float | None = None):
+    """
+    :param store: game_results.ResultsStore to read from
+    :param fmt: One of EXPORT_FORMATS
+    :param strategy: Only rows of this strategy
+    :param since: Only rows played at or after this Unix time
+    :param until: Only rows played before this Unix time
+    :return: Generator of encoded byte chunks
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError("Unknown export format '{}', expected one of {}".format(fmt, ", ".join(EXPORT_FORMATS)))
+
+    if fmt == 'parquet' and pa is None:
+        raise ExportError("Parquet export needs pyarrow installed", status=501)
+
+    if fmt == 'xlsx':
+        rows = store.count(strategy, since, until)
+        if rows > XLSX_MAX_ROWS:
+            raise ExportError("{} rows is over the xlsx limit of {}, export CSV or Parquet instead".format(rows, XLSX_MAX_ROWS), status=413)
+
+    chunks = store.iter_rows(strategy, since, until)
+
+    if fmt == 'csv':
+        return _iter_csv(chunks)
+    elif fmt == 'parquet':
+        return _iter_parquet(chunks)
+    return _iter_xlsx(chunks)
@@ -0,0 +1,123 @@
+"""
+GameTheoryUI Git strategy import
+by: Ari Stehney
+
+Keeps a shallow local mirror of every strategy repository and re-imports only the files whose content
+changed since the last import, compiling new files in parallel.
+"""
+
+import hashlib, marshal, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+from git import Repo
+
+from game_registry import compile_strategy, exec_strategy, source_hash
+
+# Below this many changed files, compiling in worker processes costs more than it saves
+PARALLEL_COMPILE_MIN = 8
+
+def _compile_file(text):
+    # Compile and run the script once to catch errors, and send back the code object for the registry
+    try:
+        digest = source_hash(text)
+        code = compile_strategy(text, digest)
+        name = exec_strategy(code).get_meta()["name"]
+        return marshal.dumps(code), name, None
+    except Exception as e:
+        return None, None, "{}: {}".format(type(e).__name__, e)
+
+class GitMirror:
+    """
+    Directory of shallow clones, one per repository URL, that are fetched instead of cloned again.
+    """
+    def __init__(self, root: str = "git_mirrors") -> None:
+        self.root = root
+
+    def path(self, url: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16])
+
+    def sync(self, url: str) -> str:
+        """
+        Clone the repository the first time, afterwards fetch only the newest commit and check it out.
+
+        :return: Path of the up-to-date working tree
+        """
+        pth = self.path(url)
+
+        if os.path.isdir(os.path.join(pth, ".git")):
+            repo = Repo(pth)
+            repo.remotes.origin.fetch(depth=1)
+            repo.git.reset('--hard', 'FETCH_HEAD')
+            repo.git.clean('-fdx')
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            Repo.clone_from(url, pth, depth=1)
+
+        return pth
+
+def import_repo(url, registry, mirror, workers=1):
+    """
+    Bring a repository's strategies up to date in the registry.
+
+    :param url: Git repository URL
+    :param registry: StrategyRegistry to import into, it remembers which file became which strategy
+    :param mirror: GitMirror holding the local copy
+    :param workers: Worker processes for compiling changed files
+    :return: Report with one dict per file (path, status, name, error), where status is unchanged, added,
+             updated, removed or failed, and the changes as (old strategy or None, new strategy or None)
+    """
+    pth = mirror.sync(url)
+    known = registry.origins(url)
+
+    files = {}
+    for filename in sorted(os.listdir(pth)):
+        f = os.path.join(pth, filename)
+        if os.path.isfile(f) and f.endswith(".py"):
+            with open(f, mode='r') as fm:
+                files[filename] = fm.read()
+
+    report, changes = [], []
+    changed = []
+
+    for filename, text in files.items():
+        digest = source_hash(text)
+        if known.get(filename) == digest and registry.get(digest) is not None:
+            report.append({'path': filename, 'status': 'unchanged', 'name': registry.get(digest).get_meta()["name"], 'error': None})
+        else:
+            changed.append(filename)
+
+    texts = [files[filename] for filename in changed]
+    if workers > 1 and len(changed) >= PARALLEL_COMPILE_MIN:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            compiled = list(executor.map(_compile_file, texts))
+    else:
+        compiled = [_compile_file(text) for text in texts]
+
+    for filename, text, (code, name, error) in zip(changed, texts, compiled):
+        if error is not None:
+            report.append({'path': filename, 'status': 'failed', 'name': None, 'error': error})
+            continue
+
+        old = registry.get(known[filename]) if filename in known else None
+        strategy, _ = registry.add(text, marshal.loads(code))
+        registry.set_origin(url, filename, strategy.source_hash)
+
+        # The old version only goes if no other file, repository or upload still has the same source
+        if old is not None and old is not strategy and registry.remove_unreferenced(old.source_hash):
+            changes.append((old, strategy))
+        else:
+            changes.append((None, strategy))
+
+        report.append({'path': filename, 'status': 'updated' if filename in known else 'added', 'name': name, 'error': None})
+
+    # Files deleted from the repository take their strategies with them, unless they came from elsewhere too
+    for filename in sorted(set(known) - set(files)):
+        old = registry.get(known[filename])
+        registry.set_origin(url, filename, None)
+
+        if old is not None and registry.remove_unreferenced(old.source_hash):
+            changes.append((old, None))
+
+        report.append({'path': filename, 'status': 'removed', 'name': old.get_meta()["name"] if old else None, 'error': None})
+
+    report.sort(key=lambda row: row['path'])
+    return report, changes
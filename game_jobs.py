@@ -0,0 +1,213 @@
+"""
+GameTheoryUI job queue
+by: Ari Stehney
+
+One bounded queue for every match, tournament and simulation, shared by all clients. Runner threads
+take jobs from each owner in turn, so one client queueing many tournaments can't starve the others.
+Some runners only take short jobs, so single matches and imports never wait behind running tournaments.
+"""
+
+import itertools as it
+import threading, time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+class QueueFull(Exception):
+    """
+    The queue, or the owner's share of it, has no room for another job.
+    """
+
+class QueuedJob:
+    """
+    One submitted call, its state (queued, running, done, failed or cancelled) and a future of its result.
+    """
+    def __init__(self, id: int, owner, fn, args, kwargs, cancel=None, long=False) -> None:
+        self.id = id
+        self.owner = owner
+        self.long = long
+        self.future = Future()
+        self.status = 'queued'
+
+        self.submitted = time.time()
+        self.started = None
+        self.ended = None
+
+        self._fn, self._args, self._kwargs = fn, args, kwargs
+        self._cancel = cancel
+        self._cancelled = False
+
+    def run(self) -> None:
+        if not self.future.set_running_or_notify_cancel():
+            return
+
+        self.status = 'running'
+        self.started = time.time()
+
+        try:
+            result = self._fn(*self._args, **self._kwargs)
+        except BaseException as e:
+            self.status = 'failed'
+            self.future.set_exception(e)
+        else:
+            self.status = 'cancelled' if self._cancelled else 'done'
+            self.future.set_result(result)
+        finally:
+            self.ended = time.time()
+            self._fn = self._args = self._kwargs = None
+
+class JobQueue:
+    """
+    Queue of QueuedJobs per owner, served round robin by a fixed number of runner threads.
+    """
+    def __init__(self, runners: int = 2, short_runners: int = 1, max_pending: int = 64, max_per_owner: int = 8) -> None:
+        """
+        :param runners: Jobs run at once, tournaments bring their own worker processes on top
+        :param short_runners: Extra runners that never take long jobs
+        :param max_pending: Most jobs waiting over all owners
+        :param max_per_owner: Most jobs waiting for any one owner
+        """
+        self.max_pending = max_pending
+        self.max_per_owner = max_per_owner
+
+        self._owners = OrderedDict()
+        self._pending = 0
+        self._running = {}
+        self._ids = it.count(1)
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._threads = [threading.Thread(target=self._runner, name='job-runner-{}'.format(idx), daemon=True)
+                         for idx in range(max(1, runners))]
+        self._threads += [threading.Thread(target=self._runner, args=(True,), name='job-runner-short-{}'.format(idx),
+                                           daemon=True) for idx in range(max(0, short_runners))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, owner, fn, *args, cancel=None, long=False, **kwargs) -> QueuedJob:
+        """
+        :param owner: Client the job is queued for, owners take turns
+        :param fn: Callable run on a runner thread with args and kwargs
+        :param cancel: Callable that asks fn to stop early once it is running
+        :param long: The job may hold its runner for minutes, like a tournament, short runners leave it alone
+        :return: The queued job
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The job queue is closed")
+
+            if self._pending >= self.max_pending:
+                raise QueueFull("The job queue is full with {} jobs waiting, try again later".format(self._pending))
+
+            queue = self._owners.setdefault(owner, deque())
+            if len(queue) >= self.max_per_owner:
+                raise QueueFull("You already have {} jobs waiting, wait for one to start".format(len(queue)))
+
+            job = QueuedJob(next(self._ids), owner, fn, args, kwargs, cancel, long)
+            queue.append(job)
+            self._pending += 1
+            # Only some of the runners may take it
+            self._cond.notify_all()
+
+        return job
+
+    def position(self, job: QueuedJob) -> int | None:
+        """
+        :return: Jobs that will start before this one, None once it has left the queue
+        """
+        with self._cond:
+            queue = self._owners.get(job.owner, ())
+            if job not in queue:
+                return None
+
+            # Every turn serves one job from each owner with jobs left, in the current order
+            turn, ahead, before = list(queue).index(job), 0, True
+            for owner, other in self._owners.items():
+                if owner == job.owner:
+                    before = False
+                    continue
+                ahead += min(len(other), turn + 1 if before else turn)
+
+            return ahead + turn
+
+    def cancel(self, job: QueuedJob) -> bool:
+        """
+        Drop a waiting job, or ask a running one to stop if it was submitted with a cancel callable.
+
+        :return: Whether the job was dropped or asked to stop
+        """
+        with self._cond:
+            queue = self._owners.get(job.owner)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                if not queue:
+                    del self._owners[job.owner]
+                self._pending -= 1
+
+                job.status = 'cancelled'
+                job.future.cancel()
+                return True
+
+        if job.status == 'running' and job._cancel is not None:
+            job._cancelled = True
+            job._cancel()
+            return True
+
+        return False
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {'pending': self._pending, 'running': len(self._running), 'owners': len(self._owners),
+                    'runners': len(self._threads), 'max_pending': self.max_pending}
+
+    def close(self) -> None:
+        """
+        Cancel every waiting and running job and let the runner threads exit.
+        """
+        with self._cond:
+            self._closed = True
+            waiting = [job for queue in self._owners.values() for job in queue]
+            running = list(self._running.values())
+            self._cond.notify_all()
+
+        for job in waiting + running:
+            self.cancel(job)
+
+    def _next(self, short_only):
+        # (owner, job) of the first owner in line with a job this runner takes
+        for owner, queue in self._owners.items():
+            job = next((job for job in queue if not job.long), None) if short_only else queue[0]
+            if job is not None:
+                return owner, job
+
+        return None
+
+    def _take(self, owner, job) -> QueuedJob:
+        # The owner served goes to the back of the line
+        queue = self._owners[owner]
+        queue.remove(job)
+
+        if queue:
+            self._owners.move_to_end(owner)
+        else:
+            del self._owners[owner]
+
+        self._pending -= 1
+        return job
+
+    def _runner(self, short_only=False) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and self._next(short_only) is None:
+                    self._cond.wait()
+
+                if self._closed:
+                    return
+
+                job = self._take(*self._next(short_only))
+                self._running[job.id] = job
+
+            try:
+                job.run()
+            finally:
+                with self._cond:
+                    del self._running[job.id]
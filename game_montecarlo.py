@@ -0,0 +1,131 @@
+"""
+GameTheoryUI Monte-Carlo tournaments
+by: Ari Stehney
+
+Round robins played over and over with noisy moves and a seeded random stream per match, until every
+strategy's mean score per match is known to within a confidence interval.
+"""
+
+import time
+from statistics import NormalDist
+import numpy as np
+
+from game_engine import TournamentJob, TournamentMatchError, MatchForfeit, match_seeds, round_robin, score_matches
+
+class ScoreStats:
+    """
+    Running count, sum and sum of squares of every strategy's per-match scores.
+    """
+    def __init__(self, count: int) -> None:
+        self.matches = np.zeros(count, dtype=np.int64)
+        self.sums = np.zeros(count, dtype=np.float64)
+        self.squares = np.zeros(count, dtype=np.float64)
+
+    def add(self, ids, scores) -> None:
+        ids, scores = np.asarray(ids).ravel(), np.asarray(scores, dtype=np.float64).ravel()
+        size = len(self.matches)
+
+        self.matches += np.bincount(ids, minlength=size)
+        self.sums += np.bincount(ids, weights=scores, minlength=size)
+        self.squares += np.bincount(ids, weights=scores ** 2, minlength=size)
+
+    def means(self) -> np.ndarray:
+        return self.sums / np.maximum(self.matches, 1)
+
+    def halfwidths(self, confidence: float = 0.95) -> np.ndarray:
+        """
+        :return: Half-width of every mean's normal confidence interval, inf for strategies with fewer than two matches
+        """
+        n = self.matches.astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.maximum(self.squares - n * self.means() ** 2, 0.0) / (n - 1)
+            widths = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(variance / n)
+
+        return np.where(n > 1, widths, np.inf)
+
+class MonteCarloJob(TournamentJob):
+    """
+    TournamentJob that plays the round robin in batches of repeats with noise and per-match seeds, and stops
+    once every strategy's confidence interval is narrower than the target or max_repeats is reached.
+    """
+    def __init__(self, params, strategies, noise=0.0, seed=0, batch_repeats=10, max_repeats=200,
+                 ci_halfwidth=1.0, confidence=0.95, workers=1, sandbox=None):
+        """
+        :param noise: Probability of each move being flipped by mistake
+        :param seed: Seed of the whole run, the same seed replays the same matches
+        :param batch_repeats: Round robin repeats per batch, the intervals are checked between batches
+        :param max_repeats: Most round robin repeats to play
+        :param ci_halfwidth: Target half-width of every strategy's interval, in points per match
+        :param confidence: Confidence level of the intervals
+        """
+        pairings = round_robin(len(strategies), max_repeats)
+        super().__init__(dict(params, noise=float(noise)), strategies, pairings, workers, sandbox=sandbox)
+        self.round_size = pairings.round_size
+
+        self.seed = int(seed)
+        self.batch_repeats = max(1, int(batch_repeats))
+        self.ci_halfwidth = float(ci_halfwidth)
+        self.confidence = float(confidence)
+
+        self.stats = ScoreStats(len(self.strategies))
+        self._batch = []
+        self.repeats = 0
+        self.converged = False
+
+    def run(self):
+        self.started = time.monotonic()
+
+        # One pass over every repeat that might be needed, closed early once the intervals are tight,
+        # so worker processes are only started once
+        try:
+            self._play(self.pairings, match_seeds(self.seed, self.total))
+            self._add_batch()
+        except TournamentMatchError as e:
+            self._failed(e)
+        finally:
+            self.ended = time.monotonic()
+            self.finished = True
+
+        return self
+
+    def _match_done(self, idx, pairing, moves) -> bool:
+        if not isinstance(moves, MatchForfeit):
+            self._batch.append((pairing, moves))
+
+        if (idx + 1) % (self.batch_repeats * self.round_size) != 0:
+            return False
+
+        self._add_batch()
+
+        # One batch can't say anything about the spread yet
+        if self.repeats > self.batch_repeats and np.all(self.stats.halfwidths(self.confidence) <= self.ci_halfwidth):
+            self.converged = True
+        return self.converged
+
+    def _add_batch(self):
+        if self._batch:
+            self.stats.add([pairing for pairing, _ in self._batch], score_matches(self.params, [mv for _, mv in self._batch]))
+            self._batch = []
+
+        self.repeats = self.completed // max(1, self.round_size)
+
+    def eta(self) -> float | None:
+        # Upper bound, the run may stop early
+        return super().eta() if not self.finished else 0.0
+
+    def summary(self) -> list[dict]:
+        """
+        :return: Mean score per match and its confidence interval for every strategy, best mean first,
+                 with no interval for strategies that finished fewer than two matches
+        """
+        means, widths = self.stats.means(), self.stats.halfwidths(self.confidence)
+
+        rows = [{
+            'strategy': st.get_meta()["name"],
+            'matches': int(self.stats.matches[idx]),
+            'mean': float(means[idx]),
+            'ci_low': float(means[idx] - widths[idx]) if np.isfinite(widths[idx]) else None,
+            'ci_high': float(means[idx] + widths[idx]) if np.isfinite(widths[idx]) else None
+        } for idx, st in enumerate(self.strategies)]
+
+        return sorted(rows, key=lambda row: row['mean'], reverse=True)
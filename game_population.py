@@ -0,0 +1,121 @@
+"""
+GameTheoryUI population dynamics
+by: Ari Stehney
+
+Evolves a population of strategies using the mean payoffs from a tournament, with deterministic
+replicator dynamics or a stochastic Moran process. Payoffs are a square matrix where payoffs[i, j] is
+the mean score of strategy i against strategy j.
+"""
+
+import numpy as np
+
+def fill_payoffs(payoffs) -> np.ndarray:
+    """
+    :param payoffs: Mean payoff matrix, NaN where two strategies never met
+    :return: Copy with every missing payoff replaced by the mean payoff of its row strategy
+    """
+    payoffs = np.array(payoffs, dtype=np.float64)
+    row_means = np.nanmean(np.where(np.isnan(payoffs).all(axis=1, keepdims=True), 0.0, payoffs), axis=1)
+
+    missing = np.isnan(payoffs)
+    payoffs[missing] = np.broadcast_to(row_means[:, None], payoffs.shape)[missing]
+    return payoffs
+
+def replicator_dynamics(payoffs, shares=None, generations: int = 500, tol: float = 1e-9) -> np.ndarray:
+    """
+    Discrete-time replicator dynamics, every strategy grows in proportion to its payoff against the
+    current population.
+
+    :param payoffs: Square mean payoff matrix
+    :param shares: Starting population shares, defaults to equal shares
+    :param generations: Most generations to simulate
+    :param tol: Stop early once no share moves by more than this in a generation
+    :return: Population shares shaped (generations run + 1, strategies)
+    """
+    payoffs = np.asarray(payoffs, dtype=np.float64)
+    count = len(payoffs)
+
+    # Shift payoffs positive, replicator dynamics are unchanged by adding a constant
+    payoffs = payoffs - min(0.0, payoffs.min()) + 1.0
+
+    x = np.full(count, 1.0 / count) if shares is None else np.asarray(shares, dtype=np.float64) / np.sum(shares)
+    history = [x]
+
+    for _ in range(generations):
+        fitness = payoffs @ x
+        x_next = x * fitness / (x @ fitness)
+        history.append(x_next)
+
+        if np.abs(x_next - x).max() < tol:
+            break
+        x = x_next
+
+    return np.array(history)
+
+def moran_process(payoffs, population: int = 100, generations: int = 200, runs: int = 64,
+                  selection: float = 0.5, seed: int | None = None, updates: int = 8) -> np.ndarray:
+    """
+    Frequency-dependent Moran process, simulated for many independent runs at once. Every step one
+    individual is picked to reproduce with probability proportional to its fitness, and its offspring
+    replaces an individual picked uniformly at random. The steps of a generation are sampled in `updates`
+    batches, so a generation is a few array operations instead of `population` steps.
+
+    :param payoffs: Square mean payoff matrix
+    :param population: Number of individuals, starting as equal as possible between strategies
+    :param generations: Generations to simulate, one generation is `population` birth-death steps
+    :param runs: Independent runs to average over
+    :param selection: Intensity of selection between 0 (neutral drift) and 1
+    :param seed: Seed of the random number generator
+    :param updates: Batches of steps per generation. Parents of a batch are picked from the population and
+                    fitness at its start, with as many batches as individuals every step is exact
+    :return: Mean population shares over all runs shaped (generations + 1, strategies)
+    """
+    payoffs = np.asarray(payoffs, dtype=np.float64)
+    count = len(payoffs)
+    rng = np.random.default_rng(seed)
+
+    # Payoffs scaled to [0, 1] so fitness 1 - w + w * payoff stays positive
+    spread = payoffs.max() - payoffs.min()
+    scaled = (payoffs - payoffs.min()) / spread if spread > 0 else np.zeros_like(payoffs)
+    diagonal = np.diag(scaled)
+
+    counts = np.full((runs, count), population // count, dtype=np.int64)
+    counts[:, :population % count] += 1
+
+    history = np.empty((generations + 1, count))
+    history[0] = counts.mean(axis=0) / population
+
+    # Every individual's strategy, so deaths are random slots instead of a search over counts
+    members = np.tile(np.repeat(np.arange(count), counts[0]), (runs, 1))
+    offsets = (np.arange(runs) * count)[:, None]
+    sizes = np.diff(np.linspace(0, population, max(1, min(population, int(updates))) + 1).round().astype(np.int64))
+
+    for generation in range(generations):
+        for size in sizes:
+            others = (counts @ scaled.T - diagonal) / max(1, population - 1)
+            fitness = 1 - selection + selection * others
+
+            births = _pick(rng, counts * fitness, size, counts)
+            slots = rng.integers(population, size=(runs, size))
+
+            # A slot picked twice in a batch keeps one of its offspring, they are drawn alike
+            members[np.arange(runs)[:, None], slots] = births
+            counts = np.bincount((members + offsets).ravel(), minlength=runs * count).reshape(runs, count)
+
+        history[generation + 1] = counts.mean(axis=0) / population
+
+    return history
+
+def _pick(rng, weights, size, fallback):
+    # size indexes per row, with probability proportional to the row's weights. With full selection a run
+    # can be left with only zero-fitness individuals, those rows draw from the fallback weights instead
+    weights = np.where(weights.sum(axis=1, keepdims=True) > 0, weights, fallback)
+    cumulative = np.cumsum(weights, axis=1)
+    cumulative /= cumulative[:, -1:]
+
+    # Rows laid end to end on one axis, row r covering [r, r + 1], so one search serves every row
+    rows, columns = weights.shape
+    starts = np.arange(rows)[:, None]
+    picks = np.searchsorted((cumulative + starts).ravel(), (rng.random((rows, size)) + starts).ravel(), side='right')
+
+    return np.minimum(picks.reshape(rows, size) - starts * columns, columns - 1)
@@ -0,0 +1,129 @@
+"""
+GameTheoryUI engine profiler
+by: Ari Stehney
+
+Latency histograms for strategy calls and engine stages. Profiling is off unless enable() was called,
+and the engine only checks `active` once per match (or batch) while it is off.
+"""
+
+import math, threading
+from collections import defaultdict
+
+# Profiler the engine records into, None while profiling is off
+active = None
+
+class LatencyHistogram:
+    """
+    Log2-bucketed latency histogram, bucket i holds samples below 2**i microseconds.
+    """
+    BUCKETS = 40
+
+    def __init__(self) -> None:
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        micros = seconds * 1e6
+        bucket = 0 if micros < 1 else min(self.BUCKETS - 1, int(math.log2(micros)) + 1)
+
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: Percentile between 0 and 100
+        :return: Upper bound in seconds of the bucket the percentile falls in, capped at the max seen
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank, seen = q / 100 * self.count, 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.max, 2 ** bucket / 1e6)
+
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': 1e3 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1e3 * self.percentile(50),
+            'p95_ms': 1e3 * self.percentile(95),
+            'max_ms': 1e3 * self.max,
+            'total_s': self.total
+        }
+
+class EngineProfiler:
+    """
+    Per-strategy next_play latencies and per-stage engine timings.
+    """
+    def __init__(self) -> None:
+        self.strategies = defaultdict(LatencyHistogram)
+        self.stages = defaultdict(LatencyHistogram)
+        self._lock = threading.Lock()
+
+    def record_call(self, name: str, seconds: float) -> None:
+        self.strategies[name].add(seconds)
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage].add(seconds)
+
+    def merge(self, other: "EngineProfiler") -> None:
+        with self._lock:
+            for name, hist in other.strategies.items():
+                self.strategies[name].merge(hist)
+            for stage, hist in other.stages.items():
+                self.stages[stage].merge(hist)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.strategies.clear()
+            self.stages.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'strategies': {name: hist.summary() for name, hist in sorted(self.strategies.items())},
+                'stages': {stage: hist.summary() for stage, hist in sorted(self.stages.items())}
+            }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['strategies'], state['stages'] = dict(self.strategies), dict(self.stages)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.strategies = defaultdict(LatencyHistogram, state['strategies'])
+        self.stages = defaultdict(LatencyHistogram, state['stages'])
+        self._lock = threading.Lock()
+
+def enable() -> EngineProfiler:
+    global active
+
+    if active is None:
+        active = EngineProfiler()
+    return active
+
+def disable() -> None:
+    global active
+    active = None
+
+def record_stage(stage: str, seconds: float) -> None:
+    if active is not None:
+        active.record_stage(stage, seconds)
@@ -0,0 +1,271 @@
+"""
+GameTheoryUI strategy registry
+by: Ari Stehney
+
+Keeps the source text of every imported strategy keyed by its content hash, with the compiled
+code cached next to it so restarts don't have to compile or unpickle anything.
+"""
+
+import hashlib, marshal, sqlite3, threading, time, dis, inspect, types, os
+from importlib.util import MAGIC_NUMBER
+
+from game_class import GameStrategy, GameMove, StateMachineStrategy, MemoryStrategy
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def compile_strategy(text: str, digest: str):
+    return compile(text, '<strategy {}>'.format(digest[:12]), 'exec')
+
+# Names that mean a script draws on randomness or the clock
+_NONDETERMINISTIC_NAMES = {'random', 'randint', 'randrange', 'choice', 'choices', 'shuffle', 'sample', 'uniform',
+                           'urandom', 'secrets', 'uuid4', 'time', 'time_ns', 'perf_counter', 'monotonic', 'now'}
+
+# Instructions that change state from inside a method
+_STATE_OPS = {'STORE_ATTR', 'DELETE_ATTR', 'STORE_GLOBAL', 'DELETE_GLOBAL', 'STORE_SUBSCR', 'DELETE_SUBSCR'}
+
+def _changes_enclosing_state(co) -> bool:
+    # nonlocal assignments to a variable of an enclosing function
+    return any(ins.opname in ('STORE_DEREF', 'DELETE_DEREF') and ins.argval in co.co_freevars
+               for ins in dis.get_instructions(co))
+
+def _calls_method_on_state(co) -> bool:
+    # self.seen.append(...) and the like, a method called on one of the instance's own attributes, on a
+    # global (seen.append(...)) or on a variable of an enclosing function
+    owner = co.co_varnames[0] if co.co_argcount else None
+    recent = []
+    for ins in dis.get_instructions(co):
+        if ins.opname == 'LOAD_METHOD' or (ins.opname == 'LOAD_ATTR' and 'NULL|self' in ins.argrepr):
+            if recent and (recent[-1][0] == 'LOAD_GLOBAL' or (recent[-1][0] == 'LOAD_DEREF' and recent[-1][1] in co.co_freevars)):
+                return True
+            if owner is not None and len(recent) == 2 and recent[0] == ('LOAD_FAST', owner) and recent[1][0] == 'LOAD_ATTR':
+                return True
+
+        recent = (recent + [(ins.opname, ins.argval)])[-2:]
+
+    return False
+
+def detect_deterministic(code) -> bool:
+    """
+    Guess whether a strategy script always plays the same moves for the same histories.
+    A script is treated as non-deterministic if it touches randomness or the clock, or if a method
+    other than __init__ keeps state between matches: storing attributes, globals, subscripts or variables
+    of an enclosing function, or calling a method on one of the instance's attributes, a global or an
+    enclosing function's variable (self.seen.append(...), seen.append(...), self.d.update(...)).
+    """
+    stack = [code]
+
+    while stack:
+        co = stack.pop()
+        if not _NONDETERMINISTIC_NAMES.isdisjoint(co.co_names):
+            return False
+
+        if co.co_name != "__init__" and co.co_flags & inspect.CO_NEWLOCALS:
+            if any(ins.opname in _STATE_OPS for ins in dis.get_instructions(co)) or _changes_enclosing_state(co) or \
+                    _calls_method_on_state(co):
+                return False
+
+        stack.extend(const for const in co.co_consts if isinstance(const, types.CodeType))
+
+    return True
+
+def exec_strategy(code) -> GameStrategy:
+    """
+    :param code: Compiled strategy script
+    :return: The strategy object the script assigns to userGame
+    """
+    game_args = {}
+    exec(code, {'GameStrategy': GameStrategy, 'GameMove': GameMove, 'StateMachineStrategy': StateMachineStrategy,
+                'MemoryStrategy': MemoryStrategy}, game_args)
+
+    strategy = game_args['userGame']
+    if strategy.deterministic is None:
+        strategy.deterministic = detect_deterministic(code)
+
+    return strategy
+
+def load_strategy_dir(pth: str, skip=()) -> list[GameStrategy]:
+    """
+    Run every strategy script in a directory without storing it anywhere.
+
+    :param pth: Directory of strategy .py files
+    :param skip: File names to leave out
+    :return: Strategy objects in file name order, with source_hash set
+    """
+    loaded = []
+
+    for filename in sorted(os.listdir(pth)):
+        f = os.path.join(pth, filename)
+        if filename in skip or not filename.endswith(".py") or not os.path.isfile(f):
+            continue
+
+        with open(f, mode='r') as fm:
+            text = fm.read()
+
+        digest = source_hash(text)
+        strategy = exec_strategy(compile_strategy(text, digest))
+        strategy.source_hash = digest
+        loaded.append(strategy)
+
+    return loaded
+
+# Origin url of scripts uploaded by hand, with the content hash as their path
+UPLOAD_ORIGIN = "upload"
+
+class StrategyRegistry:
+    """
+    SQLite table of strategy sources and their marshalled code objects, one row per content hash.
+    Every strategy has at least one origin, a repository file or a manual upload, and is only dropped
+    by a re-import once none are left.
+    """
+    def __init__(self, pth: str) -> None:
+        self.pth = pth
+        self._loaded = {}
+        self._lock = threading.Lock()
+        self._add_lock = threading.Lock()
+        self._conn = sqlite3.connect(pth, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS strategies (
+                    id INTEGER PRIMARY KEY,
+                    hash TEXT NOT NULL UNIQUE,
+                    source TEXT NOT NULL,
+                    code BLOB NOT NULL,
+                    magic BLOB NOT NULL,
+                    added_at REAL NOT NULL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS origins (
+                    url TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (url, path)
+                )""")
+
+            # Strategies stored before uploads were recorded came from an upload or a repository that's gone
+            self._conn.execute("INSERT OR IGNORE INTO origins (url, path, hash) SELECT ?, hash, hash FROM strategies "
+                               "WHERE hash NOT IN (SELECT hash FROM origins)", (UPLOAD_ORIGIN,))
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._loaded
+
+    def get(self, digest: str) -> GameStrategy | None:
+        return self._loaded.get(digest)
+
+    def add(self, text: str, code=None, uploaded: bool = False) -> tuple[GameStrategy, bool]:
+        """
+        Compile, run and store a strategy script, unless one with the same source is already loaded.
+
+        :param text: Strategy script source
+        :param code: The script already compiled with compile_strategy, compiled here if not given
+        :param uploaded: Record a manual upload as an origin, so re-importing repositories never drops it
+        :return: The strategy object and whether it was new
+        """
+        digest = source_hash(text)
+
+        # Two clients uploading the same script at once get the same strategy object
+        with self._add_lock:
+            if digest in self._loaded:
+                if uploaded:
+                    self.set_origin(UPLOAD_ORIGIN, digest, digest)
+                return self._loaded[digest], False
+
+            code = compile_strategy(text, digest) if code is None else code
+            strategy = exec_strategy(code)
+            strategy.source_hash = digest
+
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO strategies (hash, source, code, magic, added_at) VALUES (?, ?, ?, ?, ?)",
+                    (digest, text, marshal.dumps(code), MAGIC_NUMBER, time.time()))
+                if uploaded:
+                    self._conn.execute("INSERT OR REPLACE INTO origins (url, path, hash) VALUES (?, ?, ?)",
+                                       (UPLOAD_ORIGIN, digest, digest))
+
+            self._loaded[digest] = strategy
+            return strategy, True
+
+    def load_all(self) -> list[GameStrategy]:
+        """
+        :return: Every stored strategy in the order it was added, run from the cached code where it is still valid
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT hash, source, code, magic FROM strategies ORDER BY id").fetchall()
+
+        loaded = []
+        for digest, text, code, magic in rows:
+            if digest not in self._loaded:
+                if magic == MAGIC_NUMBER:
+                    code = marshal.loads(code)
+                else:
+                    code = compile_strategy(text, digest)
+                    with self._lock, self._conn:
+                        self._conn.execute("UPDATE strategies SET code = ?, magic = ? WHERE hash = ?",
+                                           (marshal.dumps(code), MAGIC_NUMBER, digest))
+
+                strategy = exec_strategy(code)
+                strategy.source_hash = digest
+                self._loaded[digest] = strategy
+
+            loaded.append(self._loaded[digest])
+
+        return loaded
+
+    def origins(self, url: str) -> dict[str, str]:
+        """
+        :param url: Git repository the strategies were imported from
+        :return: Content hash of every file imported from it, by path in the repository
+        """
+        with self._lock:
+            return dict(self._conn.execute("SELECT path, hash FROM origins WHERE url = ?", (url,)).fetchall())
+
+    def set_origin(self, url: str, path: str, digest: str | None) -> None:
+        """
+        Record which strategy a repository file was imported as, or forget the file when digest is None.
+        """
+        with self._lock, self._conn:
+            if digest is None:
+                self._conn.execute("DELETE FROM origins WHERE url = ? AND path = ?", (url, path))
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO origins (url, path, hash) VALUES (?, ?, ?)", (url, path, digest))
+
+    def get_source(self, digest: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT source FROM strategies WHERE hash = ?", (digest,)).fetchone()
+
+        return row[0] if row else None
+
+    def remove_unreferenced(self, digest: str) -> bool:
+        """
+        Remove a strategy once no repository file or upload is recorded as its origin anymore.
+
+        :return: Whether it was removed
+        """
+        with self._add_lock:
+            with self._lock, self._conn:
+                if self._conn.execute("SELECT 1 FROM origins WHERE hash = ?", (digest,)).fetchone() is not None:
+                    return False
+                self._conn.execute("DELETE FROM strategies WHERE hash = ?", (digest,))
+
+            self._loaded.pop(digest, None)
+            return True
+
+    def remove(self, digest: str) -> None:
+        self._loaded.pop(digest, None)
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM strategies WHERE hash = ?", (digest,))
+            self._conn.execute("DELETE FROM origins WHERE hash = ?", (digest,))
+
+    def clear(self) -> None:
+        self._loaded.clear()
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM strategies")
+            self._conn.execute("DELETE FROM origins")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
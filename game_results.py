@@ -0,0 +1,352 @@
+"""
+GameTheoryUI results storage
+by: Ari Stehney
+
+Collects match scores for the Results tab scoreboard.
+"""
+
+import sqlite3, threading, time, os
+import numpy as np
+from typing import TYPE_CHECKING
+
+# pandas is imported where frames are built, so headless runs that only write rows don't pay for it
+if TYPE_CHECKING:
+    import pandas as pd
+
+RESULT_COLUMNS = ['strategy', 'score', 'opponent', 'opponent_score']
+
+class ResultsAccumulator:
+    """
+    Appends scoreboard rows into preallocated typed column buffers, with strategy names interned to ids.
+    Call to_frame() once the rows are needed as a DataFrame.
+    """
+    def __init__(self, capacity: int = 1024) -> None:
+        self.names = []
+        self._ids = {}
+
+        self.size = 0
+        self._strategy = np.empty(capacity, dtype=np.int32)
+        self._opponent = np.empty(capacity, dtype=np.int32)
+        self._score = np.empty(capacity, dtype=np.int64)
+        self._opponent_score = np.empty(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def intern(self, name: str) -> int:
+        """
+        :param name: Strategy name
+        :return: Id of the name in this accumulator
+        """
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self.names.append(name)
+
+        return self._ids[name]
+
+    def _reserve(self, rows: int) -> None:
+        needed = self.size + rows
+        if needed <= len(self._score):
+            return
+
+        capacity = max(needed, 2 * len(self._score))
+        for col in ('_strategy', '_opponent', '_score', '_opponent_score'):
+            grown = np.empty(capacity, dtype=getattr(self, col).dtype)
+            grown[:self.size] = getattr(self, col)[:self.size]
+            setattr(self, col, grown)
+
+    def add_matches(self, ids_one, ids_two, totals) -> None:
+        """
+        Add both scoreboard rows of every match, one row per player.
+
+        :param ids_one: Interned ids of the first players
+        :param ids_two: Interned ids of the second players
+        :param totals: Total scores shaped (matches, 2), as returned by game_engine.score_matches
+        """
+        ids_one, ids_two = np.asarray(ids_one), np.asarray(ids_two)
+        totals = np.asarray(totals).reshape(-1, 2)
+        count = len(totals)
+
+        self._reserve(2 * count)
+        rows = slice(self.size, self.size + 2 * count)
+
+        self._strategy[rows] = np.column_stack([ids_one, ids_two]).ravel()
+        self._opponent[rows] = np.column_stack([ids_two, ids_one]).ravel()
+        self._score[rows] = totals.ravel()
+        self._opponent_score[rows] = totals[:, ::-1].ravel()
+
+        self.size += 2 * count
+
+    def add_match(self, name_one: str, name_two: str, score_one, score_two) -> None:
+        self.add_matches([self.intern(name_one)], [self.intern(name_two)], [[score_one, score_two]])
+
+    def rows(self, start: int = 0, stop: int | None = None):
+        """
+        :param start: First row
+        :param stop: Row after the last one, defaults to every row added so far
+        :return: Generator of (strategy, score, opponent, opponent_score) tuples with names instead of ids
+        """
+        for idx in range(start, self.size if stop is None else min(stop, self.size)):
+            yield (self.names[self._strategy[idx]], int(self._score[idx]),
+                   self.names[self._opponent[idx]], int(self._opponent_score[idx]))
+
+    def per_strategy(self):
+        """
+        :return: Total scores and row counts as arrays indexed by interned id
+        """
+        ids = self._strategy[:self.size]
+        return (np.bincount(ids, weights=self._score[:self.size], minlength=len(self.names)).astype(np.int64),
+                np.bincount(ids, minlength=len(self.names)))
+
+    def pair_means(self) -> np.ndarray:
+        """
+        :return: Mean score of every strategy against every opponent shaped (names, names) and indexed by
+                 interned id, NaN where the two never met
+        """
+        count = len(self.names)
+        pairs = self._strategy[:self.size].astype(np.int64) * count + self._opponent[:self.size]
+
+        totals = np.bincount(pairs, weights=self._score[:self.size], minlength=count * count)
+        matches = np.bincount(pairs, minlength=count * count)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (totals / matches).reshape(count, count)
+
+    def to_frame(self, start: int = 0) -> "pd.DataFrame":
+        """
+        :param start: First row to include, to pick up only the rows added since an earlier call
+        """
+        import pandas as pd
+
+        return pd.DataFrame({
+            'strategy': pd.Categorical.from_codes(self._strategy[start:self.size], categories=self.names),
+            'score': self._score[start:self.size].copy(),
+            'opponent': pd.Categorical.from_codes(self._opponent[start:self.size], categories=self.names),
+            'opponent_score': self._opponent_score[start:self.size].copy()
+        }, columns=RESULT_COLUMNS)
+
+class ResultsStore:
+    """
+    Append-only SQLite scoreboard in WAL mode. Saving writes only the new rows.
+
+    Every append also updates running per-score counts and per-match-up totals, so the Results tab
+    standings are read from a few small tables instead of grouping every row.
+    """
+    def __init__(self, pth: str) -> None:
+        self.pth = pth
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(pth, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY,
+                    strategy TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    opponent TEXT NOT NULL,
+                    opponent_score INTEGER NOT NULL,
+                    played_at REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_strategy ON results (strategy)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_played_at ON results (played_at)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results_scores (
+                    strategy TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    PRIMARY KEY (strategy, score)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results_pairs (
+                    strategy TEXT NOT NULL,
+                    opponent TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    PRIMARY KEY (strategy, opponent)
+                )""")
+
+            # Stores written before the running totals existed get them counted once
+            if self._conn.execute("SELECT NOT EXISTS (SELECT 1 FROM results_scores) AND EXISTS (SELECT 1 FROM results)").fetchone()[0]:
+                self._tally(0)
+
+    def append(self, rows: "pd.DataFrame", played_at: float | None = None) -> int:
+        """
+        :param rows: New scoreboard rows with the RESULT_COLUMNS columns
+        :param played_at: Unix time the rows were played at, defaults to now
+        :return: Number of rows written
+        """
+        if len(rows) == 0:
+            return 0
+
+        return self.append_rows(zip(rows['strategy'].astype(str), rows['score'].astype(np.int64).tolist(),
+                                    rows['opponent'].astype(str), rows['opponent_score'].astype(np.int64).tolist()),
+                                played_at)
+
+    def append_rows(self, rows, played_at: float | None = None) -> int:
+        """
+        :param rows: Iterable of (strategy, score, opponent, opponent_score) tuples, like ResultsAccumulator.rows()
+        :param played_at: Unix time the rows were played at, defaults to now
+        :return: Number of rows written
+        """
+        played_at = time.time() if played_at is None else played_at
+
+        with self._lock, self._conn:
+            last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM results").fetchone()[0]
+            cursor = self._conn.executemany(
+                "INSERT INTO results (strategy, score, opponent, opponent_score, played_at) VALUES (?, ?, ?, ?, ?)",
+                (row + (played_at,) for row in rows))
+            self._tally(last_id)
+
+        return cursor.rowcount
+
+    def _tally(self, after: int) -> None:
+        # Add the rows past an id into the running totals, inside the caller's transaction
+        self._conn.execute("""
+            INSERT INTO results_scores (strategy, score, rows)
+            SELECT strategy, score, COUNT(*) FROM results WHERE id > ? GROUP BY strategy, score
+            ON CONFLICT (strategy, score) DO UPDATE SET rows = rows + excluded.rows""", (after,))
+        self._conn.execute("""
+            INSERT INTO results_pairs (strategy, opponent, total, rows)
+            SELECT strategy, opponent, SUM(score), COUNT(*) FROM results WHERE id > ? GROUP BY strategy, opponent
+            ON CONFLICT (strategy, opponent) DO UPDATE SET total = total + excluded.total, rows = rows + excluded.rows""",
+            (after,))
+
+    def load(self, strategy: str | None = None) -> "pd.DataFrame":
+        """
+        :param strategy: Only load the rows of this strategy
+        :return: Scoreboard rows in insertion order
+        """
+        query = "SELECT strategy, score, opponent, opponent_score FROM results"
+        args = ()
+
+        if strategy is not None:
+            query += " WHERE strategy = ?"
+            args = (strategy,)
+
+        import pandas as pd
+
+        with self._lock:
+            frame = pd.read_sql_query(query + " ORDER BY id", self._conn, params=args)
+
+        for col in ('strategy', 'opponent'):
+            frame[col] = frame[col].astype('category')
+
+        return frame
+
+    def score_counts(self) -> list[tuple]:
+        """
+        :return: (strategy, score, rows) for every score each strategy got, in score order
+        """
+        with self._lock:
+            return self._conn.execute("SELECT strategy, score, rows FROM results_scores ORDER BY strategy, score").fetchall()
+
+    def pair_totals(self) -> list[tuple]:
+        """
+        :return: (strategy, opponent, score sum, rows) for every match-up
+        """
+        with self._lock:
+            return self._conn.execute("SELECT strategy, opponent, total, rows FROM results_pairs").fetchall()
+
+    def rows_at(self, start: int = 0, limit: int = 50, strategy: str | None = None) -> list[tuple]:
+        """
+        :param start: Rows to skip, in insertion order
+        :param limit: Most rows to return
+        :param strategy: Only rows of this strategy
+        :return: List of (strategy, score, opponent, opponent_score) tuples
+        """
+        where, args = self._filters(strategy)
+        query = ("SELECT strategy, score, opponent, opponent_score FROM results"
+                 + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id LIMIT ? OFFSET ?")
+
+        with self._lock:
+            return self._conn.execute(query, args + [limit, max(0, start)]).fetchall()
+
+    def _filters(self, strategy=None, since=None, until=None):
+        where, args = [], []
+
+        if strategy is not None:
+            where.append("strategy = ?")
+            args.append(strategy)
+        if since is not None:
+            where.append("played_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("played_at < ?")
+            args.append(until)
+
+        return where, args
+
+    def count(self, strategy: str | None = None, since: float | None = None, until: float | None = None) -> int:
+        where, args = self._filters(strategy, since, until)
+        query = "SELECT COUNT(*) FROM results" + (" WHERE " + " AND ".join(where) if where else "")
+
+        with self._lock:
+            return self._conn.execute(query, args).fetchone()[0]
+
+    def iter_rows(self, strategy: str | None = None, since: float | None = None, until: float | None = None,
+                  chunk_size: int = 10_000):
+        """
+        Read the scoreboard a chunk at a time, holding the lock only while each chunk is fetched.
+
+        :param strategy: Only rows of this strategy
+        :param since: Only rows played at or after this Unix time
+        :param until: Only rows played before this Unix time
+        :param chunk_size: Rows per chunk
+        :return: Generator of lists of (strategy, score, opponent, opponent_score, played_at) tuples
+        """
+        last_id = 0
+
+        while True:
+            chunk = self.page(last_id, chunk_size, strategy, since, until)
+
+            if not chunk:
+                break
+
+            last_id = chunk[-1][0]
+            yield [row[1:] for row in chunk]
+
+    def page(self, after: int = 0, limit: int = 100, strategy: str | None = None, since: float | None = None,
+             until: float | None = None) -> list[tuple]:
+        """
+        Rows following a row id, paged by passing the id of the last row seen.
+
+        :param after: Row id to start after, 0 for the first page
+        :param limit: Most rows to return
+        :return: List of (id, strategy, score, opponent, opponent_score, played_at) tuples in id order
+        """
+        where, args = self._filters(strategy, since, until)
+        query = ("SELECT id, strategy, score, opponent, opponent_score, played_at FROM results WHERE "
+                 + " AND ".join(where + ["id > ?"]) + " ORDER BY id LIMIT ?")
+
+        with self._lock:
+            return self._conn.execute(query, args + [after, limit]).fetchall()
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("DELETE FROM results_scores")
+            self._conn.execute("DELETE FROM results_pairs")
+
+    def import_csv(self, pth: str) -> int:
+        """
+        One-time migration of a legacy scores.csv, which is renamed to .bak afterwards.
+
+        :return: Number of rows imported
+        """
+        if not os.path.exists(pth):
+            return 0
+
+        import pandas as pd
+
+        rows = 0
+        for chunk in pd.read_csv(pth, header=0, chunksize=100_000):
+            rows += self.append(chunk)
+
+        os.replace(pth, pth + ".bak")
+        return rows
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
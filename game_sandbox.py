@@ -0,0 +1,304 @@
+"""
+GameTheoryUI strategy sandbox
+by: Ari Stehney
+
+Long-lived worker processes that play matches between imported strategies under a per-move time
+budget and a per-worker memory budget, so a runaway strategy forfeits its match instead of freezing
+the server.
+"""
+
+import multiprocessing, os, signal, threading, time
+from multiprocessing.connection import wait
+import dill
+
+try:
+    import resource
+except ImportError:
+    # No rlimits on Windows, workers run without a memory budget there
+    resource = None
+
+# No SIGALRM on Windows either, there a runaway move is only stopped by the per-match deadline in iter_matches
+HAS_ALARM = hasattr(signal, "SIGALRM")
+
+import game_profiler
+from game_class import GameHistory
+from game_profiler import EngineProfiler
+from game_engine import moves_to_array, move_index, seed_match, seed_modules_per_match, schedule_order, strategy_costs, MatchForfeit, TournamentMatchError
+
+class MoveTimeout(Exception):
+    pass
+
+def _on_alarm(signum, frame):
+    raise MoveTimeout()
+
+def _set_memory_budget(memory_limit):
+    if resource is None or not memory_limit:
+        return
+
+    # The budget is on top of what the worker already maps after importing everything. Only Linux reports
+    # that, and macOS doesn't enforce RLIMIT_AS anyway, so other systems run without a budget
+    try:
+        with open("/proc/self/statm") as f:
+            mapped = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return
+
+    resource.setrlimit(resource.RLIMIT_AS, (mapped + memory_limit, mapped + memory_limit))
+
+def _play_guarded(params, mgs, move_timeout, profiler=None, seed=None):
+    match_state = [bytearray(), bytearray()]
+    names = [mgs[0].get_meta()["name"], mgs[1].get_meta()["name"]]
+    rounds = int(params["num_rounds"])
+    flips = seed_match(seed, rounds, float(params.get("noise", 0.0))).tolist() if seed is not None else None
+    started = time.perf_counter()
+
+    for rnd in range(rounds):
+        hist = (GameHistory(match_state[0], rnd), GameHistory(match_state[1], rnd))
+
+        for side in (0, 1):
+            if HAS_ALARM:
+                signal.setitimer(signal.ITIMER_REAL, move_timeout)
+            try:
+                call_start = time.perf_counter() if profiler is not None else 0
+                play = mgs[side].next_play(hist[side], hist[1 - side])
+                match_state[side].append(move_index(play) ^ flips[rnd][side] if flips is not None else move_index(play))
+                if profiler is not None:
+                    profiler.record_call(names[side], time.perf_counter() - call_start)
+            except MoveTimeout:
+                return MatchForfeit(side, "next_play took longer than {}s".format(move_timeout))
+            except MemoryError:
+                return MatchForfeit(side, "went over the memory budget")
+            finally:
+                if HAS_ALARM:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+
+    if profiler is not None:
+        profiler.record_stage('engine per match', time.perf_counter() - started)
+
+    return [moves_to_array(match_state[0]), moves_to_array(match_state[1])]
+
+def _sandbox_worker(conn, memory_limit):
+    if HAS_ALARM:
+        signal.signal(signal.SIGALRM, _on_alarm)
+    _set_memory_budget(memory_limit)
+    seed_modules_per_match()
+    loaded = {}
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+
+        if msg[0] == 'load':
+            loaded[msg[1]] = dill.loads(msg[2])
+        elif msg[0] == 'play':
+            _, params, key_one, key_two, move_timeout, profile, seed = msg
+            profiler = EngineProfiler() if profile else None
+
+            try:
+                conn.send(('ok', _play_guarded(params, [loaded[key_one], loaded[key_two]], move_timeout, profiler, seed), profiler))
+            except MemoryError:
+                conn.send(('ok', MatchForfeit(None, "went over the memory budget"), None))
+            except Exception as e:
+                conn.send(('error', str(e), None))
+        elif msg[0] == 'stop':
+            break
+
+class _Worker:
+    def __init__(self, memory_limit):
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_sandbox_worker, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self.loaded = set()
+        self.job = None
+        self.started = None
+        self.deadline = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class SandboxPool:
+    """
+    Pool of worker processes that stay up between matches and tournaments. Each worker remembers the
+    strategies it was sent, so a strategy only crosses the process boundary once per worker.
+    """
+    def __init__(self, workers: int = 2, move_timeout: float = 1.0, memory_limit: int = 512 * 2**20) -> None:
+        """
+        :param workers: Number of worker processes
+        :param move_timeout: Wall-clock seconds a strategy gets for every next_play call
+        :param memory_limit: Bytes a worker may map on top of its own startup footprint
+        """
+        self.size = max(1, int(workers))
+        self.move_timeout = move_timeout
+        self.memory_limit = memory_limit
+
+        if not HAS_ALARM:
+            print("Warning: no SIGALRM on this system, sandboxed strategies only have a per-match time budget")
+
+        # Idle workers, iter_matches checks them out for the length of a call so the lock is never
+        # held while a tournament is yielding
+        self._cond = threading.Condition()
+        self._idle = []
+        self._started = 0
+        self._generation = 0
+
+    def _strategy_key(self, strategy) -> str:
+        return strategy.source_hash or "id-{}".format(id(strategy))
+
+    def _checkout(self, pairing, cancel=None):
+        # Every idle worker, waiting while another call has them all
+        with self._cond:
+            while not self._idle and self._started >= self.size:
+                if cancel is not None and cancel.is_set():
+                    raise TournamentMatchError(pairing, "Cancelled while waiting for a sandbox worker")
+                self._cond.wait(None if cancel is None else 1.0)
+
+            workers, self._idle = self._idle, []
+            missing = self.size - self._started
+            self._started += missing
+            generation = self._generation
+
+        workers += [_Worker(self.memory_limit) for _ in range(missing)]
+        for worker_idx, worker in enumerate(workers):
+            if not worker.process.is_alive():
+                self._restart(workers, worker_idx)
+
+        return workers, generation
+
+    def _checkin(self, workers, generation):
+        with self._cond:
+            if generation == self._generation:
+                self._idle.extend(workers)
+                self._cond.notify_all()
+                return
+
+        # The pool was closed while these were out
+        for worker in workers:
+            self._stop(worker)
+
+    def _restart(self, workers, worker_idx):
+        workers[worker_idx].kill()
+        workers[worker_idx] = _Worker(self.memory_limit)
+        return workers[worker_idx]
+
+    def _stop(self, worker):
+        try:
+            worker.conn.send(('stop',))
+        except OSError:
+            pass
+        worker.process.join(timeout=1)
+        if worker.process.is_alive():
+            worker.kill()
+
+    def _dispatch(self, worker, params, strategies, job, seed=None):
+        idx, pairing = job
+        keys = []
+
+        for strat_idx in pairing:
+            key = self._strategy_key(strategies[strat_idx])
+            if key not in worker.loaded:
+                worker.conn.send(('load', key, dill.dumps(strategies[strat_idx])))
+                worker.loaded.add(key)
+            keys.append(key)
+
+        worker.conn.send(('play', params, keys[0], keys[1], self.move_timeout, game_profiler.active is not None, seed))
+        worker.job = job
+        worker.started = time.monotonic()
+
+        # Backstop for hangs the per-move alarm can't interrupt, like a long call into C code
+        worker.deadline = time.monotonic() + 2 * self.move_timeout * int(params["num_rounds"]) + 5
+
+    def iter_matches(self, params, strategies, pairings, seeds=None, cancel=None):
+        """
+        Play every pairing on the workers and yield (pairing, moves) in pairing order, where moves is a
+        MatchForfeit for matches a strategy forfeited.
+
+        :param params: Match parameters
+        :param strategies: List of strategy objects
+        :param pairings: List of (first, second) indexes into strategies
+        :param seeds: Optional per-pairing seeds, see game_engine.match_seeds
+        :param cancel: Optional threading.Event of the job, checked while waiting for workers another call has
+        :return: Generator of (pairing, [first player moves, second player moves] or MatchForfeit)
+        """
+        if not pairings:
+            return
+        params = dict(params)
+
+        # Slowest match-ups go out first, popped from the end
+        _, order = schedule_order(strategies, pairings)
+        queue = [(idx, pairings[idx]) for idx in order[::-1].tolist()]
+        finished, next_idx = {}, 0
+
+        workers, generation = self._checkout(pairings[0], cancel)
+
+        try:
+            while next_idx < len(pairings):
+                for worker_idx, worker in enumerate(workers):
+                    if worker.job is None and queue:
+                        job = queue.pop()
+                        try:
+                            self._dispatch(worker, params, strategies, job, None if seeds is None else seeds[job[0]])
+                        except OSError:
+                            # The worker died between matches, the pipe is gone
+                            finished[job[0]] = MatchForfeit(None, "worker process crashed")
+                            self._restart(workers, worker_idx)
+
+                busy = [worker for worker in workers if worker.job is not None]
+                timeout = max(0.0, min(worker.deadline for worker in busy) - time.monotonic()) if busy else 0.0
+
+                for conn in wait([worker.conn for worker in busy], timeout=timeout):
+                    worker = next(wk for wk in busy if wk.conn is conn)
+                    idx, pairing = worker.job
+                    worker.job = None
+
+                    try:
+                        status, result, profiler = conn.recv()
+                    except (EOFError, OSError):
+                        status, result, profiler = 'ok', MatchForfeit(None, "worker process crashed"), None
+                        self._restart(workers, workers.index(worker))
+
+                    if profiler is not None and game_profiler.active is not None:
+                        game_profiler.active.merge(profiler)
+
+                    if status == 'error':
+                        raise TournamentMatchError(pairing, result)
+                    finished[idx] = result
+                    strategy_costs.record((strategies[pairing[0]], strategies[pairing[1]]), time.monotonic() - worker.started)
+
+                for worker in list(busy):
+                    if worker.job is not None and time.monotonic() > worker.deadline:
+                        idx, pairing = worker.job
+                        finished[idx] = MatchForfeit(None, "match went over its time budget")
+                        strategy_costs.record((strategies[pairing[0]], strategies[pairing[1]]), time.monotonic() - worker.started)
+                        self._restart(workers, workers.index(worker))
+
+                while next_idx in finished:
+                    yield pairings[next_idx], finished.pop(next_idx)
+                    next_idx += 1
+        finally:
+            # Workers still busy with a match nobody waits for anymore are replaced
+            for worker_idx, worker in enumerate(workers):
+                if worker.job is not None:
+                    self._restart(workers, worker_idx)
+
+            self._checkin(workers, generation)
+
+    def close(self) -> None:
+        """
+        Stop the idle workers now and the busy ones as soon as their call finishes. The pool starts new
+        workers if it is used again.
+        """
+        with self._cond:
+            workers, self._idle = self._idle, []
+            self._started = 0
+            self._generation += 1
+            self._cond.notify_all()
+
+        for worker in workers:
+            self._stop(worker)
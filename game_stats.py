@@ -0,0 +1,134 @@
+"""
+GameTheoryUI results statistics
+by: Ari Stehney
+
+Per-strategy aggregates and the head-to-head matrix behind the Results tab charts, computed from the
+scoreboard store's running totals instead of shipping every row to the browser, and downsampled score traces for long matches
+in the Match View.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+
+SUMMARY_COLUMNS = ['strategy', 'matches', 'total', 'mean', 'min', 'q25', 'median', 'q75', 'max']
+
+class ResultsSummary:
+    """
+    Standings of the scoreboard, built from the store's per-score counts and per-match-up totals instead of
+    its rows.
+    """
+    def __init__(self, score_counts, pair_totals) -> None:
+        self.rows = 0
+        self._matches = {}
+
+        if not score_counts:
+            self.strategies = pd.DataFrame(columns=SUMMARY_COLUMNS)
+            self.head_to_head = pd.DataFrame()
+            return
+
+        counts = pd.DataFrame(score_counts, columns=['strategy', 'score', 'rows']).sort_values(['strategy', 'score'], kind='stable')
+        stats = []
+
+        for name, group in counts.groupby('strategy', sort=False):
+            scores, rows = group['score'].to_numpy(np.int64), group['rows'].to_numpy(np.int64)
+            matches, total = int(rows.sum()), int((scores * rows).sum())
+
+            stats.append([name, matches, total, total / matches, scores[0],
+                          *count_quantiles(scores, rows, [0.25, 0.5, 0.75]), scores[-1]])
+
+        # Leaderboard order, best total first
+        stats = pd.DataFrame(stats, columns=SUMMARY_COLUMNS)
+        self.strategies = stats.sort_values('total', ascending=False, kind='stable').reset_index(drop=True)
+        self._matches = dict(zip(stats['strategy'], stats['matches']))
+        self.rows = sum(self._matches.values())
+
+        # Mean score of the row strategy against the column opponent, in leaderboard order
+        names = self.names()
+        pairs = pd.DataFrame(pair_totals, columns=['strategy', 'opponent', 'total', 'rows'])
+        pairs['mean'] = pairs['total'] / pairs['rows']
+        self.head_to_head = pairs.pivot(index='strategy', columns='opponent', values='mean').reindex(index=names, columns=names)
+
+    def names(self) -> list[str]:
+        return [str(name) for name in self.strategies['strategy']]
+
+    def count(self, strategy: str | None = None) -> int:
+        if strategy is None:
+            return self.rows
+        return self._matches.get(strategy, 0)
+
+def count_quantiles(scores, rows, qs):
+    """
+    Quantiles of a sample given as its distinct values and how often each occurs, interpolated linearly
+    between neighbouring values like pandas does.
+
+    :param scores: Distinct values in ascending order
+    :param rows: Occurrences of each value
+    :param qs: Quantiles to compute, between 0 and 1
+    :return: Array of the quantiles
+    """
+    ends = np.cumsum(rows)
+    pos = (ends[-1] - 1) * np.asarray(qs, dtype=np.float64)
+    low, high = np.floor(pos), np.ceil(pos)
+
+    # The value at a 0-based position is the first one whose run of occurrences ends past it
+    at_low = scores[np.searchsorted(ends, low, side='right')]
+    at_high = scores[np.searchsorted(ends, high, side='right')]
+
+    return at_low + (at_high - at_low) * (pos - low)
+
+class SummaryCache:
+    """
+    Keeps the summary of the scoreboard store until new results are saved to it.
+    """
+    def __init__(self) -> None:
+        self._summary = None
+        self._lock = threading.Lock()
+
+    def get(self, store) -> ResultsSummary:
+        with self._lock:
+            if self._summary is None:
+                self._summary = ResultsSummary(store.score_counts(), store.pair_totals())
+
+            return self._summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self._summary = None
+
+def downsample_match(cumulative, shares, start: int = 0, stop: int | None = None, max_points: int = 2000):
+    """
+    Reduce one player's cumulative score trace over rounds [start, stop) to at most max_points points,
+    keeping the lowest and highest point of every bin so the drawn line has the same envelope.
+
+    :param cumulative: Cumulative score after every round
+    :param shares: 1 for every round the player shared, 0 where they stole
+    :param start: First round of the window
+    :param stop: Round after the last one of the window, defaults to the end of the match
+    :param max_points: Most points to return
+    :return: Round numbers, cumulative scores and the share rate of the bin each point falls in
+    """
+    cumulative, shares = np.asarray(cumulative), np.asarray(shares)
+    stop = len(cumulative) if stop is None else min(int(stop), len(cumulative))
+    start = min(max(0, int(start)), stop)
+    rounds = stop - start
+
+    if rounds <= max_points:
+        return np.arange(start, stop), cumulative[start:stop], shares[start:stop].astype(np.float64)
+
+    # Two points per bin, padding the last bin with its final value so argmin/argmax stay inside the window
+    size = -(-rounds // max(1, max_points // 2))
+    bins = -(-rounds // size)
+    pad = bins * size - rounds
+
+    window = np.pad(cumulative[start:stop], (0, pad), mode='edge').reshape(bins, size)
+    lows, highs = window.argmin(axis=1), window.argmax(axis=1)
+
+    base = start + np.arange(bins) * size
+    x = np.column_stack([base + np.minimum(lows, highs), base + np.maximum(lows, highs)]).ravel()
+
+    counts = np.full(bins, size)
+    counts[-1] -= pad
+    rates = np.pad(shares[start:stop], (0, pad)).reshape(bins, size).sum(axis=1) / counts
+
+    return x, cumulative[x], np.repeat(rates, 2)
@@ -9,126 +9,315 @@ Usage:
 
     $ python server.py
 
+    Tournaments can also be run without the UI, see tournament.py:
+
+    $ python tournament.py strategies/ -N 10 --output scores.db
+
+    Or submitted to a running server over the JSON API (/api/strategies, /api/tournaments, /api/results):
+
+    $ curl -X POST localhost:8080/api/tournaments -H 'Content-Type: application/json' -d '{"repeats": 10}'
+
+    Tournaments can be spread over other machines running worker.py, with Remote workers turned on in the
+    Tournament dialog and the same GAMETHEORYUI_AUTHKEY on both ends:
+
+    $ python worker.py server-host:6010 --processes 8
+
 Data:
-    scores.csv: Saves the scoreboard and game history from the Results tab on restarts.
-    strategies.bin: Python strategies class-list save state to persist imported scripts.
+    scores.db: Append-only SQLite scoreboard and game history from the Results tab, kept across restarts.
+               An old scores.csv is imported into it on first start.
+    strategies.db: Source of every imported strategy script keyed by content hash, with its compiled code cached.
+    strategies.bin: Legacy pickled strategies from before strategies.db, still loaded if present.
 """
 
-from nicegui import ui, events, app
+from nicegui import ui, events, app, Client
 
-import time, atexit, copy, io, uuid, shutil, os
+import time, shutil, os, asyncio, threading
 import dill as pickle
 import numpy as np
-import pandas as pd
 import os.path as path
 import plotly.graph_objects as go
-import plotly.express as px
-import git
-from git import Repo
-import itertools as it
 
 from threading import Timer
-from pprint import pprint
-from fastapi.responses import StreamingResponse
-from game_class import GameStrategy, GameMove
-
-# Match engine states
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import BaseModel, Field
+from urllib.parse import urlencode
+from game_results import ResultsAccumulator, ResultsStore, RESULT_COLUMNS
+from game_registry import StrategyRegistry
+from game_engine import run_strategy_game, score_moves, score_matches, run_tournament, round_robin, TournamentJob, MatchCache, MatchForfeit
+from game_sandbox import SandboxPool
+from game_stats import SummaryCache, downsample_match
+from game_population import fill_payoffs, replicator_dynamics, moran_process
+from game_montecarlo import MonteCarloJob
+from game_gitimport import GitMirror, import_repo
+from game_export import export_results, parse_time, ExportError, EXPORT_FORMATS
+from game_jobs import JobQueue, QueueFull
+from game_batch import BatchTournament
+from game_distributed import Coordinator, parse_address
+import game_profiler
+
+# Match engine states, the strategy library and scoreboard are shared by every client
 strategies = []
-match_games = []
-match_active = False
-match_results = pd.DataFrame(columns=['strategy', 'score', 'opponent', 'opponent_score'])
 
-# Match status
-match_parameters = {
+# Held while the shared library or scoreboard is changed, readers use whichever list or summary they see
+library_lock = threading.RLock()
+scoreboard_lock = threading.RLock()
+
+# Match status every new client starts from
+default_match_parameters = {
     "num_rounds": 20,
     "steal_amount": 5,
     "steal_min_amount": 1,
     "share_amount": 3
 }
 
-match_plays = [[], []]
-match_scores = [[], []]
-
-def run_strategy_game(params, mgs):
-    match_state = [[], []]
-    scores = [[], []]
-
-    for rnd in range(int(params["num_rounds"])):
-        prev_match_state = copy.deepcopy(match_state)
-
-        match_state[0].append(mgs[0].next_play(prev_match_state[0], prev_match_state[1]))
-        match_state[1].append(mgs[1].next_play(prev_match_state[1], prev_match_state[0]))
-
-    for rnd in zip(match_state[0], match_state[1]):
-        if rnd[0] == GameMove.STEAL and rnd[1] == GameMove.STEAL:
-            scores[0].append(params["steal_min_amount"])
-            scores[1].append(params["steal_min_amount"])
-        elif rnd[0] == GameMove.SHARE and rnd[1] == GameMove.SHARE:
-            scores[0].append(params["share_amount"])
-            scores[1].append(params["share_amount"])
-        elif rnd[0] == GameMove.STEAL:
-            scores[0].append(params["steal_amount"])
-            scores[1].append(0)
-        elif rnd[1] == GameMove.STEAL:
-            scores[1].append(params["steal_amount"])
-            scores[0].append(0)
-        else:
-            print("Invalid game state")
-            pprint(rnd)
+# Matches longer than this are drawn as binned cumulative traces instead of per-play waterfalls
+MATCH_VIEW_ROUND_LIMIT = 200
+MATCH_VIEW_MAX_POINTS = 2000
+
+# Waterfall label of every move, indexed by its GameMove value
+MOVE_LABELS = np.array(["Steal", "Share"])
+
+# Append-only scoreboard and strategy source registry, opened by load_dframe
+results_store = None
+strategy_registry = None
+
+# Tournament worker processes
+tournament_workers = os.cpu_count() or 1
+
+# Every match, tournament and simulation from every client and API caller waits its turn here,
+# started with the server so worker processes that import this module don't start runners
+job_queue = None
+
+# Results tab aggregates, reread from the store after new results are saved
+results_summary = SummaryCache()
+
+# Noisy repeated tournaments with seeded matches, off for every new client
+default_monte_carlo_options = {
+    "enabled": False,
+    "noise": 0.05,
+    "seed": 0,
+    "max_repeats": 200,
+    "ci_halfwidth": 1.0,
+    "confidence": 0.95
+}
+
+# Outcomes of deterministic match-ups, shared by all tournaments
+match_cache = MatchCache(maxsize=1024)
+
+# Budgets for imported strategies, played in long-lived sandbox workers when enabled
+sandbox_options = {
+    "enabled": True,
+    "move_timeout": 1.0,
+    "memory_mb": 512
+}
+strategy_sandbox = None
+
+def get_sandbox():
+    global strategy_sandbox
+
+    if not sandbox_options["enabled"]:
+        return None
+
+    if strategy_sandbox is None:
+        strategy_sandbox = SandboxPool(workers=tournament_workers, move_timeout=float(sandbox_options["move_timeout"]),
+                                       memory_limit=int(sandbox_options["memory_mb"]) * 2**20)
+
+    return strategy_sandbox
 
-    return match_state, scores
+def forfeit_message(mgs, forfeit):
+    who = "A strategy" if forfeit.side is None else mgs[forfeit.side].get_meta()["name"]
+    return "{} forfeited {} vs {}: {}".format(who, mgs[0].get_meta()["name"], mgs[1].get_meta()["name"], forfeit.reason)
+
+def play_single_match(params, mgs):
+    sandbox = get_sandbox()
+    if sandbox is None:
+        return run_strategy_game(params, mgs)
+
+    moves = run_tournament(params, mgs, [(0, 1)], sandbox=sandbox)[0]
+    if isinstance(moves, MatchForfeit):
+        raise RuntimeError(forfeit_message(mgs, moves))
+
+    return list(moves), score_moves(params, *moves)[0]
+
+def reset_sandbox():
+    global strategy_sandbox
+
+    # Workers pick up new budgets when the pool is next needed
+    if strategy_sandbox is not None:
+        strategy_sandbox.close()
+        strategy_sandbox = None
+
+# Remote worker.py processes that play tournaments in place of local workers when enabled,
+# connecting with the shared secret in $GAMETHEORYUI_AUTHKEY
+distributed_options = {
+    "enabled": False,
+    "address": "0.0.0.0:6010"
+}
+tournament_coordinator = None
+
+def get_coordinator():
+    global tournament_coordinator
+
+    if tournament_coordinator is None:
+        tournament_coordinator = Coordinator(parse_address(distributed_options["address"]),
+                                             authkey=os.environ.get("GAMETHEORYUI_AUTHKEY", "").encode("utf-8"))
+        print("Listening for tournament workers on {}:{}".format(*tournament_coordinator.address))
+
+    return tournament_coordinator
+
+def reset_coordinator():
+    global tournament_coordinator
+
+    if tournament_coordinator is not None:
+        tournament_coordinator.close()
+        tournament_coordinator = None
+
+def get_tournament_runner():
+    # Single matches always play here, tournaments go to the remote workers while they're turned on
+    if distributed_options["enabled"]:
+        return get_coordinator()
+    return get_sandbox()
+
+"""
+Per-client sessions and the shared job queue
+"""
+class ClientSession:
+    """
+    Match, tournament and Results tab state of one browser tab, the strategy library and scoreboard
+    are shared by every session.
+    """
+    def __init__(self, client_id):
+        self.id = client_id
+
+        self.match_games = []
+        self.match_active = False
+        self.match_plays = [[], []]
+        self.match_scores = [[], []]
+        self.match_parameters = dict(default_match_parameters)
+
+        self.tournament_job, self.tournament_queued = None, None
+        self.monte_carlo_options = dict(default_monte_carlo_options)
+        self.monte_carlo_summary = None
+
+        self.population_options = dict(default_population_options)
+        self.population_payoffs = None
+        self.population_history = None
+        self.results_page = dict(default_results_page)
+
+        self.git_repo_url = default_git_repo
+        self.git_report = []
+
+        # Elements of this client's page
+        self.dark_mode = 0
+        self.tabs, self.panels = None, None
+        self.tournament_dialog, self.git_dialog = None, None
+        self.tournament_controls = {}
+
+sessions = {}
+
+def session() -> ClientSession:
+    client = ui.context.client
+
+    if client.id not in sessions:
+        # Forget the sessions of closed tabs
+        for client_id in [cid for cid in sessions if cid not in Client.instances]:
+            del sessions[client_id]
+
+        sessions[client.id] = ClientSession(client.id)
+
+    return sessions[client.id]
+
+def refresh_own(view):
+    # refresh() redraws a view for every client, views of per-session state only need the current client's copy
+    client = ui.context.client
+
+    for target in view.targets:
+        if target.container.client is client:
+            target.container.clear()
+            target.run(view.func)
+
+async def run_queued(fn, *args, **kwargs):
+    # Wait for this client's turn on the shared job queue without blocking the event loop
+    job = job_queue.submit(session().id, fn, *args, **kwargs)
+    return await asyncio.wrap_future(job.future)
 
 """
 Score dataframe persistence functions.
 """
-def load_dframe(pth, pth_strats):
-    global match_results
+def load_dframe(pth, pth_registry, pth_strats):
     global strategies
+    global results_store
+    global strategy_registry
 
-    if path.exists(pth):
-        print("Loading data from", pth)
-        match_results = pd.read_csv(pth, header=0)
-        print(match_results)
-    else:
-        print("No data, starting from scratch.")
+    results_store = ResultsStore(pth)
+
+    # Move a scoreboard from before the SQLite store over once
+    legacy_pth = path.splitext(pth)[0] + ".csv"
+    if path.exists(legacy_pth):
+        print("Migrating data from", legacy_pth)
+        print("Imported {} rows".format(results_store.import_csv(legacy_pth)))
+
+    print("Loading strategies from", pth_registry)
+    strategy_registry = StrategyRegistry(pth_registry)
+    strategies = strategy_registry.load_all()
 
+    # Strategies pickled before the registry existed have no source to store, keep them as they are
     if path.exists(pth_strats):
-        print("Loading strategy data from", pth_strats)
+        print("Loading legacy strategy data from", pth_strats)
         with open(pth_strats, "rb") as f:
-            strategies = pickle.load(f)
-    else:
-        print("No strategy data, starting from scratch.")
+            strategies += pickle.load(f)
+
+def publish_results(new_results):
+    # Rows are saved as they arrive, the Results tab reads its standings back from the store's running totals
+    started = time.perf_counter()
+
+    with scoreboard_lock:
+        results_store.append(new_results)
+        results_summary.clear()
 
-def save_dframe(pth, pth_strats):
-    global match_results
+    game_profiler.record_stage('results save', time.perf_counter() - started)
+
+def save_legacy_strategies(pth_strats):
     global strategies
 
-    print("Saving data to {} and {}".format(pth, pth_strats))
+    # Registered strategies are saved as they're added, only the pickled ones need rewriting
+    if not path.exists(pth_strats):
+        return
+
+    print("Saving legacy strategies to {}".format(pth_strats))
 
-    match_results.to_csv(pth, index=False)
     with open(pth_strats, "wb") as f:
-        pickle.dump(strategies, f)
+        pickle.dump([st for st in strategies if st.source_hash is None], f)
 
 def clear_matches():
-    match_games.clear()
-    match_active = False
+    s = session()
+    s.match_games.clear()
+    s.match_active = False
 
-    match_view.refresh()
-    match_panel_view.refresh()
+    refresh_own(match_view)
+    refresh_own(match_panel_view)
 
 def clear_strategies():
     global strategies
 
-    strategies.clear()
+    with library_lock:
+        strategies.clear()
 
-    save_dframe("scores.csv", "strategies.bin")
+        strategy_registry.clear()
+        save_legacy_strategies("strategies.bin")
 
     match_view.refresh()
-    match_panel_view.refresh()
+    refresh_own(match_panel_view)
     main_panel.refresh()
 
 def exit_stop_server():
-    save_dframe("scores.csv", "strategies.bin")
+    job_queue.close()
+    reset_sandbox()
+    reset_coordinator()
+    results_store.close()
+    strategy_registry.close()
     exit()
 
 """
@@ -142,30 +331,69 @@ class NullContextManager(object):
     def __exit__(self, *args):
         pass
 
-dark_mode_status = 0
 def dark_mode_toggle():
-    global dark_mode_status
-    if dark_mode_status == 1:
+    s = session()
+    if s.dark_mode == 1:
         ui.dark_mode().disable()
-        dark_mode_status = 0
+        s.dark_mode = 0
     else:
         ui.dark_mode().enable()
-        dark_mode_status = 1
+        s.dark_mode = 1
 
 """
 Actual tabs and UI elements
 """
-tournamentDialog = None
 @ui.refreshable
 def tournament_view():
-    global tournamentDialog, strategies
+    s = session()
 
     # Make copy
-    tournament_strategies = strategies
+    tournament_strategies = list(strategies)
     Nslider = None
 
-    def run_games_all():
-        global match_active, panels, match_plays, match_scores, match_parameters, match_games, match_results, results_view
+    # Replaced on every redraw, a tournament that is still running updates whichever elements are current
+    ctl = s.tournament_controls
+
+    def add_tournament_results(params, results_acc, strategy_ids, finished):
+        # Score every finished match in one batched payoff lookup, with the parameters the job was started with
+        if finished:
+            started = time.perf_counter()
+            totals = score_matches(params, [moves for _, moves in finished])
+            scored = time.perf_counter()
+
+            results_acc.add_matches([strategy_ids[pairing[0]] for pairing, _ in finished],
+                                    [strategy_ids[pairing[1]] for pairing, _ in finished], totals)
+
+            game_profiler.record_stage('scoring per batch', scored - started)
+            game_profiler.record_stage('results append per batch', time.perf_counter() - scored)
+
+    def show_progress(job, queued):
+        position = job_queue.position(queued)
+        if position is not None:
+            ctl['progress_label'].set_text('Waiting for {} queued jobs'.format(position) if position else 'Next in the job queue')
+            return
+
+        ctl['progress_bar'].set_value(job.completed / job.total if job.total else 1)
+
+        eta = job.eta()
+        ctl['progress_label'].set_text('{} / {} matches, {:.1f} matches/sec, ETA {}{}'.format(
+            job.completed, job.total, job.rate(), '{:.0f}s'.format(eta) if eta is not None else '--',
+            ', {} forfeited'.format(len(job.forfeits)) if job.forfeits else ''))
+        show_cache_stats()
+
+    def show_cache_stats():
+        ctl['cache_label'].set_text('Match cache: {} hits, {} misses, {} / {} stored'.format(
+            match_cache.hits, match_cache.misses, len(match_cache), match_cache.maxsize))
+
+    def clear_match_cache():
+        match_cache.clear()
+        show_cache_stats()
+
+    def cancel_games_all():
+        if s.tournament_queued is not None:
+            job_queue.cancel(s.tournament_queued)
+
+    async def run_games_all():
         nonlocal tournament_strategies, Nslider
 
         errorDialog, eCode, eStrat = None, "", ""
@@ -187,54 +415,140 @@ def tournament_view():
 
         errorPanelTournamet()
 
-        results_scaff = pd.DataFrame(columns=['strategy', 'score', 'opponent', 'opponent_score'])
+        # A job cancelled while queued never runs, so it never finishes
+        if s.tournament_job is not None and not s.tournament_job.finished and not s.tournament_queued.future.done():
+            ui.notify('A tournament is already running', type='warning')
+            return 0
+
+        try:
+            runner = get_tournament_runner()
+        except (ValueError, OSError) as e:
+            ui.notify("Can't start the remote worker coordinator: {}".format(e), type='negative')
+            return 0
+
+        opts = s.monte_carlo_options
+        if opts["enabled"]:
+            job = MonteCarloJob(s.match_parameters, tournament_strategies, noise=opts["noise"], seed=opts["seed"],
+                                batch_repeats=Nslider.value, max_repeats=opts["max_repeats"],
+                                ci_halfwidth=opts["ci_halfwidth"], confidence=opts["confidence"],
+                                workers=int(tournament_workers), sandbox=runner)
+        else:
+            pairings = round_robin(len(tournament_strategies), Nslider.value)
+            job = TournamentJob(s.match_parameters, tournament_strategies, pairings, workers=int(tournament_workers),
+                                cache=match_cache, sandbox=runner)
 
-        for mt in list(it.combinations(tournament_strategies, 2))*Nslider.value:
-            match_games = list(mt)
-            match_active = True
-            match_panel_view.refresh()
+        try:
+            queued = job_queue.submit(s.id, job.run, cancel=job.cancel, long=True)
+        except QueueFull as e:
+            ui.notify(str(e), type='warning')
+            return 0
 
-            errorDialog, eCode, eStrat = None, "", ""
+        s.tournament_job, s.tournament_queued = job, queued
 
-            try:
-                match_plays, match_scores = run_strategy_game(match_parameters, match_games)
-            except Exception as e:
-                print('Error: {}'.format(e))
+        results_acc = ResultsAccumulator(capacity=2 * min(job.total, 1 << 16))
+        strategy_ids = [results_acc.intern(st.get_meta()["name"]) for st in tournament_strategies]
+        streamed = 0
+
+        ctl['start_button'].disable()
+        ctl['cancel_button'].enable()
+
+        # Wait for a turn on the job queue, then stream finished matches into the Results tab
+        task = asyncio.wrap_future(queued.future)
+        last_refresh, last_finished = time.monotonic(), None
 
-                eCode = str(e)
-                eStrat = match_games[0].get_meta()["name"] + ", " + match_games[1].get_meta()["name"]
+        while not task.done():
+            await asyncio.sleep(0.25)
+            show_progress(job, queued)
 
-                match_plays = [[], []]
-                match_scores = [[], []]
-                match_games.clear()
-                match_active = False
+            if time.monotonic() - last_refresh > 2:
+                finished = job.collect()
+                last_finished = finished[-1] if finished else last_finished
 
-                errorPanelTournamet.refresh()
-                errorDialog.open()
+                add_tournament_results(job.params, results_acc, strategy_ids, finished)
+                publish_results(results_acc.to_frame(streamed))
+                streamed = len(results_acc)
 
-                return 0
+                results_view.refresh()
+                last_refresh = time.monotonic()
 
-            if not eCode:
-                ndf = pd.DataFrame([
-                    {'strategy': match_games[0].get_meta()["name"], 'score': np.sum(match_scores[0]), 'opponent': match_games[1].get_meta()["name"], 'opponent_score': np.sum(match_scores[1])},
-                    {'strategy': match_games[1].get_meta()["name"], 'score': np.sum(match_scores[1]), 'opponent': match_games[0].get_meta()["name"], 'opponent_score': np.sum(match_scores[0])}
-                ])
+        if task.cancelled():
+            s.tournament_job, s.tournament_queued = None, None
+            ctl['start_button'].enable()
+            ctl['cancel_button'].disable()
+            ctl['progress_label'].set_text('Cancelled before it started')
+            return 0
 
-                results_scaff = pd.concat([results_scaff, ndf])
+        await task
+        finished = job.collect()
+        last_finished = finished[-1] if finished else last_finished
+
+        add_tournament_results(job.params, results_acc, strategy_ids, finished)
+        publish_results(results_acc.to_frame(streamed))
+        show_progress(job, queued)
+
+        # Population dynamics are simulated from this run's head-to-head means, not the all-time scoreboard
+        if len(results_acc) > 0:
+            s.population_payoffs = (list(results_acc.names), results_acc.pair_means())
+            s.population_history = None
+
+        ctl['start_button'].enable()
+        ctl['cancel_button'].disable()
 
-        match_results = pd.concat([match_results, results_scaff])
         results_view.refresh()
 
-        save_dframe("scores.csv", "strategies.bin")
+        if job.error is not None:
+            print('Error: {}'.format(job.error))
+
+            eCode = str(job.error)
+            eStrat = tournament_strategies[job.error.pairing[0]].get_meta()["name"] + ", " + tournament_strategies[job.error.pairing[1]].get_meta()["name"]
+
+            s.match_plays = [[], []]
+            s.match_scores = [[], []]
+            s.match_games.clear()
+            s.match_active = False
+
+            errorPanelTournamet.refresh()
+            errorDialog.open()
+
+            return 0
+
+        if job.forfeits:
+            for pairing, forfeit in job.forfeits:
+                print(forfeit_message([tournament_strategies[pairing[0]], tournament_strategies[pairing[1]]], forfeit))
+
+            pairing, forfeit = job.forfeits[0]
+            ui.notify('{} matches forfeited and left out of the results, e.g. {}'.format(
+                len(job.forfeits), forfeit_message([tournament_strategies[pairing[0]], tournament_strategies[pairing[1]]], forfeit)),
+                type='warning', multi_line=True)
+
+        if job.cancelled:
+            ui.notify('Tournament cancelled after {} of {} matches.'.format(job.completed, job.total), type='warning')
+            return 0
+
+        if isinstance(job, MonteCarloJob):
+            s.monte_carlo_summary = (job.confidence, job.summary())
+            ui.notify('Monte Carlo {} after {} repeats.'.format(
+                'converged' if job.converged else 'hit the repeat limit', job.repeats), type='info')
 
-        tournamentDialog.close()
+        # Leave the last match of the tournament in the match view
+        if last_finished is not None:
+            last_pairing, last_moves = last_finished
+
+            s.match_games = [tournament_strategies[last_pairing[0]], tournament_strategies[last_pairing[1]]]
+            s.match_plays = list(last_moves)
+            s.match_scores, _ = score_moves(job.params, *last_moves)
+            s.match_active = True
+
+            refresh_own(match_panel_view)
+
+        s.tournament_dialog.close()
 
         main_panel.refresh()
 
         ui.notify('Large match-up completed, opening results tab.', type='success')
-        Timer(2, lambda: panels.set_value('Results')).start()
+        Timer(2, lambda: s.panels.set_value('Results')).start()
 
-    with ui.dialog() as tournamentDialog, ui.card():
+    with ui.dialog() as s.tournament_dialog, ui.card():
 
         ui.markdown('#### Run Tournament <span class="material-icons-sharp">filter_list</span>')
         ui.markdown('This will match all strategies and play N equal rounds against each. Remove unwanted strategies and then start the tournament.')
@@ -262,11 +576,32 @@ def tournament_view():
             ui.space()
 
         def set_game_param(param, e):
-            global match_parameters
             print("Param updated: {}, {}".format(param, e))
-            match_parameters[param] = e
+            s.match_parameters[param] = e
+
+            refresh_own(match_view)
+
+        def set_workers(e):
+            global tournament_workers
+            tournament_workers = max(1, int(e or 1))
+            reset_sandbox()
+
+        def set_monte_carlo_option(option, e):
+            print("Monte Carlo option updated: {}, {}".format(option, e))
+            s.monte_carlo_options[option] = e
+
+        def set_sandbox_option(option, e):
+            print("Sandbox option updated: {}, {}".format(option, e))
+            sandbox_options[option] = e
+            reset_sandbox()
 
-            match_view.refresh()
+        def set_distributed_option(option, e):
+            print("Remote worker option updated: {}, {}".format(option, e))
+            distributed_options[option] = e
+
+            # A new address takes a new listener, workers reconnect to it on their own
+            if option == 'address':
+                reset_coordinator()
 
         with ui.row().classes('w-full'):
             ui.space()
@@ -274,27 +609,100 @@ def tournament_view():
             with ui.expansion('Match Options', icon='work').classes("w-11/12"):
                 with ui.column():
                     with ui.row():
-                        ui.number(label='Number of Rounds', value=match_parameters["num_rounds"],
+                        ui.number(label='Number of Rounds', value=s.match_parameters["num_rounds"],
                                   on_change=lambda e: set_game_param('num_rounds', e.value))
 
-                        ui.number(label='Share Amount (pts/$)', value=match_parameters["share_amount"],
+                        ui.number(label='Share Amount (pts/$)', value=s.match_parameters["share_amount"],
                                   on_change=lambda e: set_game_param('share_amount', e.value))
 
                     with ui.row():
-                        ui.number(label='Single Steal Amount (pts/$)', value=match_parameters["steal_amount"],
+                        ui.number(label='Single Steal Amount (pts/$)', value=s.match_parameters["steal_amount"],
                                   on_change=lambda e: set_game_param('steal_amount', e.value))
 
-                        ui.number(label='Double Steal Amount (pts/$)', value=match_parameters["steal_min_amount"],
+                        ui.number(label='Double Steal Amount (pts/$)', value=s.match_parameters["steal_min_amount"],
                                   on_change=lambda e: set_game_param('steal_min_amount', e.value))
 
+                    with ui.row():
+                        ui.number(label='Worker Processes', value=tournament_workers, min=1, precision=0,
+                                  on_change=lambda e: set_workers(e.value))
+
+                    with ui.row().classes('items-center'):
+                        ui.switch('Sandbox strategies', value=sandbox_options["enabled"],
+                                  on_change=lambda e: set_sandbox_option('enabled', e.value))
+
+                        ui.number(label='Move Time Limit (s)', value=sandbox_options["move_timeout"], min=0.01,
+                                  on_change=lambda e: set_sandbox_option('move_timeout', e.value))
+
+                        ui.number(label='Worker Memory Limit (MB)', value=sandbox_options["memory_mb"], min=16, precision=0,
+                                  on_change=lambda e: set_sandbox_option('memory_mb', e.value))
+
+                    with ui.row().classes('items-center'):
+                        ui.switch('Remote workers (worker.py)', value=distributed_options["enabled"],
+                                  on_change=lambda e: set_distributed_option('enabled', e.value))
+
+                        ui.input(label='Listen Address', value=distributed_options["address"],
+                                 on_change=lambda e: set_distributed_option('address', e.value))
+
+                        ui.label('{} connected'.format(len(tournament_coordinator.workers()) if tournament_coordinator else 0)).classes('text-sm')
+
+            ui.space()
+
+        with ui.row().classes('w-full'):
+            ui.space()
+
+            with ui.expansion('Monte Carlo', icon='casino').classes("w-11/12"):
+                ui.markdown('Play noisy repeats with a seeded random stream per match until every strategy\'s '
+                            'mean score is known to within the target interval. N is the number of repeats per batch.')
+
+                with ui.column():
+                    with ui.row().classes('items-center'):
+                        ui.switch('Monte Carlo tournament', value=s.monte_carlo_options["enabled"],
+                                  on_change=lambda e: set_monte_carlo_option('enabled', e.value))
+
+                        ui.number(label='Noise (flip probability)', value=s.monte_carlo_options["noise"], min=0, max=1, step=0.01,
+                                  on_change=lambda e: set_monte_carlo_option('noise', e.value))
+
+                        ui.number(label='Seed', value=s.monte_carlo_options["seed"], min=0, precision=0,
+                                  on_change=lambda e: set_monte_carlo_option('seed', e.value))
+
+                    with ui.row():
+                        ui.number(label='Max Repeats', value=s.monte_carlo_options["max_repeats"], min=1, precision=0,
+                                  on_change=lambda e: set_monte_carlo_option('max_repeats', e.value))
+
+                        ui.number(label='Target CI half-width (pts/match)', value=s.monte_carlo_options["ci_halfwidth"], min=0,
+                                  on_change=lambda e: set_monte_carlo_option('ci_halfwidth', e.value))
+
+                        ui.number(label='Confidence', value=s.monte_carlo_options["confidence"], min=0.5, max=0.999, step=0.01,
+                                  on_change=lambda e: set_monte_carlo_option('confidence', e.value))
+
             ui.space()
 
         ui.space()
 
+        with ui.row().classes('w-full items-center'):
+            ctl['progress_bar'] = ui.linear_progress(value=0, show_value=False).classes('w-full')
+            ctl['progress_label'] = ui.label('Not started').classes('text-sm')
+
+        with ui.row().classes('w-full items-center'):
+            ctl['cache_label'] = ui.label().classes('text-sm')
+            show_cache_stats()
+            ui.space()
+            ui.button('Clear cache', icon='delete', on_click=clear_match_cache).props('flat')
+
         with ui.row().classes('w-full'):
             ui.space()
-            ui.button('Start Tournament', on_click=lambda: run_games_all())
-            ui.button('Close', on_click=tournamentDialog.close)
+            ctl['start_button'] = ui.button('Start Tournament', on_click=run_games_all)
+            ctl['cancel_button'] = ui.button('Cancel', color='red', on_click=cancel_games_all)
+            ui.button('Close', on_click=s.tournament_dialog.close)
+
+        # Reopening the dialog picks up the session's tournament where it is
+        if s.tournament_job is not None:
+            show_progress(s.tournament_job, s.tournament_queued)
+
+        if s.tournament_job is not None and not s.tournament_queued.future.done():
+            ctl['start_button'].disable()
+        else:
+            ctl['cancel_button'].disable()
 
 
 @ui.refreshable
@@ -307,8 +715,8 @@ def class_view(cls, actions=True, card=True):
             with ui.row():
                 # Add class
                 def add_to_view():
-                    match_games.append(cls)
-                    match_view.refresh()
+                    session().match_games.append(cls)
+                    refresh_own(match_view)
 
                 with ui.button('', on_click=add_to_view):
                     ui.icon('add')
@@ -316,8 +724,17 @@ def class_view(cls, actions=True, card=True):
 
                 # Remove class
                 def remove_strategy():
-                    strategies.remove(cls)
-                    save_dframe("scores.csv", "strategies.bin")
+                    with library_lock:
+                        # Another client may have removed it first
+                        if cls not in strategies:
+                            return
+
+                        strategies.remove(cls)
+
+                        if cls.source_hash is not None:
+                            strategy_registry.remove(cls.source_hash)
+                        else:
+                            save_legacy_strategies("strategies.bin")
 
                     match_view.refresh()
                     main_panel.refresh()
@@ -326,22 +743,22 @@ def class_view(cls, actions=True, card=True):
                     ui.icon('delete')
                     ui.label("Remove")
 
-                ui.button('View results', on_click=lambda: panels.set_value('Results'))
+                ui.button('View results', on_click=lambda: session().panels.set_value('Results'))
 
 # Home page match options and current match status section view
 @ui.refreshable
-def match_view(clss):
-    global match_active, panels, match_parameters
+def match_view():
+    s = session()
+    clss = s.match_games
+
     with ui.column():
         ui.markdown('####Match Queue')
 
         with ui.row():
-            def start_match():
-                global match_active, panels, match_plays, match_scores, match_parameters, match_games
-
-                if len(match_games) == 2:
-                    match_active = True
-                    match_panel_view.refresh()
+            async def start_match():
+                if len(s.match_games) == 2:
+                    s.match_active = True
+                    refresh_own(match_panel_view)
 
                     errorDialog, eCode = None, ""
                     @ui.refreshable
@@ -360,47 +777,53 @@ def match_view(clss):
                     errorPanel()
 
                     try:
-                        match_plays, match_scores = run_strategy_game(match_parameters, match_games)
+                        # Play on the shared job queue so other clients keep rendering
+                        s.match_plays, s.match_scores = await run_queued(play_single_match, dict(s.match_parameters), list(s.match_games))
+                    except QueueFull as e:
+                        s.match_active = False
+                        refresh_own(match_panel_view)
+
+                        ui.notify(str(e), type='warning')
+                        return
                     except Exception as e:
                         print('Error: {}'.format(e))
 
                         eCode = str(e)
-                        match_plays = [[], []]
-                        match_scores = [[], []]
-                        match_games.clear()
-                        match_active = False
+                        s.match_plays = [[], []]
+                        s.match_scores = [[], []]
+                        s.match_games.clear()
+                        s.match_active = False
 
                         errorPanel.refresh()
                         errorDialog.open()
 
                     if not eCode:
-                        match_panel_view.refresh()
+                        refresh_own(match_panel_view)
 
                         ui.notify('Match started, jumping to match tab', type='success')
-                        Timer(1, lambda: panels.set_value('Match View')).start()
+                        Timer(1, lambda: s.panels.set_value('Match View')).start()
                 else:
                     ui.notify('Please select 2 teams before starting a match', type='warning')
 
             def set_game_param(param, e):
-                global match_parameters
                 print("Param updated: {}, {}".format(param, e))
-                match_parameters[param] = e
+                s.match_parameters[param] = e
 
             with ui.column():
                 with ui.expansion('Match Options', icon='work'):
                     with ui.column():
                         with ui.row():
-                            ui.number(label='Number of Rounds', value=match_parameters["num_rounds"],
+                            ui.number(label='Number of Rounds', value=s.match_parameters["num_rounds"],
                                       on_change=lambda e: set_game_param('num_rounds', e.value))
 
-                            ui.number(label='Share Amount (pts/$)', value=match_parameters["share_amount"],
+                            ui.number(label='Share Amount (pts/$)', value=s.match_parameters["share_amount"],
                                       on_change=lambda e: set_game_param('share_amount', e.value))
 
                         with ui.row():
-                            ui.number(label='Single Steal Amount (pts/$)', value=match_parameters["steal_amount"],
+                            ui.number(label='Single Steal Amount (pts/$)', value=s.match_parameters["steal_amount"],
                                       on_change=lambda e: set_game_param('steal_amount', e.value))
 
-                            ui.number(label='Double Steal Amount (pts/$)', value=match_parameters["steal_min_amount"],
+                            ui.number(label='Double Steal Amount (pts/$)', value=s.match_parameters["steal_min_amount"],
                                       on_change=lambda e: set_game_param('steal_min_amount', e.value))
 
 
@@ -429,114 +852,361 @@ def match_view(clss):
 # Results tab UI layout
 @ui.refreshable
 def results_view():
-    global match_results
+    s = session()
+    summary = results_summary.get(results_store)
 
     with ui.row():
-        # Match result visualization UI code
-        if match_results[match_results.columns[0]].count() > 0:
-            fig = px.bar(match_results, x='strategy', y='score', hover_data=['opponent', 'opponent_score'])
+        # Match result visualization UI code, drawn from per-strategy aggregates instead of every row
+        if summary.rows > 0:
+            stats = summary.strategies
+            names = summary.names()
+
+            fig = go.Figure(go.Bar(x=names, y=stats['total'], customdata=stats[['matches', 'mean']],
+                                   hovertemplate='%{x}<br>total: %{y}<br>matches: %{customdata[0]}<br>mean: %{customdata[1]:.2f}<extra></extra>'))
+            fig.update_layout(title='Total score', xaxis_title='strategy', yaxis_title='score')
 
             ui.plotly(fig)
 
-            fig_scatter = px.scatter(match_results, x='strategy', y='score', size=list(match_results['score']), color=list(match_results['score']), hover_data=['opponent', 'opponent_score'])
+            fig_box = go.Figure(go.Box(x=names, q1=stats['q25'], median=stats['median'], q3=stats['q75'],
+                                       lowerfence=stats['min'], upperfence=stats['max'], mean=stats['mean']))
+            fig_box.update_layout(title='Score per match', xaxis_title='strategy', yaxis_title='score')
+
+            ui.plotly(fig_box)
 
-            ui.plotly(fig_scatter)
+            h2h = summary.head_to_head
+            fig_h2h = go.Figure(go.Heatmap(z=h2h.values, x=names, y=names, colorscale='Viridis',
+                                           hovertemplate='%{y} vs %{x}<br>mean score: %{z:.2f}<extra></extra>'))
+            fig_h2h.update_layout(title='Head-to-head mean score', xaxis_title='opponent', yaxis_title='strategy')
+
+            ui.plotly(fig_h2h)
         else:
             with ui.column():
                 ui.markdown("#### No Data<br>")
                 ui.markdown("Run some games to show stats.")
 
+    if s.monte_carlo_summary is not None:
+        confidence, estimates = s.monte_carlo_summary
+
+        with ui.expansion('Monte Carlo Estimates ({:.0%} confidence)'.format(confidence), icon='casino').classes('w-full'):
+            ui.table(columns=[{'name': col, 'label': col, 'field': col} for col in ['strategy', 'matches', 'mean', 'ci_low', 'ci_high']],
+                     rows=[{key: round(val, 2) if isinstance(val, float) else val for key, val in row.items()}
+                           for row in estimates]).classes('w-full')
+
+    if s.population_payoffs is not None:
+        population_view()
+
+    if summary.rows > 0:
+        results_rows_view()
+
     with ui.row().classes('w-full'):
         ui.space()
 
         # Leaderboard clear function (mostly for debugging)
         def erase_scores():
-            global match_results
+            with scoreboard_lock:
+                results_store.clear()
+                results_summary.clear()
 
-            match_results = match_results.iloc[0:0]
             results_view.refresh()
-            save_dframe("scores.csv", "strategies.bin")
 
         ui.button("Erase score board", on_click=erase_scores)
 
-        # Excel export function
-        file_name = f'scores-{uuid.uuid4()}.xlsx'
-        download_path = f'/download/' + file_name
-        @app.get(download_path)
-        def download():
-            global match_results
+        # Export the stored scoreboard, filtered to the strategy picked below the charts
+        export_format = ui.select(list(EXPORT_FORMATS), value='xlsx').classes('w-24')
+
+        def download_results():
+            query = {'format': export_format.value}
+            if s.results_page["strategy"] is not None:
+                query['strategy'] = s.results_page["strategy"]
+
+            ui.download('/api/results/export?' + urlencode(query))
+
+        ui.button('Download results', on_click=download_results)
 
-            df_out = io.BytesIO()
-            match_results.to_excel(df_out)  # write to BytesIO buffer
-            df_out.seek(0)
+@app.get('/api/results/export')
+def export_route(format: str = 'csv', strategy: str | None = None, since: str | None = None, until: str | None = None):
+    try:
+        chunks = export_results(results_store, format, strategy, parse_time(since), parse_time(until))
+    except ExportError as e:
+        return JSONResponse({'error': str(e)}, status_code=e.status)
 
-            headers = {'Content-Disposition': f'attachment; filename={file_name}'}
-            return StreamingResponse(df_out, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers=headers)
+    media_type, ext = EXPORT_FORMATS[format]
+    file_name = 'scores-{}.{}'.format(time.strftime('%Y%m%d-%H%M%S'), ext)
 
-        ui.button('Download results', on_click=lambda: ui.download(download_path))
+    headers = {'Content-Disposition': f'attachment; filename={file_name}'}
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+# Population dynamics seeded from the mean payoffs of the client's last tournament, new clients start from these options
+default_population_options = {
+    "model": "Replicator",
+    "generations": 200,
+    "population": 100,
+    "selection": 0.5
+}
+
+def simulate_population(names, payoffs, opts):
+    # Round robins never pair a strategy with itself, its self-play payoff is its mean against the rest
+    payoffs = fill_payoffs(payoffs)
+
+    started = time.perf_counter()
+    if opts["model"] == "Replicator":
+        history = replicator_dynamics(payoffs, generations=int(opts["generations"]))
+    else:
+        history = moran_process(payoffs, population=max(len(names), int(opts["population"])),
+                                generations=int(opts["generations"]), selection=float(opts["selection"]))
+    game_profiler.record_stage('population dynamics', time.perf_counter() - started)
+
+    return history
 
 @ui.refreshable
-def match_panel_view():
-    global match_active, match_results, match_scores, match_plays
+def population_view():
+    s = session()
+    population_options = s.population_options
+
+    async def simulate():
+        names, payoffs = s.population_payoffs
+        opts = dict(population_options)
+
+        # The simulation waits its turn on the job queue like a tournament
+        try:
+            history = await run_queued(simulate_population, names, payoffs, opts)
+        except QueueFull as e:
+            ui.notify(str(e), type='warning')
+            return
+
+        s.population_history = (opts["model"], names, history)
+        refresh_own(population_view)
+
+    def set_option(option, e):
+        population_options[option] = e
+
+    with ui.expansion('Population Dynamics', icon='groups').classes('w-full'):
+        with ui.row().classes('w-full items-center'):
+            ui.select(['Replicator', 'Moran'], value=population_options["model"],
+                      on_change=lambda e: set_option("model", e.value)).classes('w-32')
+            ui.number(label='Generations', value=population_options["generations"], min=1, max=5000,
+                      on_change=lambda e: set_option("generations", e.value))
+            ui.number(label='Population (Moran)', value=population_options["population"], min=2, max=10000,
+                      on_change=lambda e: set_option("population", e.value))
+            ui.number(label='Selection (Moran)', value=population_options["selection"], min=0, max=1, step=0.1,
+                      on_change=lambda e: set_option("selection", e.value))
+            ui.space()
+            ui.button('Simulate', icon='play_arrow', on_click=simulate)
 
-    if len(match_games) == 2 and match_active:
-        with ui.row():
-            """
-            1st team visualization
-            """
-            fig_one = go.Figure(go.Waterfall(
-                name="20", orientation="v",
-                measure=["relative"]*len(match_scores[0]),
-                x=["Play {}".format(x) for x in range(len(match_scores[0]))],
-                textposition="outside",
-                text=["Steal" if pl == GameMove.STEAL else "Share" for pl in match_plays[0]],
-                y=match_scores[0],
-                connector={"line": {"color": "rgb(63, 63, 63)"}},
-            ))
+        if s.population_history is not None:
+            model, names, history = s.population_history
+
+            fig = go.Figure()
+            for idx, name in enumerate(names):
+                fig.add_trace(go.Scatter(x=list(range(len(history))), y=history[:, idx].tolist(), name=name,
+                                         mode='lines', stackgroup='population'))
+
+            fig.update_layout(title='{} population shares'.format(model), xaxis_title='Generation',
+                              yaxis_title='Share', yaxis_range=[0, 1])
+
+            ui.plotly(fig).classes('w-full')
+
+# Paginated drill-down into the raw scoreboard rows, where new clients start
+default_results_page = {
+    "strategy": None,
+    "page": 0,
+    "page_size": 50
+}
 
-            fig_one.update_layout(
-                title=match_games[0].get_meta()["name"],
-                showlegend=True
-            )
-
-            ui.plotly(fig_one)
-
-            """
-            2nd team visualization
-            """
-            fig_two = go.Figure(go.Waterfall(
-                name="20", orientation="v",
-                measure=["relative"] * len(match_scores[1]),
-                x=["Play {}".format(x) for x in range(len(match_scores[1]))],
-                textposition="outside",
-                text=["Steal" if pl == GameMove.STEAL else "Share" for pl in match_plays[1]],
-                y=match_scores[1],
-                connector={"line": {"color": "rgb(63, 63, 63)"}},
+@ui.refreshable
+def results_rows_view():
+    results_page = session().results_page
+    summary = results_summary.get(results_store)
+    strategy, page_size = results_page["strategy"], results_page["page_size"]
+
+    if strategy is not None and strategy not in summary.names():
+        strategy = results_page["strategy"] = None
+
+    pages = max(1, -(-summary.count(strategy) // page_size))
+    results_page["page"] = min(results_page["page"], pages - 1)
+
+    def set_strategy(e):
+        results_page["strategy"] = None if e.value == 'All strategies' else e.value
+        results_page["page"] = 0
+        refresh_own(results_rows_view)
+
+    def set_page(page):
+        results_page["page"] = page
+        refresh_own(results_rows_view)
+
+    with ui.column().classes('w-full'):
+        with ui.row().classes('w-full items-center'):
+            ui.select(['All strategies'] + summary.names(), value=strategy or 'All strategies', on_change=set_strategy).classes('w-64')
+            ui.space()
+            ui.button(icon='chevron_left', on_click=lambda: set_page(results_page["page"] - 1)).props('flat').set_enabled(results_page["page"] > 0)
+            ui.label('Page {} of {} ({} rows)'.format(results_page["page"] + 1, pages, summary.count(strategy)))
+            ui.button(icon='chevron_right', on_click=lambda: set_page(results_page["page"] + 1)).props('flat').set_enabled(results_page["page"] < pages - 1)
+
+        rows = results_store.rows_at(results_page["page"] * page_size, page_size, strategy)
+        ui.table(columns=[{'name': col, 'label': col, 'field': col} for col in RESULT_COLUMNS],
+                 rows=[dict(zip(RESULT_COLUMNS, row)) for row in rows]).classes('w-full')
+
+# Performance tab UI layout
+@ui.refreshable
+def performance_view():
+    def set_profiling(e):
+        if e.value:
+            game_profiler.enable()
+        else:
+            game_profiler.disable()
+
+        performance_view.refresh()
+
+    def reset_profiling():
+        if game_profiler.active is not None:
+            game_profiler.active.reset()
+
+        performance_view.refresh()
+
+    with ui.row().classes('w-full items-center'):
+        ui.switch('Profile strategies and engine', value=game_profiler.active is not None, on_change=set_profiling)
+        ui.space()
+        ui.button('Refresh', icon='refresh', on_click=performance_view.refresh)
+        ui.button('Reset', icon='delete', on_click=reset_profiling)
+        ui.button('JSON', icon='data_object', on_click=lambda: ui.open('/api/metrics', new_tab=True))
+
+    if game_profiler.active is None:
+        ui.markdown("#### Profiling Off<br>")
+        ui.markdown("Turn on profiling, then run some games to see where tournaments spend their time.")
+        return
+
+    snapshot = game_profiler.active.snapshot()
+    columns = [
+        {'name': 'name', 'label': 'Name', 'field': 'name', 'align': 'left', 'sortable': True},
+        {'name': 'count', 'label': 'Calls', 'field': 'count', 'sortable': True},
+        {'name': 'mean_ms', 'label': 'Mean (ms)', 'field': 'mean_ms', 'sortable': True},
+        {'name': 'p50_ms', 'label': 'p50 (ms)', 'field': 'p50_ms', 'sortable': True},
+        {'name': 'p95_ms', 'label': 'p95 (ms)', 'field': 'p95_ms', 'sortable': True},
+        {'name': 'max_ms', 'label': 'Max (ms)', 'field': 'max_ms', 'sortable': True},
+        {'name': 'total_s', 'label': 'Total (s)', 'field': 'total_s', 'sortable': True}
+    ]
+
+    def table_rows(stats):
+        return [dict({key: round(val, 4) for key, val in summary.items()}, name=name) for name, summary in stats.items()]
+
+    with ui.row().classes('w-full'):
+        ui.table(title='Strategy next_play latency', columns=columns, rows=table_rows(snapshot['strategies']), row_key='name').classes('w-full')
+        ui.table(title='Engine stages', columns=columns, rows=table_rows(snapshot['stages']), row_key='name').classes('w-full')
+
+@app.get('/api/metrics')
+def metrics_route():
+    if game_profiler.active is None:
+        return {'enabled': False}
+
+    return dict(game_profiler.active.snapshot(), enabled=True)
+
+# Match View charts for matches too long to draw play by play
+def long_match_view(rounds):
+    s = session()
+    match_games, match_plays, match_scores = s.match_games, s.match_plays, s.match_scores
+
+    # Both players' cumulative scores, binned on the server so the browser gets at most a few thousand points
+    cumulative = np.cumsum(match_scores, axis=1)
+    names = [match_games[0].get_meta()["name"], match_games[1].get_meta()["name"]]
+
+    def match_figure(start, stop):
+        fig = go.Figure()
+
+        for side in (0, 1):
+            x, y, rates = downsample_match(cumulative[side], match_plays[side], start, stop, MATCH_VIEW_MAX_POINTS)
+            fig.add_trace(go.Scattergl(
+                x=x.tolist(), y=y.tolist(), customdata=rates.tolist(), mode='lines' if len(x) > 200 else 'lines+markers',
+                name=names[side], hovertemplate='Play %{x}<br>Total: %{y}<br>Shared: %{customdata:.0%}<extra></extra>'
             ))
 
-            fig_two.update_layout(
-                title=match_games[1].get_meta()["name"],
-                showlegend=True
-            )
+        fig.update_layout(
+            title='Cumulative score over {} plays'.format(rounds),
+            xaxis_title='Play', yaxis_title='Score',
+            uirevision='match', showlegend=True
+        )
 
-            ui.plotly(fig_two)
+        return fig
 
-        def add_match_scores():
-            global match_results
+    def on_zoom(e):
+        args = e.args or {}
 
-            ndf = pd.DataFrame([
-                {'strategy': match_games[0].get_meta()["name"], 'score': np.sum(match_scores[0]), 'opponent': match_games[1].get_meta()["name"], 'opponent_score': np.sum(match_scores[1])},
-                {'strategy': match_games[1].get_meta()["name"], 'score': np.sum(match_scores[1]), 'opponent': match_games[0].get_meta()["name"], 'opponent_score': np.sum(match_scores[0])}
-            ])
+        # Rebin whatever window the user zoomed to, or the whole match on reset
+        if args.get('xaxis.autorange'):
+            start, stop = 0, rounds
+        elif 'xaxis.range[0]' in args:
+            start, stop = args['xaxis.range[0]'], args['xaxis.range[1]']
+        elif 'xaxis.range' in args:
+            start, stop = args['xaxis.range']
+        else:
+            return
 
-            match_results = pd.concat([match_results, ndf])
-            print(match_results)
-            results_view.refresh()
+        plot.update_figure(match_figure(int(np.floor(start)), int(np.ceil(stop)) + 1))
+
+    plot = ui.plotly(match_figure(0, rounds)).classes('w-full')
+    plot.on('plotly_relayout', on_zoom)
+
+@ui.refreshable
+def match_panel_view():
+    s = session()
+    match_games, match_plays, match_scores = s.match_games, s.match_plays, s.match_scores
 
-            save_dframe("scores.csv", "strategies.bin")
+    if len(match_games) == 2 and s.match_active:
+        rounds = len(match_scores[0])
+
+        with ui.row().classes('w-full'):
+            if rounds > MATCH_VIEW_ROUND_LIMIT:
+                long_match_view(rounds)
+            else:
+                """
+                1st team visualization
+                """
+                fig_one = go.Figure(go.Waterfall(
+                    name="20", orientation="v",
+                    measure=["relative"]*len(match_scores[0]),
+                    x=["Play {}".format(x) for x in range(len(match_scores[0]))],
+                    textposition="outside",
+                    text=MOVE_LABELS[match_plays[0]].tolist(),
+                    y=match_scores[0],
+                    connector={"line": {"color": "rgb(63, 63, 63)"}},
+                ))
+
+                fig_one.update_layout(
+                    title=match_games[0].get_meta()["name"],
+                    showlegend=True
+                )
+
+                ui.plotly(fig_one)
+
+                """
+                2nd team visualization
+                """
+                fig_two = go.Figure(go.Waterfall(
+                    name="20", orientation="v",
+                    measure=["relative"] * len(match_scores[1]),
+                    x=["Play {}".format(x) for x in range(len(match_scores[1]))],
+                    textposition="outside",
+                    text=MOVE_LABELS[match_plays[1]].tolist(),
+                    y=match_scores[1],
+                    connector={"line": {"color": "rgb(63, 63, 63)"}},
+                ))
+
+                fig_two.update_layout(
+                    title=match_games[1].get_meta()["name"],
+                    showlegend=True
+                )
+
+                ui.plotly(fig_two)
+
+        def add_match_scores():
+            results_acc = ResultsAccumulator(capacity=2)
+            results_acc.add_match(match_games[0].get_meta()["name"], match_games[1].get_meta()["name"],
+                                  np.sum(match_scores[0]), np.sum(match_scores[1]))
+
+            publish_results(results_acc.to_frame())
+            results_view.refresh()
 
             ui.notify('Scores saved, jumping to leaderboard tab', type='success')
-            Timer(2, lambda: panels.set_value('Results')).start()
+            Timer(2, lambda: s.panels.set_value('Results')).start()
 
         with ui.row().classes('w-full'):
             ui.space()
@@ -546,13 +1216,25 @@ def match_panel_view():
         ui.markdown("Select two teams and start a match to view statistics.")
 
 # Strategy class uploader
+def add_strategy(text: str):
+    with library_lock:
+        strategy, is_new = strategy_registry.add(text, uploaded=True)
+
+        if is_new:
+            strategies.append(strategy)
+
+    return strategy, is_new
+
 def handle_exec(text: str):
-    game_args = {}
-    exec(text, {'GameStrategy': GameStrategy, 'GameMove': GameMove}, game_args)
+    strategy, is_new = add_strategy(text)
+
+    if not is_new:
+        print("Strategy already imported: {}".format(strategy.get_meta()["name"]))
+        return strategy
 
-    strategies.append(game_args['userGame'])
     main_panel.refresh()
-    save_dframe("scores.csv", "strategies.bin")
+
+    return strategy
 
 def handle_upload(e: events.UploadEventArguments):
     text = e.content.read().decode('utf-8')
@@ -561,11 +1243,12 @@ def handle_upload(e: events.UploadEventArguments):
 # Home page layout
 @ui.refreshable
 def main_panel():
-    global panels
-    with ui.tab_panels(tabs, value='Game Classes').classes('w-full') as panels:
+    s = session()
+    # Redrawn when another client changes the library, so stay on the open tab
+    with ui.tab_panels(s.tabs, value=s.panels.value if s.panels is not None else 'Game Classes').classes('w-full') as s.panels:
         with ui.tab_panel('Game Classes'):
             with ui.row().classes('w-full'):
-                match_view(match_games)
+                match_view()
                 ui.space()
                 ui.upload(on_upload=handle_upload).classes('')
 
@@ -582,40 +1265,80 @@ def main_panel():
         with ui.tab_panel('Results'):
             results_view()
 
-# Git repo panel
-gitDialog = None
-gitRepoURL = ''
+        with ui.tab_panel('Performance'):
+            performance_view()
+
+# Git repo panel, new clients start with this repository URL
+default_git_repo = "https://github.com/CoderElectronics/gametheoryui-strategies"
+
+# Local shallow clones of imported repositories, fetched by one import at a time
+git_mirror = GitMirror("git_mirrors")
+git_lock = threading.Lock()
+
+def import_git_repo(url):
+    with git_lock:
+        report, changes = import_repo(url, strategy_registry, git_mirror, int(tournament_workers))
+
+    # Changed strategies take the place of the old ones, new ones go at the end
+    with library_lock:
+        for old, new in changes:
+            if old is not None and any(st is old for st in strategies):
+                idx = next(i for i, st in enumerate(strategies) if st is old)
+                if new is None or any(st is new for st in strategies):
+                    strategies.pop(idx)
+                else:
+                    strategies[idx] = new
+            elif new is not None and not any(st is new for st in strategies):
+                strategies.append(new)
+
+    return report
+
+@ui.refreshable
+def git_report_view():
+    git_report = session().git_report
+    if git_report:
+        ui.table(columns=[{'name': col, 'label': col, 'field': col} for col in ['path', 'status', 'name', 'error']],
+                 rows=git_report).classes('w-full')
 @ui.refreshable
 def repo_add():
-    global gitDialog, gitRepoURL
+    s = session()
 
-    with ui.dialog() as gitDialog, ui.card():
+    with ui.dialog() as s.git_dialog, ui.card():
         ui.markdown('#### Add Git Strategy Repository <span class="material-icons-sharp" style="color: green">store</span>')
-        ui.markdown('This will remove any important strategies and download all in the given Git reposity link.')
+        ui.markdown('This will import all strategies in the given Git repository link. Importing the same repository again only picks up files that changed.')
 
         def setRepoURL(x):
-            global gitRepoURL
-            gitRepoURL = x.value
+            s.git_repo_url = x.value
 
-        inURL = ui.input('Paste full URL here...', on_change=setRepoURL, value="https://github.com/CoderElectronics/gametheoryui-strategies").classes("w-full")
-        setRepoURL(inURL)
+        ui.input('Paste full URL here...', on_change=setRepoURL, value=s.git_repo_url).classes("w-full")
 
-        def addGitRepo():
-            global gitDialog, gitRepoURL
+        async def addGitRepo():
+            ui.notify('Fetching {}...'.format(s.git_repo_url))
 
-            Repo.clone_from(gitRepoURL, "imported")
+            try:
+                report = await run_queued(import_git_repo, s.git_repo_url)
+            except QueueFull as e:
+                ui.notify(str(e), type='warning')
+                return
+            except Exception as e:
+                print("Git import failed: {}".format(e))
+                ui.notify('Could not fetch the repository: {}'.format(e), type='negative', multi_line=True)
+                return
+
+            for row in report:
+                print("Git import {}: {} {}".format(row['path'], row['status'], row['error'] or ''))
 
-            for filename in os.listdir("imported/"):
-                f = os.path.join("imported", filename)
+            s.git_report = report
+            refresh_own(git_report_view)
 
-                if os.path.isfile(f) and f.endswith(".py"):
-                    with open(f, mode='r') as fm:
-                        handle_exec(fm.read())
+            main_panel.refresh()
 
-            shutil.rmtree("imported", ignore_errors=True)
+            failed = sum(row['status'] == 'failed' for row in report)
+            counts = {status: sum(row['status'] == status for row in report) for status in ('added', 'updated', 'removed', 'unchanged')}
+            ui.notify('{added} added, {updated} updated, {removed} removed, {unchanged} unchanged'.format(**counts)
+                      + (', {} failed'.format(failed) if failed else ''), type='warning' if failed else 'success')
 
-            ui.notify('All strategies imported successfully.', type='success')
-            gitDialog.close()
+        git_report_view()
 
         ui.space()
 
@@ -623,33 +1346,175 @@ def repo_add():
             ui.space()
             ui.button('Remove All Strats', on_click=clear_strategies, color='red')
             ui.button('Add Repo', on_click=addGitRepo)
-            ui.button('Close', on_click=gitDialog.close)
+            ui.button('Close', on_click=s.git_dialog.close)
+
+"""
+JSON batch API
+"""
+# API tournaments by job id, the oldest finished ones are forgotten past this many
+API_JOBS_KEPT = 1000
+api_jobs = OrderedDict()
+
+class StrategyUpload(BaseModel):
+    sources: list[str] = Field(min_length=1)
+
+class TournamentRequest(BaseModel):
+    strategies: list[str] | None = None
+    repeats: int = Field(1, ge=1, le=1000)
+    match_parameters: dict[str, int] = {}
+
+def strategy_json(strategy):
+    meta = strategy.get_meta()
+    return {'name': meta["name"], 'author': meta["author"], 'description': meta["description"], 'hash': strategy.source_hash}
+
+def run_batch_tournament(batch, loop):
+    batch.run()
+
+    # Partial results of failed and cancelled tournaments are kept, as in the UI
+    new_results = batch.results.to_frame()
+    if len(new_results):
+        publish_results(new_results)
+        loop.call_soon_threadsafe(results_view.refresh)
+
+    return batch
+
+def api_job_status(batch):
+    return dict(batch.status(), position=job_queue.position(batch.queued))
+
+@app.get('/api/strategies')
+def list_strategies_route():
+    return {'strategies': [strategy_json(st) for st in strategies]}
+
+@app.post('/api/strategies')
+async def upload_strategies_route(upload: StrategyUpload):
+    loop = asyncio.get_running_loop()
+    added, uploaded = 0, []
+
+    # Compiled and run off the event loop, then added to the library like an upload from the page
+    for text in upload.sources:
+        try:
+            strategy, is_new = await loop.run_in_executor(None, add_strategy, text)
+        except Exception as e:
+            uploaded.append({'error': "{}: {}".format(type(e).__name__, e)})
+            continue
+
+        added += is_new
+        uploaded.append(dict(strategy_json(strategy), new=is_new))
+
+    if added:
+        main_panel.refresh()
+
+    return {'strategies': uploaded}
+
+@app.post('/api/tournaments', status_code=202)
+async def submit_tournament_route(body: TournamentRequest, request: Request):
+    # Strategies can be picked by name or by source hash, all of them by default
+    by_key = {}
+    for st in strategies:
+        by_key.setdefault(st.get_meta()["name"], st)
+        by_key.setdefault(st.source_hash, st)
+
+    if body.strategies is None:
+        picked = list(strategies)
+    else:
+        unknown = [key for key in body.strategies if key not in by_key]
+        if unknown:
+            return JSONResponse({'error': 'Unknown strategies: {}'.format(', '.join(unknown))}, status_code=400)
+        picked = [by_key[key] for key in body.strategies]
+
+    if len(picked) < 2:
+        return JSONResponse({'error': 'A tournament needs at least 2 strategies'}, status_code=400)
+
+    unknown = sorted(set(body.match_parameters) - set(default_match_parameters))
+    if unknown:
+        return JSONResponse({'error': 'Unknown match parameters: {}'.format(', '.join(unknown))}, status_code=400)
+
+    try:
+        runner = get_tournament_runner()
+    except (ValueError, OSError) as e:
+        return JSONResponse({'error': "Can't start the remote worker coordinator: {}".format(e)}, status_code=503)
+
+    batch = BatchTournament(dict(default_match_parameters, **body.match_parameters), picked, body.repeats,
+                            workers=int(tournament_workers), cache=match_cache, sandbox=runner)
+
+    # Callers share the queue fairly by address, like browser tabs by session
+    try:
+        batch.queued = job_queue.submit('api:{}'.format(request.client.host if request.client else ''),
+                                        run_batch_tournament, batch, asyncio.get_running_loop(), cancel=batch.cancel,
+                                        long=True)
+    except QueueFull as e:
+        return JSONResponse({'error': str(e)}, status_code=429)
+
+    api_jobs[batch.queued.id] = batch
+
+    for job_id in [job_id for job_id, job in api_jobs.items() if job.queued.future.done()][:max(0, len(api_jobs) - API_JOBS_KEPT)]:
+        del api_jobs[job_id]
+
+    return api_job_status(batch)
+
+@app.get('/api/tournaments/{job_id}')
+def tournament_status_route(job_id: int):
+    if job_id not in api_jobs:
+        return JSONResponse({'error': 'No tournament {}'.format(job_id)}, status_code=404)
+
+    return api_job_status(api_jobs[job_id])
+
+@app.get('/api/tournaments/{job_id}/results')
+def tournament_results_route(job_id: int, page: int = 0, page_size: int = 100):
+    if job_id not in api_jobs:
+        return JSONResponse({'error': 'No tournament {}'.format(job_id)}, status_code=404)
+
+    batch = api_jobs[job_id]
+    page_size = min(max(1, page_size), 1000)
+
+    return {'status': batch.status()['status'], 'page': page, 'page_size': page_size, 'rows': len(batch.results),
+            'standings': batch.standings(), 'results': batch.page(page, page_size)}
+
+@app.delete('/api/tournaments/{job_id}')
+def cancel_tournament_route(job_id: int):
+    if job_id not in api_jobs:
+        return JSONResponse({'error': 'No tournament {}'.format(job_id)}, status_code=404)
+
+    job_queue.cancel(api_jobs[job_id].queued)
+    return api_job_status(api_jobs[job_id])
+
+@app.get('/api/results')
+def results_route(after: int = 0, limit: int = 1000, strategy: str | None = None, since: str | None = None, until: str | None = None):
+    try:
+        rows = results_store.page(after, min(max(1, limit), 10_000), strategy, parse_time(since), parse_time(until))
+    except ExportError as e:
+        return JSONResponse({'error': str(e)}, status_code=e.status)
+
+    # Pass next back as after to get the following page
+    return {'results': [dict(zip(['id'] + RESULT_COLUMNS + ['played_at'], row)) for row in rows],
+            'next': rows[-1][0] if rows else None}
 
 """
 Main app runtime loop
 """
 
-if __name__ in {"__main__", "__mp_main__"}:
-    # Register dataframe callbacks
-    load_dframe("scores.csv", "strategies.bin")
-    # atexit.register(lambda: save_dframe("scores.csv"))
+# Every browser tab gets its own page and session, sharing the strategy library, scoreboard and job queue
+@ui.page('/')
+def index():
+    s = session()
 
     # Main window UI stuff
     with ui.header().classes(replace='row items-center w-full') as header:
-        with ui.tabs().classes('w-full') as tabs:
+        with ui.tabs().classes('w-full') as s.tabs:
             ui.tab('Game Classes')
             ui.tab('Match View')
             ui.tab('Results')
+            ui.tab('Performance')
             ui.space()
             ui.button('Theme', icon='brightness_6', on_click=dark_mode_toggle).classes('mr-2')
 
             def ref_tournament():
-                tournament_view.refresh()
-                tournamentDialog.open()
+                refresh_own(tournament_view)
+                s.tournament_dialog.open()
 
             ui.button('Tournament', icon='sort', on_click=ref_tournament).classes('mr-2')
 
-            ui.button('Add Git Repo', icon='store', on_click=lambda: gitDialog.open()).classes('mr-2')
+            ui.button('Add Git Repo', icon='store', on_click=lambda: s.git_dialog.open()).classes('mr-2')
             ui.button('Stop Server', icon='logout', on_click=exit_stop_server).classes('mr-2').props('color="red"')
 
     with ui.footer(value=False) as footer:
@@ -660,5 +1525,15 @@ if __name__ in {"__main__", "__mp_main__"}:
     repo_add()
     tournament_view()
 
+# Only the launched process serves the UI. Tournament, sandbox and git import pools spawn workers that
+# re-import this file as __mp_main__, so auto-reload (which needs that name to run the server) is off
+if __name__ == "__main__":
+    # Register dataframe callbacks
+    load_dframe("scores.db", "strategies.db", "strategies.bin")
+
+    # Deep enough for an API caller to queue hundreds of tournaments, with a runner kept free for single
+    # matches, imports and population runs while tournaments hold the others
+    job_queue = JobQueue(runners=2, short_runners=1, max_pending=1024, max_per_owner=256)
+
     shutil.rmtree("imported", ignore_errors=True)
-    ui.run(uvicorn_reload_excludes="imported/*,imported/*/*,strategies.bin,scores.csv,imported")
+    ui.run(reload=False)
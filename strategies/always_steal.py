@@ -2,22 +2,14 @@
 Always steal game theory strategy for GameTheoryUI.
 by: Ari Stehney
 
-Customize the class below with your metadata and fill out the play function
+Declared as a one-state machine instead of a play function, see StateMachineStrategy in game_class.py
 """
 
-class ImportedStrat(GameStrategy):
-    def __init__(self) -> None:
-        # This is where your metadata will go:
-        super().__init__(name="Stealing Strategy", author="Ari S.", description="Always steals, no matter what")
-
-    def next_play(self, player_history: list[GameMove], opponent_history: list[GameMove]) -> GameMove:
-        """
-        :param player_history: List of your moves
-        :param opponent_history: List of the opponent's moves
-        :return: Your next move
-        """
-
-        return GameMove.STEAL
-
 # This line is required!
-userGame = ImportedStrat()
+userGame = StateMachineStrategy(
+    name="Stealing Strategy", author="Ari S.", description="Always steals, no matter what",
+    # Move played in each state
+    outputs=[GameMove.STEAL],
+    # [next state after the opponent steals, next state after the opponent shares] for each state
+    transitions=[[0, 0]]
+)
@@ -6,6 +6,11 @@ Customize the class below with your metadata and fill out the play function
 """
 
 class ImportedStrat(GameStrategy):
+    # Set to True if your moves only depend on the histories (or False if not) so repeated matches can be cached.
+    # Left as None, GameTheoryUI guesses from whether the script uses randomness, the clock or saved state.
+    # The guess only sees state saved on self, in globals or in closures, set False if you keep it anywhere else.
+    deterministic = None
+
     def __init__(self) -> None:
         # This is where your metadata will go:
         super().__init__(name="Imported Strategy", author="Ari S.", description="my imported script file")
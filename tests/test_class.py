@@ -0,0 +1,75 @@
+import itertools
+import pickle
+import sys
+import threading
+
+from game_class import GameHistory, GameMove, StateMachineStrategy
+
+def _tit_for_tat():
+    return StateMachineStrategy("Tit for tat", "", "", outputs=[GameMove.STEAL, GameMove.SHARE],
+                                transitions=[[0, 1], [0, 1]], initial_state=1)
+
+def _play(strategy, opponent_moves, rounds):
+    # Replay a fixed opponent, one call per round on the engine's shared buffers
+    own, opp = bytearray(), bytearray()
+    for rnd in range(rounds):
+        own.append(strategy.next_play(GameHistory(own, rnd), GameHistory(opp, rnd)))
+        opp.append(opponent_moves[rnd])
+        yield bytes(own)
+
+def test_interleaved_matches_keep_their_own_state():
+    shared = _tit_for_tat()
+    steals, shares = [0] * 40, [1] * 40
+
+    one, two = _play(shared, steals, 40), _play(shared, shares, 40)
+    for _ in range(40):
+        moves_one, moves_two = next(one), next(two)
+
+    assert moves_one == bytes([1] + [0] * 39)
+    assert moves_two == bytes([1] * 40)
+
+def test_threads_share_one_instance():
+    shared = _tit_for_tat()
+    results, errors = {}, []
+
+    def run(idx):
+        pattern = [(idx + rnd) % 2 for rnd in range(3000)]
+        try:
+            *_, results[idx] = _play(shared, pattern, 3000)
+        except Exception as e:
+            errors.append(e)
+
+    # Switch threads as often as possible so the calls interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=run, args=(idx,)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert not errors
+    for idx, moves in results.items():
+        assert moves == bytes([1] + [(idx + rnd) % 2 for rnd in range(2999)])
+
+def test_pickle_drops_resume_points():
+    strategy = _tit_for_tat()
+    list(_play(strategy, [0] * 5, 5))
+
+    copy = pickle.loads(pickle.dumps(strategy))
+    assert next(_play(copy, [0], 1)) == bytes([1])
+
+def test_history_slices_match_list_slices():
+    # Bytes past the view's length must never show up, whichever way the slice runs
+    buffer = bytearray([0, 1, 1, 0, 1, 0, 0, 1]) + bytearray([1] * 4)
+    history = GameHistory(buffer, 8)
+    moves = list(buffer[:8])
+    bounds = [None, 0, 3, 8, 12, -1, -3, -8, -12]
+
+    for start, stop, step in itertools.product(bounds, bounds, [None, 1, 2, -1, -2]):
+        sliced = history[start:stop:step]
+        assert [int(mv) for mv in sliced] == moves[start:stop:step]
+        assert all(isinstance(mv, GameMove) for mv in sliced)
@@ -0,0 +1,95 @@
+import multiprocessing
+
+import worker
+from game_distributed import Coordinator
+from game_engine import match_seeds, round_robin, run_tournament
+from game_registry import compile_strategy, exec_strategy, source_hash
+
+PARAMS = {"num_rounds": 30, "share_amount": 3, "steal_amount": 5, "steal_min_amount": 1}
+AUTHKEY = b"test"
+
+def _strategy(name, body):
+    # Plain next_play strategies, so every match goes to the workers instead of the state machine tables
+    text = ('class S(GameStrategy):\n'
+            '    def __init__(self):\n'
+            '        super().__init__(name="{}", author="", description="")\n'
+            '    def next_play(self, player_history, opponent_history):\n'
+            '        import os, random\n'
+            '        {}\n'
+            'userGame = S()\n').format(name, body)
+    strategy = exec_strategy(compile_strategy(text, source_hash(text)))
+    strategy.source_hash = source_hash(text)
+    return strategy
+
+def _strategies():
+    return [_strategy("Mirror", "return opponent_history[-1] if len(opponent_history) else GameMove.SHARE"),
+            _strategy("Third", "return GameMove.STEAL if len(player_history) % 3 == 2 else GameMove.SHARE"),
+            _strategy("Coin", "return GameMove.STEAL if random.random() < 0.5 else GameMove.SHARE")]
+
+def _start_workers(coordinator, count):
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=worker.run, args=(coordinator.address, AUTHKEY), kwargs={"once": True}, daemon=True)
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+
+    assert coordinator.wait_for_workers(count, timeout=60)
+    return processes
+
+def _stop(coordinator, processes):
+    coordinator.close()
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+def _moves(results):
+    return [[moves[0].tolist(), moves[1].tolist()] for moves in results]
+
+def test_workers_match_single_node():
+    strategies = _strategies()
+    pairings = list(round_robin(len(strategies), 2))
+    seeds = match_seeds(7, len(pairings))
+
+    coordinator = Coordinator(("127.0.0.1", 0), authkey=AUTHKEY, shard_size=2)
+    processes = _start_workers(coordinator, 2)
+
+    try:
+        plain = [pairing for pairing in pairings if "Coin" not in (strategies[pairing[0]].get_meta()["name"],
+                                                                   strategies[pairing[1]].get_meta()["name"])]
+        assert _moves(run_tournament(PARAMS, strategies, plain, sandbox=coordinator)) == \
+               _moves(run_tournament(PARAMS, strategies, plain))
+
+        # Seeded matches reseed the random modules on the workers, and here on the local worker processes
+        assert _moves(run_tournament(PARAMS, strategies, pairings, sandbox=coordinator, seeds=seeds)) == \
+               _moves(run_tournament(PARAMS, strategies, pairings, workers=2, seeds=seeds))
+        assert len(coordinator.workers()) == 2
+    finally:
+        _stop(coordinator, processes)
+
+def test_shard_is_retried_when_worker_disconnects(tmp_path):
+    strategies = _strategies()[:2]
+    pairings = list(round_robin(len(strategies), 4))
+    expected = _moves(run_tournament(PARAMS, strategies, pairings))
+
+    # The first worker to play the crashing strategy takes the flag and exits in the middle of its match
+    flag = tmp_path / "crash"
+    strategies.append(_strategy("Crash", "if len(player_history) == 10 and os.path.exists({0!r}):\n"
+                                         "            os.remove({0!r})\n"
+                                         "            os._exit(1)\n"
+                                         "        return GameMove.SHARE".format(str(flag))))
+    pairings += [(0, 2), (2, 1)]
+    flag.write_text("")
+
+    coordinator = Coordinator(("127.0.0.1", 0), authkey=AUTHKEY, shard_size=1)
+    processes = _start_workers(coordinator, 2)
+
+    try:
+        played = _moves(run_tournament(PARAMS, strategies, pairings, sandbox=coordinator))
+
+        assert not flag.exists()
+        assert played[:len(expected)] == expected
+        assert played[len(expected):] == _moves(run_tournament(PARAMS, strategies, pairings[len(expected):]))
+        assert len(coordinator.workers()) == 1
+    finally:
+        _stop(coordinator, processes)
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+
+from game_class import GameMove
+from game_engine import MatchCache, round_robin, run_tournament, score_matches, score_moves, seed_match
+from game_registry import compile_strategy, exec_strategy, load_strategy_dir, source_hash
+
+PARAMS = {"num_rounds": 40, "share_amount": 3, "steal_amount": 5, "steal_min_amount": 1}
+STRATEGY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "strategies")
+
+def _strategy(name, body):
+    text = ('class S(GameStrategy):\n'
+            '    def __init__(self):\n'
+            '        super().__init__(name="{}", author="", description="")\n'
+            '    def next_play(self, player_history, opponent_history):\n'
+            '        {}\n'
+            'userGame = S()\n').format(name, body)
+    strategy = exec_strategy(compile_strategy(text, source_hash(text)))
+    strategy.source_hash = source_hash(text)
+    return strategy
+
+def _strategies():
+    # State machines are played as tables here, matches with a next_play strategy go to the workers
+    return load_strategy_dir(STRATEGY_DIR, skip={"imported_strategy_template.py", "very_random.py"}) + [
+        _strategy("Mirror", "return opponent_history[-1] if len(opponent_history) else GameMove.SHARE"),
+        _strategy("Third", "return GameMove.STEAL if len(player_history) % 3 == 2 else GameMove.SHARE"),
+        _strategy("Forgiving", "return GameMove.STEAL if opponent_history.count(GameMove.STEAL) > 4 else GameMove.SHARE")]
+
+def _moves(results):
+    return [[moves[0].tolist(), moves[1].tolist()] for moves in results]
+
+def test_parallel_tournament_matches_sequential():
+    strategies = _strategies()
+    pairings = round_robin(len(strategies), 3)
+    sequential = _moves(run_tournament(PARAMS, strategies, pairings))
+
+    assert _moves(run_tournament(PARAMS, strategies, pairings, workers=3)) == sequential
+    assert _moves(run_tournament(PARAMS, strategies, pairings, cache=MatchCache(maxsize=64))) == sequential
+    assert _moves(run_tournament(PARAMS, strategies, pairings, workers=3, cache=MatchCache(maxsize=64))) == sequential
+
+def _score_rounds(params, moves_one, moves_two):
+    # Per-round scoring the way matches were scored before the payoff matrix
+    scores = [[], []]
+    for one, two in zip(moves_one, moves_two):
+        if one == GameMove.STEAL and two == GameMove.STEAL:
+            scores[0].append(params["steal_min_amount"])
+            scores[1].append(params["steal_min_amount"])
+        elif one == GameMove.SHARE and two == GameMove.SHARE:
+            scores[0].append(params["share_amount"])
+            scores[1].append(params["share_amount"])
+        elif one == GameMove.STEAL:
+            scores[0].append(params["steal_amount"])
+            scores[1].append(0)
+        else:
+            scores[1].append(params["steal_amount"])
+            scores[0].append(0)
+
+    return scores
+
+def test_vectorized_scoring_matches_per_round_scoring():
+    rng = np.random.default_rng(3)
+    params = {"num_rounds": 50, "share_amount": 3, "steal_amount": 7, "steal_min_amount": 2}
+
+    for noise in (0.0, 0.1, 0.5):
+        matches = []
+        for seed in range(20):
+            # Noise flips moves the same way the engine does for seeded matches
+            flips = seed_match(seed, params["num_rounds"], noise)
+            moves = rng.integers(0, 2, size=(2, params["num_rounds"]), dtype=np.int8) ^ flips.T
+            matches.append([moves[0], moves[1]])
+
+            expected = _score_rounds(params, [GameMove(int(mv)) for mv in moves[0]], [GameMove(int(mv)) for mv in moves[1]])
+            scores, cumulative = score_moves(params, moves[0], moves[1])
+
+            assert scores.tolist() == expected
+            assert cumulative[:, -1].tolist() == [sum(expected[0]), sum(expected[1])]
+
+        expected_totals = [[sum(side) for side in _score_rounds(params, [GameMove(int(mv)) for mv in one],
+                                                                [GameMove(int(mv)) for mv in two])]
+                           for one, two in matches]
+        assert score_matches(params, matches).tolist() == expected_totals
+
+def test_cache_counts_lookups():
+    strategies = _strategies()
+    pairings = round_robin(len(strategies))
+    cache = MatchCache(maxsize=256)
+
+    run_tournament(PARAMS, strategies, pairings, cache=cache)
+    assert (cache.hits, cache.misses) == (0, len(pairings))
+
+    run_tournament(PARAMS, strategies, pairings, cache=cache)
+    assert (cache.hits, cache.misses) == (len(pairings), len(pairings))
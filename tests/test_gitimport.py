@@ -0,0 +1,72 @@
+import os
+
+from game_gitimport import import_repo
+from game_registry import StrategyRegistry, source_hash
+
+def _script(name):
+    return ('class S(GameStrategy):\n'
+            '    def __init__(self):\n'
+            '        super().__init__(name="{}", author="", description="")\n'
+            '    def next_play(self, me, opp):\n'
+            '        return GameMove.SHARE\n'
+            'userGame = S()\n').format(name)
+
+class _Mirror:
+    # Each repository url is a plain directory of scripts
+    def __init__(self, root):
+        self.root = root
+
+    def sync(self, url):
+        return os.path.join(self.root, url)
+
+    def write(self, url, files):
+        pth = self.sync(url)
+        os.makedirs(pth, exist_ok=True)
+        for name in os.listdir(pth):
+            os.remove(os.path.join(pth, name))
+        for name, text in files.items():
+            with open(os.path.join(pth, name), 'w') as f:
+                f.write(text)
+
+def test_resync_keeps_uploaded_source(tmp_path):
+    registry, mirror = StrategyRegistry(str(tmp_path / "strategies.db")), _Mirror(str(tmp_path))
+    uploaded, _ = registry.add(_script("A"), uploaded=True)
+
+    mirror.write("one", {"a.py": _script("A")})
+    import_repo("one", registry, mirror)
+    mirror.write("one", {})
+    _, changes = import_repo("one", registry, mirror)
+
+    assert changes == []
+    assert registry.get(uploaded.source_hash) is uploaded
+    registry.close()
+
+def test_resync_keeps_source_of_other_repo(tmp_path):
+    registry, mirror = StrategyRegistry(str(tmp_path / "strategies.db")), _Mirror(str(tmp_path))
+
+    mirror.write("one", {"a.py": _script("A")})
+    mirror.write("two", {"b.py": _script("A")})
+    import_repo("one", registry, mirror)
+    import_repo("two", registry, mirror)
+
+    mirror.write("one", {"a.py": _script("A2")})
+    _, changes = import_repo("one", registry, mirror)
+
+    assert registry.get(source_hash(_script("A"))) is not None
+    assert [(old, new.get_meta()["name"]) for old, new in changes] == [(None, "A2")]
+    assert registry.origins("two") == {"b.py": source_hash(_script("A"))}
+    registry.close()
+
+def test_resync_removes_source_nobody_else_has(tmp_path):
+    registry, mirror = StrategyRegistry(str(tmp_path / "strategies.db")), _Mirror(str(tmp_path))
+
+    mirror.write("one", {"a.py": _script("A")})
+    import_repo("one", registry, mirror)
+    old = registry.get(source_hash(_script("A")))
+
+    mirror.write("one", {})
+    _, changes = import_repo("one", registry, mirror)
+
+    assert changes == [(old, None)]
+    assert registry.get(old.source_hash) is None and registry.load_all() == []
+    registry.close()
@@ -0,0 +1,35 @@
+import threading
+
+from game_jobs import JobQueue
+
+def test_short_jobs_run_while_long_jobs_hold_the_runners():
+    queue = JobQueue(runners=2, short_runners=1)
+    release = threading.Event()
+
+    try:
+        tournaments = [queue.submit('one', release.wait, 10, long=True) for _ in range(3)]
+        match = queue.submit('two', lambda: 'played')
+
+        assert match.future.result(timeout=5) == 'played'
+        assert not any(job.future.done() for job in tournaments)
+    finally:
+        release.set()
+        queue.close()
+
+def test_short_runners_leave_long_jobs_waiting():
+    queue = JobQueue(runners=1, short_runners=1)
+    release = threading.Event()
+
+    try:
+        first = queue.submit('one', release.wait, 10, long=True)
+        second = queue.submit('one', release.wait, 10, long=True)
+        short = queue.submit('one', lambda: 'done')
+
+        assert short.future.result(timeout=5) == 'done'
+        assert second.status == 'queued'
+
+        release.set()
+        assert second.future.result(timeout=5)
+    finally:
+        release.set()
+        queue.close()
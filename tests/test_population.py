@@ -0,0 +1,24 @@
+import numpy as np
+
+from game_population import moran_process
+
+def test_moran_shares_stay_a_distribution():
+    payoffs = np.random.default_rng(0).random((6, 6)) * 5
+    history = moran_process(payoffs, population=50, generations=30, runs=16, seed=1)
+
+    assert history.shape == (31, 6)
+    assert np.allclose(history.sum(axis=1), 1.0)
+    assert (history >= 0).all()
+
+def test_moran_neutral_drift_keeps_mean_shares():
+    history = moran_process(np.ones((4, 4)), population=40, generations=50, runs=2000, seed=2)
+
+    assert np.abs(history[-1] - 0.25).max() < 0.03
+
+def test_moran_dominant_strategy_takes_over():
+    # Strategy 0 gets the most against everyone, whatever the population looks like
+    payoffs = np.array([[5.0, 5.0, 5.0], [0.0, 1.0, 1.0], [0.0, 1.0, 1.0]])
+
+    for updates in (1, 8, 60):
+        history = moran_process(payoffs, population=60, generations=60, runs=64, selection=1.0, seed=3, updates=updates)
+        assert history[-1, 0] > 0.95
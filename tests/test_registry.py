@@ -0,0 +1,81 @@
+from game_registry import compile_strategy, detect_deterministic, source_hash
+
+def _detect(body):
+    text = "class S(GameStrategy):\n" \
+           "    def __init__(self):\n" \
+           "        super().__init__('S', 'test', '')\n" \
+           "        self.seen = []\n" \
+           "        self.counts = {}\n" \
+           "\n" \
+           "    def next_play(self, player_history, opponent_history):\n" + \
+           "".join("        {}\n".format(line) for line in body) + \
+           "\nuserGame = S()\n"
+    return detect_deterministic(compile_strategy(text, source_hash(text)))
+
+def test_pure_strategy_is_deterministic():
+    assert _detect(["return opponent_history[-1] if opponent_history else GameMove.SHARE"])
+
+def test_reading_attributes_is_deterministic():
+    assert _detect(["return GameMove.STEAL if len(self.seen) > 2 else GameMove.SHARE"])
+
+def test_container_append_keeps_state():
+    assert not _detect(["self.seen.append(len(opponent_history))",
+                        "return GameMove.STEAL if len(self.seen) > 2 else GameMove.SHARE"])
+
+def test_container_update_keeps_state():
+    assert not _detect(["self.counts.update(rounds=len(opponent_history))",
+                        "return GameMove.SHARE"])
+
+def test_subscript_store_keeps_state():
+    assert not _detect(["self.counts[len(opponent_history)] = 1",
+                        "return GameMove.SHARE"])
+
+def test_attribute_store_keeps_state():
+    assert not _detect(["self.last = GameMove.SHARE",
+                        "return self.last"])
+
+def _detect_script(text):
+    return detect_deterministic(compile_strategy(text, source_hash(text)))
+
+def test_global_container_keeps_state():
+    assert not _detect_script("global seen\n"
+                              "seen = []\n"
+                              "class S(GameStrategy):\n"
+                              "    def next_play(self, player_history, opponent_history):\n"
+                              "        seen.append(len(opponent_history))\n"
+                              "        return GameMove.STEAL if len(seen) > 2 else GameMove.SHARE\n"
+                              "userGame = S('S', 'test', '')\n")
+
+def test_closure_container_keeps_state():
+    assert not _detect_script("def remembering():\n"
+                              "    seen = []\n"
+                              "    def play(player_history, opponent_history):\n"
+                              "        seen.append(len(opponent_history))\n"
+                              "        return GameMove.STEAL if len(seen) > 2 else GameMove.SHARE\n"
+                              "    return play\n"
+                              "class S(GameStrategy):\n"
+                              "    def __init__(self):\n"
+                              "        super().__init__('S', 'test', '')\n"
+                              "        self.play = remembering()\n"
+                              "    def next_play(self, player_history, opponent_history):\n"
+                              "        return self.play(player_history, opponent_history)\n"
+                              "userGame = S()\n")
+
+def test_closure_counter_keeps_state():
+    assert not _detect_script("def counting():\n"
+                              "    count = 0\n"
+                              "    def play(player_history, opponent_history):\n"
+                              "        nonlocal count\n"
+                              "        count += 1\n"
+                              "        return GameMove.STEAL if count > 2 else GameMove.SHARE\n"
+                              "    return play\n"
+                              "userGame = GameStrategy('S', 'test', '')\n"
+                              "userGame.next_play = counting()\n")
+
+def test_reading_closure_is_deterministic():
+    assert _detect_script("def mirror(first):\n"
+                          "    def play(player_history, opponent_history):\n"
+                          "        return opponent_history[-1] if opponent_history else first\n"
+                          "    return play\n"
+                          "userGame = GameStrategy('S', 'test', '')\n"
+                          "userGame.next_play = mirror(GameMove.SHARE)\n")
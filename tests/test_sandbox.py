@@ -0,0 +1,26 @@
+import os
+
+from game_engine import MatchForfeit, round_robin, run_tournament
+from game_registry import load_strategy_dir
+from game_sandbox import SandboxPool
+
+PARAMS = {"num_rounds": 20, "share_amount": 3, "steal_amount": 5, "steal_min_amount": 1}
+STRATEGY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "strategies")
+
+def test_dead_worker_pipe_forfeits_instead_of_raising():
+    strategies = load_strategy_dir(STRATEGY_DIR, skip={"imported_strategy_template.py", "very_random.py"})
+    pairings = list(round_robin(len(strategies)))
+    expected = [moves[0].tolist() for moves in run_tournament(PARAMS, strategies, pairings)]
+    pool = SandboxPool(workers=1)
+
+    try:
+        assert [moves[0].tolist() for _, moves in pool.iter_matches(PARAMS, strategies, pairings)] == expected
+
+        # The idle worker's pipe breaks before the next call sends it anything
+        pool._idle[0].conn.close()
+        played = [moves for _, moves in pool.iter_matches(PARAMS, strategies, pairings)]
+
+        assert sum(isinstance(moves, MatchForfeit) for moves in played) == 1
+        assert all(moves[0].tolist() == exp for moves, exp in zip(played, expected) if not isinstance(moves, MatchForfeit))
+    finally:
+        pool.close()
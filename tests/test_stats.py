@@ -0,0 +1,60 @@
+import random
+
+import pandas as pd
+import pytest
+
+from game_results import ResultsStore
+from game_stats import ResultsSummary, SUMMARY_COLUMNS
+
+def _rows(count, seed=1):
+    rng = random.Random(seed)
+    names = ['A', 'B', 'C', 'D']
+    rows = []
+
+    for _ in range(count):
+        one, two = rng.sample(names, 2)
+        score_one, score_two = rng.randrange(0, 30), rng.randrange(0, 30)
+        rows += [(one, score_one, two, score_two), (two, score_two, one, score_one)]
+
+    return rows
+
+def test_summary_matches_pandas(tmp_path):
+    store = ResultsStore(str(tmp_path / "scores.db"))
+    store.append_rows(_rows(300))
+    store.append_rows(_rows(200, seed=2))
+
+    frame = store.load()
+    summary = ResultsSummary(store.score_counts(), store.pair_totals())
+
+    grouped = frame.groupby('strategy', observed=True)['score']
+    quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats = summary.strategies.set_index('strategy')
+
+    assert summary.rows == len(frame) == 1000
+    for name in summary.names():
+        assert stats.loc[name, 'matches'] == summary.count(name) == grouped.size()[name]
+        assert stats.loc[name, 'total'] == grouped.sum()[name]
+        assert stats.loc[name, 'min'] == grouped.min()[name]
+        assert stats.loc[name, 'max'] == grouped.max()[name]
+        for q, col in [(0.25, 'q25'), (0.5, 'median'), (0.75, 'q75')]:
+            assert stats.loc[name, col] == pytest.approx(quantiles.loc[name, q])
+
+    h2h = frame.pivot_table(index='strategy', columns='opponent', values='score', aggfunc='mean', observed=True)
+    pd.testing.assert_frame_equal(summary.head_to_head, h2h.reindex(index=summary.names(), columns=summary.names()),
+                                  check_names=False)
+    store.close()
+
+def test_totals_survive_reopen_and_clear(tmp_path):
+    pth = str(tmp_path / "scores.db")
+    store = ResultsStore(pth)
+    store.append_rows(_rows(50))
+    before = store.score_counts()
+    store.close()
+
+    store = ResultsStore(pth)
+    assert store.score_counts() == before
+
+    store.clear()
+    summary = ResultsSummary(store.score_counts(), store.pair_totals())
+    assert summary.rows == 0 and list(summary.strategies.columns) == SUMMARY_COLUMNS
+    store.close()
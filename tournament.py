@@ -0,0 +1,181 @@
+"""
+GameTheoryUI headless tournament runner
+by: Ari Stehney
+
+Runs a tournament between the strategies in a directory and writes the scoreboard, without the UI.
+Only the match engine modules are imported, so nicegui and plotly don't have to be installed.
+
+Usage:
+    $ python tournament.py strategies/ -N 10 --rounds 200 --output scores.db
+    $ python tournament.py strategies/ --output results.csv --workers 4 --sandbox
+    $ python tournament.py strategies/ --monte-carlo --noise 0.05 --seed 1 -N 10 --ci-halfwidth 0.5
+    $ GAMETHEORYUI_AUTHKEY=secret python tournament.py strategies/ -N 50 --listen 0.0.0.0:6010 --wait-workers 4
+
+    With --listen the matches are played by worker.py processes, on this or other machines.
+
+Output:
+    .db: Rows are appended to a scoreboard SQLite file, the same one the Results tab reads (scores.db)
+    .csv: A CSV file with the scoreboard columns, overwritten
+"""
+
+import argparse, csv, os, sys, time
+import numpy as np
+
+from game_engine import iter_tournament, round_robin, score_matches, MatchCache, MatchForfeit, TournamentMatchError
+from game_registry import load_strategy_dir
+from game_results import ResultsAccumulator, ResultsStore, RESULT_COLUMNS
+from game_montecarlo import MonteCarloJob
+
+# Scripts that ship with the repo but aren't playable strategies
+SKIPPED_FILES = {"imported_strategy_template.py"}
+
+def play(params, strategies, pairings, workers=1, sandbox=None, batch=1024, matches=None):
+    """
+    :param matches: Finished (pairing, moves) to score instead of playing the pairings
+    :return: ResultsAccumulator with both rows of every finished match, and the list of (pairing, MatchForfeit)
+    """
+    results_acc = ResultsAccumulator(capacity=2 * min(len(pairings), 1 << 16))
+    strategy_ids = [results_acc.intern(st.get_meta()["name"]) for st in strategies]
+    finished, forfeits = [], []
+
+    if matches is None:
+        matches = iter_tournament(params, strategies, pairings, workers, MatchCache(maxsize=4096), sandbox)
+
+    def add_finished():
+        if finished:
+            results_acc.add_matches([strategy_ids[pairing[0]] for pairing, _ in finished],
+                                    [strategy_ids[pairing[1]] for pairing, _ in finished],
+                                    score_matches(params, [moves for _, moves in finished]))
+            finished.clear()
+
+    for pairing, moves in matches:
+        if isinstance(moves, MatchForfeit):
+            forfeits.append((pairing, moves))
+        else:
+            finished.append((pairing, moves))
+            if len(finished) >= batch:
+                add_finished()
+
+    add_finished()
+    return results_acc, forfeits
+
+def write_results(pth, results_acc):
+    if pth.endswith(".csv"):
+        with open(pth, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_COLUMNS)
+            writer.writerows(results_acc.rows())
+        return len(results_acc)
+
+    store = ResultsStore(pth)
+    try:
+        return store.append_rows(results_acc.rows())
+    finally:
+        store.close()
+
+def print_summary(results_acc):
+    totals, counts = results_acc.per_strategy()
+
+    print("{:<32} {:>8} {:>12} {:>10}".format("Strategy", "Matches", "Total", "Mean"))
+    for idx in np.argsort(-totals, kind="stable"):
+        print("{:<32} {:>8} {:>12} {:>10.2f}".format(results_acc.names[idx], counts[idx], totals[idx],
+                                                      totals[idx] / counts[idx] if counts[idx] else 0.0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a GameTheoryUI tournament without the UI.")
+    parser.add_argument("strategies", nargs="?", default="strategies", help="Directory of strategy scripts")
+    parser.add_argument("-N", "--repeats", type=int, default=1, help="Times every match-up is played")
+    parser.add_argument("--rounds", type=int, default=20, help="num_rounds match parameter")
+    parser.add_argument("--steal", type=int, default=5, help="steal_amount match parameter")
+    parser.add_argument("--steal-min", type=int, default=1, help="steal_min_amount match parameter")
+    parser.add_argument("--share", type=int, default=3, help="share_amount match parameter")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--sandbox", action="store_true", help="Play under per-move time and memory budgets")
+    parser.add_argument("--move-timeout", type=float, default=1.0, help="Seconds per next_play call in the sandbox")
+    parser.add_argument("--memory-mb", type=int, default=512, help="Memory budget per sandbox worker")
+    parser.add_argument("--monte-carlo", action="store_true", help="Repeat in batches of N until the confidence intervals are tight")
+    parser.add_argument("--noise", type=float, default=0.0, help="Probability of a move being flipped, with --monte-carlo")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the matches, with --monte-carlo")
+    parser.add_argument("--max-repeats", type=int, default=200, help="Most round robin repeats, with --monte-carlo")
+    parser.add_argument("--ci-halfwidth", type=float, default=1.0, help="Target interval half-width in points per match, with --monte-carlo")
+    parser.add_argument("--listen", help="host:port to coordinate remote worker.py processes on, instead of local workers")
+    parser.add_argument("--wait-workers", type=int, default=1, help="Remote workers to wait for before starting, with --listen")
+    parser.add_argument("--shard-size", type=int, default=32, help="Most pairings sent to a remote worker at a time, with --listen")
+    parser.add_argument("--authkey", default=os.environ.get("GAMETHEORYUI_AUTHKEY", ""),
+                        help="Shared secret of the remote workers, defaults to $GAMETHEORYUI_AUTHKEY")
+    parser.add_argument("--output", default="scores.db", help="Scoreboard .db to append to, or .csv to write")
+    args = parser.parse_args(argv)
+
+    match_parameters = {
+        "num_rounds": args.rounds,
+        "steal_amount": args.steal,
+        "steal_min_amount": args.steal_min,
+        "share_amount": args.share
+    }
+
+    strategies = load_strategy_dir(args.strategies, skip=SKIPPED_FILES)
+    if len(strategies) < 2:
+        print("Need at least two strategies in {}, found {}".format(args.strategies, len(strategies)))
+        return 1
+
+    pairings = round_robin(len(strategies), args.repeats)
+    if not args.monte_carlo:
+        print("Playing {} matches between {} strategies".format(len(pairings), len(strategies)))
+
+    sandbox = None
+    if args.listen:
+        from game_distributed import Coordinator, parse_address
+
+        if not args.authkey:
+            print("Set --authkey or GAMETHEORYUI_AUTHKEY to a shared secret for the workers")
+            return 1
+
+        # Remote workers play every match in place of the sandbox or local workers
+        sandbox = Coordinator(parse_address(args.listen), authkey=args.authkey.encode("utf-8"), shard_size=args.shard_size)
+        print("Waiting for {} workers on {}:{}".format(args.wait_workers, *sandbox.address))
+        sandbox.wait_for_workers(args.wait_workers)
+    elif args.sandbox:
+        # Only pulled in when asked for, it starts its own worker processes
+        from game_sandbox import SandboxPool
+        sandbox = SandboxPool(workers=args.workers, move_timeout=args.move_timeout, memory_limit=args.memory_mb * 2**20)
+
+    started = time.perf_counter()
+    try:
+        if args.monte_carlo:
+            job = MonteCarloJob(match_parameters, strategies, noise=args.noise, seed=args.seed, batch_repeats=args.repeats,
+                                max_repeats=args.max_repeats, ci_halfwidth=args.ci_halfwidth, workers=args.workers,
+                                sandbox=sandbox).run()
+            if job.error is not None:
+                raise job.error
+
+            results_acc, forfeits = play(job.params, strategies, job.pairings, matches=job.collect() + job.forfeits)
+        else:
+            results_acc, forfeits = play(match_parameters, strategies, pairings, args.workers, sandbox)
+    except TournamentMatchError as e:
+        print("Error in {} vs {}: {}".format(strategies[e.pairing[0]].get_meta()["name"],
+                                             strategies[e.pairing[1]].get_meta()["name"], e))
+        return 1
+    finally:
+        if sandbox is not None:
+            sandbox.close()
+
+    print("Finished in {:.2f}s".format(time.perf_counter() - started))
+
+    for pairing, forfeit in forfeits:
+        who = "A strategy" if forfeit.side is None else strategies[pairing[forfeit.side]].get_meta()["name"]
+        print("{} forfeited {} vs {}: {}".format(who, strategies[pairing[0]].get_meta()["name"],
+                                                 strategies[pairing[1]].get_meta()["name"], forfeit.reason))
+
+    print_summary(results_acc)
+
+    if args.monte_carlo:
+        print("{} after {} repeats, {:.0%} intervals of the mean per match:".format(
+            "Converged" if job.converged else "Stopped at --max-repeats", job.repeats, job.confidence))
+        for row in job.summary():
+            print("{:<32} {:>10.2f}  [{}, {}]".format(row['strategy'], row['mean'],
+                                                      *("{:.2f}".format(v) if v is not None else "--" for v in (row['ci_low'], row['ci_high']))))
+    print("Wrote {} rows to {}".format(write_results(args.output, results_acc), args.output))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
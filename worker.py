@@ -0,0 +1,66 @@
+"""
+GameTheoryUI tournament worker
+by: Ari Stehney
+
+Plays tournament shards for a coordinator, either the server with remote workers turned on in the
+Tournament dialog or tournament.py with --listen. Run it from a checkout of this repo on every machine
+that should help, with the same authkey as the coordinator.
+
+Usage:
+    $ export GAMETHEORYUI_AUTHKEY=some-shared-secret
+    $ python worker.py coordinator-host:6010 --processes 8
+"""
+
+import argparse, multiprocessing, os, sys, time
+
+from game_distributed import serve_worker, parse_address
+
+def run(address, authkey, retry_delay=2.0, once=False):
+    # Reconnect after the coordinator restarts or drops this worker
+    while True:
+        try:
+            serve_worker(address, authkey)
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+            print("Can't reach coordinator {}:{}: {}".format(*address, e))
+
+        if once:
+            return
+        time.sleep(retry_delay)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play GameTheoryUI tournament shards for a coordinator.")
+    parser.add_argument("coordinator", help="host:port of the coordinator")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes, one shard each at a time")
+    parser.add_argument("--authkey", default=os.environ.get("GAMETHEORYUI_AUTHKEY", ""),
+                        help="Shared secret of the coordinator, defaults to $GAMETHEORYUI_AUTHKEY")
+    parser.add_argument("--once", action="store_true", help="Exit when the coordinator hangs up instead of reconnecting")
+    args = parser.parse_args(argv)
+
+    if not args.authkey:
+        print("Set --authkey or GAMETHEORYUI_AUTHKEY to the coordinator's key")
+        return 1
+
+    address = parse_address(args.coordinator)
+    authkey = args.authkey.encode("utf-8")
+
+    if args.processes <= 1:
+        run(address, authkey, once=args.once)
+        return 0
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run, args=(address, authkey), kwargs={"once": args.once}, daemon=True)
+                 for _ in range(args.processes)]
+
+    for process in processes:
+        process.start()
+    print("Started {} workers for {}:{}".format(len(processes), *address))
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())